@@ -0,0 +1,696 @@
+"""
+Benchmark cho các thuật toán DSP của SoundFix.
+
+Chạy:
+    python benchmark.py limiter
+    python benchmark.py channels
+    python benchmark.py startup
+    python benchmark.py brickwall
+    python benchmark.py preview
+    python benchmark.py loudness
+    python benchmark.py bank
+    python benchmark.py service
+    python benchmark.py suite --matrix standard --save-baseline baseline.json
+    python benchmark.py suite --matrix standard --compare baseline.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+import soundfix
+
+
+# ==============================================================================
+# TIỆN ÍCH
+# ==============================================================================
+def _best_time(fn: Callable[[], object], repeat: int = 3) -> Tuple[float, object]:
+    """Chạy fn nhiều lần, trả về thời gian nhanh nhất và kết quả lần cuối."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def _test_signal(duration: float, sr: int, channels: int = 1, seed: int = 0) -> NDArray:
+    """Nhiễu trắng có envelope thay đổi để limiter thực sự làm việc."""
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    t = np.arange(n) / sr
+    envelope = 0.2 + 0.8 * np.abs(np.sin(2 * np.pi * 0.5 * t))
+    return (rng.standard_normal((channels, n)) * envelope * 0.5).squeeze()
+
+def _print_table(header: List[str], rows: List[List[str]]) -> None:
+    widths = [max(len(str(x)) for x in col) for col in zip(header, *rows)]
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)))
+    for row in rows:
+        print("  ".join(str(x).ljust(w) for x, w in zip(row, widths)))
+
+
+# ==============================================================================
+# LIMITER
+# ==============================================================================
+def _legacy_gain_smoothing(rms: NDArray, threshold: float, ratio: float, attack_samples: int, release_samples: int) -> NDArray:
+    """Hai vòng lặp Python của apply_limiter_mono cũ: gain computer và smoother."""
+    gain_reduction = np.ones_like(rms)
+    for i, rms_val in enumerate(rms):
+        if rms_val > threshold:
+            excess = rms_val - threshold
+            reduction = excess * (1 - 1/ratio)
+            gain_reduction[i] = (rms_val - reduction) / rms_val
+    smoothed_gain = np.ones_like(gain_reduction)
+    for i in range(1, len(gain_reduction)):
+        alpha = 1.0 / attack_samples if gain_reduction[i] < smoothed_gain[i-1] else 1.0 / release_samples
+        smoothed_gain[i] = smoothed_gain[i-1] + alpha * (gain_reduction[i] - smoothed_gain[i-1])
+    return smoothed_gain
+
+def _vectorized_gain_smoothing(rms: NDArray, threshold: float, ratio: float, attack_samples: int, release_samples: int) -> NDArray:
+    smoothed_gain = np.ones_like(rms)
+    smoothed_gain[1:] = soundfix._get_gain_smoother()(soundfix._limiter_gain(rms[1:], threshold, ratio), 1.0 / attack_samples, 1.0 / release_samples, 1.0)
+    return smoothed_gain
+
+def _legacy_apply_limiter_mono(data: NDArray, threshold: float, ratio: float, attack_samples: int, release_samples: int) -> NDArray:
+    """Bản apply_limiter_mono cũ dùng làm mốc so sánh."""
+    import librosa
+    rms = librosa.feature.rms(y=data, frame_length=512, hop_length=256)[0]
+    smoothed_gain = _legacy_gain_smoothing(rms, threshold, ratio, attack_samples, release_samples)
+    gain_signal = np.repeat(smoothed_gain, 256)
+    proc_len = min(len(data), len(gain_signal))
+    result = np.zeros_like(data)
+    result[:proc_len] = data[:proc_len] * gain_signal[:proc_len]
+    return result
+
+def bench_limiter(args: argparse.Namespace) -> None:
+    import librosa
+    sr = args.sr
+    params = dict(threshold=10 ** (-6 / 20), ratio=4.0, attack_samples=int(0.005 * sr), release_samples=int(0.05 * sr))
+    # Gọi trước một lần để numba/librosa biên dịch xong, không tính vào thời gian đo
+    soundfix.apply_limiter_mono(_test_signal(0.1, sr), **params)
+    _legacy_apply_limiter_mono(_test_signal(0.1, sr), **params)
+    rows = []
+    for duration in args.durations:
+        x = _test_signal(duration, sr)
+        rms = librosa.feature.rms(y=x, frame_length=512, hop_length=256)[0]
+        t_loop_old, _ = _best_time(lambda: _legacy_gain_smoothing(rms, **params), args.repeat)
+        t_loop_new, _ = _best_time(lambda: _vectorized_gain_smoothing(rms, **params), args.repeat)
+        t_old, y_old = _best_time(lambda: _legacy_apply_limiter_mono(x, **params), args.repeat)
+        t_step, y_step = _best_time(lambda: soundfix.apply_limiter_mono(x, **params, interpolate=False), args.repeat)
+        t_lin, y_lin = _best_time(lambda: soundfix.apply_limiter_mono(x, **params), args.repeat)
+        rows.append([f"{duration:g}s", f"{t_loop_old * 1000:.2f}", f"{t_loop_new * 1000:.2f}", f"{t_loop_old / t_loop_new:.1f}x",
+                     f"{t_old * 1000:.1f}", f"{t_step * 1000:.1f}", f"{t_lin * 1000:.1f}",
+                     f"{np.max(np.abs(y_old - y_step)):.2e}", f"{np.max(np.abs(y_old - y_lin)):.2e}"])
+    print(f"apply_limiter_mono @ {sr} Hz (ms, best of {args.repeat})")
+    _print_table(["duration", "gain+smooth legacy", "gain+smooth new", "speedup",
+                  "total legacy", "total step", "total linear", "maxdiff step", "maxdiff linear"], rows)
+
+
+# ==============================================================================
+# SỐ KÊNH
+# ==============================================================================
+def _per_channel(engine: Callable, data: NDArray, sr: int, preset: dict) -> NDArray:
+    """Gọi engine riêng cho từng kênh, giống cách xử lý trước khi vector hóa."""
+    return np.stack([engine(data[ch], sr=sr, **preset) for ch in range(data.shape[0])])
+
+def bench_channels(args: argparse.Namespace) -> None:
+    presets = soundfix.load_presets_from_csv(args.csv)
+    preset = presets[0]
+    sr = args.sr
+    rows = []
+    for algorithm, engine in soundfix.engine_functions.items():
+        engine(_test_signal(0.1, sr, 2).astype(np.float32), sr=sr, **preset)
+        for duration in args.durations:
+            for channels in args.channels:
+                x = _test_signal(duration, sr, channels).astype(np.float32).reshape(channels, -1)
+                t_loop, y_loop = _best_time(lambda: _per_channel(engine, x, sr, preset), args.repeat)
+                t_vec, y_vec = _best_time(lambda: engine(x, sr=sr, **preset), args.repeat)
+                rows.append([algorithm, f"{duration:g}s", str(channels), f"{t_loop * 1000:.2f}", f"{t_vec * 1000:.2f}", f"{t_loop / t_vec:.2f}x",
+                             f"{t_vec * 1000 / channels:.2f}", "yes" if np.array_equal(y_loop, y_vec) else f"{np.max(np.abs(y_loop - y_vec)):.1e}"])
+    print(f"engine_functions @ {sr} Hz, preset '{preset['category_name']}' (ms, best of {args.repeat})")
+    _print_table(["algorithm", "duration", "channels", "per-channel", "vectorized", "speedup", "ms/channel", "identical"], rows)
+
+
+# ==============================================================================
+# BRICKWALL: BUTTERWORTH SOS SO VỚI FIR QUA FFT
+# ==============================================================================
+BRICKWALL_ENGINES = ('Hybrid Brickwall', 'Dynamic Hybrid Brickwall', 'Linear-Phase Brickwall')
+
+def bench_brickwall(args: argparse.Namespace) -> None:
+    presets = soundfix.load_presets_from_csv(args.csv)
+    preset = presets[0]
+    rows = []
+    for sr in args.sample_rates:
+        kernels = {tw: soundfix.design_brickwall_kernel(preset['lowcut'], preset['highcut'], sr, preset['attenuation_db'], tw)
+                   for tw in args.transitions}
+        for duration in args.durations:
+            x = _test_signal(duration, sr, args.channels).astype(np.float32).reshape(args.channels, -1)
+            row = [str(sr), f"{duration:g}s"]
+            for algorithm in BRICKWALL_ENGINES:
+                engine = soundfix.engine_functions[algorithm]
+                t, _ = _best_time(lambda: engine(x, sr=sr, **preset), args.repeat)
+                row.append(f"{t * 1000:.1f} ({duration / t:.0f}x)")
+            # Dải chuyển tiếp hẹp hơn = kernel dài hơn, nhưng chi phí FFT chỉ tăng theo log
+            for tw, kernel in kernels.items():
+                t, _ = _best_time(lambda: soundfix.apply_fir_kernel(x, kernel), args.repeat)
+                row.append(f"{t * 1000:.1f}")
+            rows.append(row)
+    print(f"Brickwall @ {args.channels} kênh, preset '{preset['category_name']}' (ms (x realtime), best of {args.repeat})")
+    _print_table(["sr", "duration", *BRICKWALL_ENGINES, *(f"FIR tw={tw:g}Hz" for tw in args.transitions)], rows)
+
+
+# ==============================================================================
+# KHỞI ĐỘNG
+# ==============================================================================
+STARTUP_MODULES = ('numpy', 'scipy', 'soundfile', 'librosa', 'numba', 'tkinter', 'tkinterdnd2')
+
+# Thay mainloop để process con báo thời điểm cửa sổ vẽ xong rồi thoát
+_WINDOW_PROBE = """
+import time, tkinter
+def _ready(self):
+    self.update()
+    print(time.time())
+    self.destroy()
+tkinter.Tk.mainloop = _ready
+import soundfix
+soundfix.run_app()
+"""
+
+def _import_times() -> Dict[str, float]:
+    """Thời gian import tích lũy (ms) của soundfix và các thư viện nặng, theo python -X importtime."""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import soundfix'],
+                         capture_output=True, text=True, check=True).stderr
+    times: Dict[str, float] = {}
+    for line in out.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        if (name == 'soundfix' or name in STARTUP_MODULES) and cumulative.strip().isdigit():
+            times[name] = int(cumulative) / 1000
+    return times
+
+def _wall_time(cmd: List[str]) -> float:
+    t0 = time.perf_counter()
+    subprocess.run(cmd, capture_output=True, check=True)
+    return time.perf_counter() - t0
+
+def _time_to_window() -> float:
+    t0 = time.time()
+    out = subprocess.run([sys.executable, '-c', _WINDOW_PROBE], capture_output=True, text=True, check=True).stdout
+    return float(out.split()[-1]) - t0
+
+def bench_startup(args: argparse.Namespace) -> None:
+    import soundfile as sf
+    presets = soundfix.load_presets_from_csv(args.csv)
+    rows = []
+    runs = [_import_times() for _ in range(args.repeat)]
+    for name in ('soundfix',) + STARTUP_MODULES:
+        values = [r[name] for r in runs if name in r]
+        rows.append([f"import {name}", f"{min(values):.1f}" if values else "-"])
+    loaded = subprocess.run([sys.executable, '-c', f"import sys, soundfix; print(','.join(m for m in {STARTUP_MODULES!r} if m in sys.modules))"],
+                            capture_output=True, text=True, check=True).stdout.strip()
+    rows.append(["python -c 'import soundfix'", f"{min(_wall_time([sys.executable, '-c', 'import soundfix']) for _ in range(args.repeat)) * 1000:.1f}"])
+    try:
+        rows.append(["time-to-window", f"{min(_time_to_window() for _ in range(args.repeat)) * 1000:.1f}"])
+    except (subprocess.CalledProcessError, ValueError, IndexError):
+        rows.append(["time-to-window", "n/a (không mở được cửa sổ)"])
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dest = os.path.join(tmp, 'src'), os.path.join(tmp, 'out')
+        os.makedirs(src)
+        os.makedirs(dest)
+        # Đặt tên theo keyword của preset đầu tiên để file chắc chắn được xử lý
+        sf.write(os.path.join(src, f"{presets[0]['keywords'][0]}_startup.wav"), _test_signal(1.0, args.sr, 2).T, args.sr)
+        cmd = [sys.executable, os.path.abspath(soundfix.__file__), 'process', src, dest,
+               '--csv', os.path.abspath(args.csv), '--algorithm', args.algorithm, '--workers', '1', '--quiet']
+        rows.append([f"time-to-first-file ({args.algorithm})", f"{min(_wall_time(cmd) for _ in range(args.repeat)) * 1000:.1f}"])
+    print(f"Khởi động (ms, best of {args.repeat}); thư viện đã nạp sau 'import soundfix': {loaded or 'không có'}")
+    _print_table(["metric", "ms"], rows)
+
+
+# ==============================================================================
+# BỘ BENCHMARK CÁC ENGINE
+# ==============================================================================
+# Ma trận tín hiệu tổng hợp: từ tiếng click UI 0.1 s đến nền 1 giờ
+SUITE_MATRICES = {
+    'quick': {'durations': [0.1, 1.0], 'sample_rates': [44100, 48000], 'channels': [1, 2]},
+    'standard': {'durations': [0.1, 1.0, 10.0, 60.0], 'sample_rates': [22050, 44100, 48000, 96000, 192000], 'channels': [1, 2, 6]},
+    'full': {'durations': [0.1, 1.0, 10.0, 60.0, 600.0, 3600.0], 'sample_rates': [22050, 44100, 48000, 96000, 192000], 'channels': [1, 2, 6]},
+}
+# Chỉ so streaming với xử lý trong bộ nhớ cho tín hiệu không dài hơn (giây)
+SUITE_STREAM_CHECK_SECONDS = 60.0
+
+# Mỗi lần đo kéo dài ít nhất chừng này (giây) để tín hiệu ngắn không bị nhiễu timer
+SUITE_MIN_MEASURE_SECONDS = 0.02
+
+def _calibrated_time(fn: Callable[[], object], repeat: int) -> Tuple[float, object]:
+    """Như _best_time nhưng gọi fn nhiều lần trong mỗi lần đo khi fn quá nhanh."""
+    t0 = time.perf_counter()
+    result = fn()
+    number = max(1, int(SUITE_MIN_MEASURE_SECONDS / max(time.perf_counter() - t0, 1e-9)))
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            result = fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best, result
+
+def _positive_float(value: str) -> float:
+    if float(value) <= 0:
+        raise argparse.ArgumentTypeError("phải lớn hơn 0")
+    return float(value)
+
+def _case_key(algorithm: str, duration: float, sr: int, channels: int) -> str:
+    return f"{algorithm}|{duration:g}s|{sr}|{channels}ch"
+
+def _peak_memory(fn: Callable[[], object]) -> float:
+    """Bộ nhớ cấp phát thêm cao nhất (MB) khi chạy fn, đo bằng tracemalloc."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+def _stream_blocks(block: NDArray, n: int) -> Iterator[NDArray]:
+    """n mẫu đầu vào tạo bằng cách lặp lại một block (không tốn thời gian sinh tín hiệu)."""
+    for start in range(0, n, block.shape[-1]):
+        yield block[:, :min(block.shape[-1], n - start)]
+
+def _run_stream(algorithm: str, preset: Dict[str, Any], sr: int, blocks: Iterator[NDArray], channels: int, digest=None) -> Tuple[Optional[NDArray], float, float]:
+    """
+    Chạy engine streaming; trả về (output, tổng bình phương, peak).
+    Khi có digest thì output chỉ được băm chứ không giữ lại (output trả về là None).
+    """
+    engine = soundfix.stream_engine_classes[algorithm](channels, sr, preset)
+    outputs, sum_sq, peak = [], 0.0, 0.0
+    for y in _stream_outputs(engine, blocks):
+        sum_sq += float(np.square(y, dtype=np.float64).sum())
+        peak = max(peak, float(np.max(np.abs(y))) if y.size else 0.0)
+        if digest is None:
+            outputs.append(y)
+        else:
+            digest.update(np.ascontiguousarray(y).tobytes())
+    return (np.concatenate(outputs, axis=-1) if digest is None else None), sum_sq, peak
+
+def _stream_outputs(engine, blocks: Iterator[NDArray]) -> Iterator[NDArray]:
+    for block in blocks:
+        yield engine.process(block)
+    yield engine.flush()
+
+def _run_case(algorithm: str, preset: Dict[str, Any], duration: float, sr: int, channels: int, repeat: int, memory: bool) -> Dict[str, Any]:
+    """
+    Một ô của ma trận. Tín hiệu ngắn hơn STREAMING_MIN_SECONDS chạy engine trong bộ nhớ
+    như process_file, dài hơn thì chạy engine streaming trên block lặp lại.
+    """
+    n = int(duration * sr)
+    case = {'algorithm': algorithm, 'duration': duration, 'sr': sr, 'channels': channels}
+    if duration <= soundfix.STREAMING_MIN_SECONDS:
+        x = _test_signal(duration, sr, channels).astype(np.float32).reshape(channels, n)
+        engine = soundfix.engine_functions[algorithm]
+        seconds, y = _calibrated_time(lambda: engine(x, sr=sr, **preset), repeat)
+        case['mode'] = 'memory'
+        case['peak_mb'] = _peak_memory(lambda: engine(x, sr=sr, **preset)) if memory else None
+        case['checksum'] = hashlib.sha1(np.ascontiguousarray(y).tobytes()).hexdigest()
+        case['out_rms'] = float(np.sqrt(np.mean(np.square(y, dtype=np.float64)))) if y.size else 0.0
+        case['out_peak'] = float(np.max(np.abs(y))) if y.size else 0.0
+        case['finite'] = bool(np.all(np.isfinite(y)))
+        # Kiểm tra tương đương: streaming so với trong bộ nhớ, và từng kênh so với nhiều kênh
+        if duration <= SUITE_STREAM_CHECK_SECONDS:
+            step = soundfix.STREAM_BLOCK_SIZE
+            y_stream, _, _ = _run_stream(algorithm, preset, sr, (x[:, i:i + step] for i in range(0, n, step)), channels)
+            case['stream_maxdiff'] = float(np.max(np.abs(y_stream - y))) if y.size else 0.0
+        if channels > 1:
+            y_single = engine(x[:1], sr=sr, **preset)
+            case['channel_maxdiff'] = float(np.max(np.abs(y_single - y[:1]))) if y.size else 0.0
+    else:
+        block = _test_signal(soundfix.STREAM_BLOCK_SIZE / sr, sr, channels).astype(np.float32).reshape(channels, -1)
+        best, result = float('inf'), None
+        for _ in range(repeat):
+            digest = hashlib.sha1()
+            t0 = time.perf_counter()
+            _, sum_sq, peak = _run_stream(algorithm, preset, sr, _stream_blocks(block, n), channels, digest)
+            best = min(best, time.perf_counter() - t0)
+            result = (digest.hexdigest(), sum_sq, peak)
+        seconds = best
+        case['mode'] = 'stream'
+        case['peak_mb'] = _peak_memory(lambda: _run_stream(algorithm, preset, sr, _stream_blocks(block, n), channels, hashlib.sha1())) if memory else None
+        case['checksum'], sum_sq, case['out_peak'] = result
+        case['out_rms'] = float(np.sqrt(sum_sq / (n * channels))) if n else 0.0
+        case['finite'] = bool(np.isfinite(sum_sq))
+    case['seconds'] = seconds
+    case['realtime'] = duration / seconds if seconds > 0 else None
+    case['msamples_per_sec'] = n * channels / seconds / 1e6 if seconds > 0 else None
+    return case
+
+def _environment() -> Dict[str, str]:
+    import scipy
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'platform': platform.platform(), 'cpu_count': str(os.cpu_count())}
+
+def _diff_cell(value: Optional[float], tolerance: float) -> str:
+    if value is None:
+        return "-"
+    return "bit" if value == 0 else ("ok " if value <= tolerance else "KHÁC ") + f"{value:.1e}"
+
+def bench_suite(args: argparse.Namespace) -> int:
+    presets = soundfix.load_presets_from_csv(args.csv)
+    preset = next((p for p in presets if p['category_name'] == args.category), None) if args.category else presets[0]
+    if preset is None:
+        print(f"Không có preset '{args.category}' trong {args.csv}")
+        return 2
+    matrix = dict(SUITE_MATRICES[args.matrix])
+    for key in ('durations', 'sample_rates', 'channels'):
+        if getattr(args, key):
+            matrix[key] = getattr(args, key)
+    algorithms = args.algorithms or list(soundfix.engine_functions)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('preset') != preset['category_name']:
+            print(f"⚠️ Baseline đo với preset '{baseline.get('preset')}', lần này '{preset['category_name']}'")
+
+    soundfix.warm_gain_smoother()
+    results, rows, regressions = {}, [], 0
+    for algorithm in algorithms:
+        for sr in matrix['sample_rates']:
+            # Gọi trước để thiết kế bộ lọc (cache theo sr) không tính vào thời gian
+            soundfix.engine_functions[algorithm](_test_signal(0.1, sr, 2).astype(np.float32), sr=sr, **preset)
+            for duration in matrix['durations']:
+                for channels in matrix['channels']:
+                    case = _run_case(algorithm, preset, duration, sr, channels, args.repeat, not args.no_memory)
+                    key = _case_key(algorithm, duration, sr, channels)
+                    results[key] = case
+                    row = [algorithm, str(sr), f"{duration:g}s", str(channels), case['mode'], f"{case['seconds'] * 1000:.1f}",
+                           f"{case['realtime']:.0f}x" if case['realtime'] else "-", f"{case['msamples_per_sec']:.1f}" if case['msamples_per_sec'] else "-",
+                           f"{case['peak_mb']:.1f}" if case['peak_mb'] is not None else "-",
+                           _diff_cell(case.get('stream_maxdiff'), args.tolerance), _diff_cell(case.get('channel_maxdiff'), args.tolerance),
+                           "yes" if case['finite'] else "NaN"]
+                    if baseline is not None:
+                        old = baseline['results'].get(key)
+                        if old is None:
+                            row += ["-", "-", "mới"]
+                        else:
+                            ratio = case['seconds'] / old['seconds'] if old['seconds'] > 0 else float('inf')
+                            mem_ratio = case['peak_mb'] / old['peak_mb'] if case['peak_mb'] is not None and old.get('peak_mb') else None
+                            if case['checksum'] == old['checksum']:
+                                output = "giống hệt"
+                            else:
+                                rel = abs(case['out_rms'] - old['out_rms']) / max(old['out_rms'], 1e-12)
+                                output = f"khác (rms {rel:.1e})"
+                            slower = ratio > args.threshold
+                            regressions += slower
+                            row += [f"{ratio:.2f}x" + (" ⚠️" if slower else ""), f"{mem_ratio:.2f}x" if mem_ratio else "-", output]
+                    rows.append(row)
+    header = ["algorithm", "sr", "duration", "ch", "mode", "ms", "realtime", "Msamples/s", "peak MB", "stream", "per-channel", "finite"]
+    if baseline is not None:
+        header += ["time vs baseline", "mem vs baseline", "output"]
+    print(f"Benchmark suite '{args.matrix}', preset '{preset['category_name']}' (best of {args.repeat})")
+    _print_table(header, rows)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'preset': preset['category_name'], 'matrix': matrix, 'repeat': args.repeat,
+                       'environment': _environment(), 'results': results}, f, ensure_ascii=False, indent=1)
+        print(f"Đã lưu baseline: {args.save_baseline}")
+    if baseline is not None and regressions:
+        print(f"❌ {regressions} trường hợp chậm hơn baseline quá {args.threshold:.2f}x")
+        return 1
+    return 0
+
+
+# ==============================================================================
+# NGHE THỬ: ĐỘ TRỄ RENDER KHI ĐỔI THAM SỐ
+# ==============================================================================
+def bench_preview(args: argparse.Namespace) -> None:
+    import soundfile as sf
+    presets = soundfix.load_presets_from_csv(args.csv)
+    preset = presets[0]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for duration in args.durations:
+            path = os.path.join(tmp, f"preview_{duration:g}s.wav")
+            sf.write(path, _test_signal(duration, args.sr, args.channels).reshape(args.channels, -1).T, args.sr, subtype='PCM_24')
+            for algorithm in args.algorithms or list(soundfix.engine_functions):
+                # Lượt khởi động (import, biên dịch numba) không tính; "lần đầu" là khi mọi cache còn trống
+                soundfix.render_preview(path, algorithm, preset)
+                soundfix.clear_preview_cache()
+                soundfix.design_sos.cache_clear()
+                soundfix.design_brickwall_kernel.cache_clear()
+                soundfix.design_crossover.cache_clear()
+                cold, _ = _best_time(lambda: soundfix.render_preview(path, algorithm, preset), 1)
+                # Mỗi lần đổi lowcut là một bản render mới (giải mã và phân tích nguồn lấy từ cache)
+                steps = iter(range(1, 10 ** 6))
+                lowcut, _ = _best_time(lambda: soundfix.render_preview(path, algorithm, dict(preset, lowcut=preset['lowcut'] + next(steps))), args.repeat)
+                volume, _ = _best_time(lambda: soundfix.render_preview(path, algorithm, dict(preset, volume=preset['volume'] - next(steps))), args.repeat)
+                first_block, _ = _best_time(lambda: _first_preview_block(path, algorithm, dict(preset, highcut=preset['highcut'] - next(steps))), args.repeat)
+                rows.append([f"{duration:g}s", algorithm, f"{cold * 1000:.1f}", f"{lowcut * 1000:.1f}", f"{first_block * 1000:.1f}", f"{volume * 1000:.1f}"])
+    print(f"Nghe thử @ {args.sr} Hz, {args.channels} kênh, preset '{preset['category_name']}' (ms, best of {args.repeat})")
+    _print_table(["duration", "engine", "lần đầu", "đổi lowcut", "block đầu", "đổi volume"], rows)
+
+class _FirstBlock(Exception):
+    pass
+
+def _first_preview_block(path: str, algorithm: str, preset: Dict[str, Any]) -> None:
+    """Thời gian đến khi block đầu tiên sẵn sàng để phát (render dừng ở đó)."""
+    def stop(block: NDArray) -> None:
+        raise _FirstBlock
+    try:
+        soundfix.render_preview(path, algorithm, preset, on_block=stop)
+    except _FirstBlock:
+        pass
+
+
+# ==============================================================================
+# ĐO LOUDNESS (BS.1770) TRÊN OUTPUT ĐANG TRONG BỘ NHỚ
+# ==============================================================================
+def bench_loudness(args: argparse.Namespace) -> None:
+    import soundfile as sf
+    presets = soundfix.load_presets_from_csv(args.csv)
+    preset = presets[0]
+    engine = soundfix.engine_functions[args.algorithm]
+    sr = args.sr
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "output.wav")
+        for duration in args.durations:
+            x = _test_signal(duration, sr, args.channels).astype(np.float32).reshape(args.channels, -1)
+            t_engine, y = _best_time(lambda: engine(x, sr=sr, **preset), args.repeat)
+            t_lufs, _ = _best_time(lambda: soundfix.measure_loudness(y, sr, true_peak=False), args.repeat)
+            t_peak, measured = _best_time(lambda: soundfix.measure_loudness(y, sr), args.repeat)
+            # Cách cũ: công cụ thứ hai giải mã lại file output rồi mới đo
+            sf.write(path, y.T, sr, subtype='PCM_24')
+            t_tool, _ = _best_time(lambda: soundfix.measure_loudness(sf.read(path, dtype='float32', always_2d=True)[0].T, sr), args.repeat)
+            rows.append([f"{duration:g}s", f"{t_engine * 1000:.1f}", f"{t_lufs * 1000:.1f} ({duration / t_lufs:.0f}x)",
+                         f"{t_peak * 1000:.1f} ({duration / t_peak:.0f}x)", f"{t_tool * 1000:.1f}", f"{measured['lufs']:.2f}"])
+    print(f"Loudness @ {sr} Hz, {args.channels} kênh, engine '{args.algorithm}' (ms (x realtime), best of {args.repeat})")
+    _print_table(["duration", "engine", "LUFS", "LUFS + true peak", "giải mã lại + đo", "LUFS đo được"], rows)
+
+
+# ==============================================================================
+# PRESET BANK: BẢNG PRESET LỚN, BIÊN DỊCH MỘT LẦN SO VỚI ĐỌC LẠI MỖI LẦN CHẠY
+# ==============================================================================
+def _write_generated_csv(path: str, count: int, seed: int = 0) -> None:
+    """Bảng preset sinh tự động: mỗi preset hai keyword và một dải lọc riêng."""
+    rng = np.random.default_rng(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("priority,keywords,category_name,lowcut,highcut,volume,attenuation_db,gate_threshold_db,expansion_ratio\n")
+        for i in range(count):
+            lowcut, highcut = rng.integers(20, 2000), rng.integers(4000, 20000)
+            f.write(f'{i},"kw{i}_a,kw{i}_b",Category_{i},{lowcut},{highcut},1.0,-40,-60,2.0\n')
+
+def _clear_filter_designs() -> None:
+    for design in (soundfix.design_sos, soundfix.design_brickwall_kernel, soundfix.design_crossover):
+        design.cache_clear()
+    soundfix._BANK_SOS.clear()
+    soundfix._BANK_CROSSOVERS.clear()
+
+def _timed(fn: Callable[[], object]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+def bench_bank(args: argparse.Namespace) -> None:
+    rows = []
+    for count in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path, cache_dir = os.path.join(tmp, "presets.csv"), os.path.join(tmp, "cache")
+            _write_generated_csv(path, count)
+            # Cách cũ: mỗi lần chạy đọc CSV và dựng matcher, mỗi worker tự thiết kế bộ lọc
+            t_parse, presets = _best_time(lambda: soundfix.parse_presets_csv(open(path, encoding='utf-8')), args.repeat)
+            t_matcher, _ = _best_time(lambda: soundfix.build_preset_matcher(presets), args.repeat)
+            _clear_filter_designs()
+            t_warm = _timed(lambda: soundfix.warm_filter_cache(presets, args.algorithm))
+            # Lần đầu: biên dịch bank và thiết kế bộ lọc, lưu vào cache
+            _clear_filter_designs()
+
+            def cached() -> object:
+                bank = soundfix.compile_preset_bank(path, cache_dir)
+                bank.ensure_designs(args.algorithm)
+                return bank.matcher
+            t_compile = _timed(cached)
+            t_cached, _ = _best_time(cached, args.repeat)
+
+            def worker() -> None:
+                # Worker nhận bank qua pickle (chỉ đường dẫn) rồi khởi động như _init_worker
+                bank = soundfix.compile_preset_bank(path, cache_dir)
+                bank.ensure_designs(args.algorithm)
+                _clear_filter_designs()
+                bank = pickle.loads(pickle.dumps(bank))
+                bank.install()
+                bank.matcher
+                soundfix.warm_filter_cache(bank.presets, args.algorithm)
+            t_worker, _ = _best_time(worker, args.repeat)
+            rows.append([count, f"{t_parse * 1000:.1f}", f"{t_matcher * 1000:.1f}", f"{t_warm * 1000:.0f}",
+                         f"{t_compile * 1000:.0f}", f"{t_cached * 1000:.1f}", f"{t_worker * 1000:.1f}"])
+    print(f"Preset bank, engine '{args.algorithm}', {len(soundfix.COMMON_SAMPLE_RATES)} sample rate (ms, best of {args.repeat})")
+    _print_table(["preset", "đọc CSV", "matcher", "worker thiết kế lại", "biên dịch lần đầu", "nạp từ cache", "worker từ bank"], rows)
+
+
+# ==============================================================================
+# CHẾ ĐỘ DỊCH VỤ: ĐỘ TRỄ TỪ LÚC THẢ FILE ĐẾN LÚC CÓ OUTPUT
+# ==============================================================================
+def bench_service(args: argparse.Namespace) -> None:
+    import soundfile as sf
+    import threading
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, output = os.path.join(tmp, "in"), os.path.join(tmp, "out")
+        os.makedirs(folder)
+        source = os.path.join(tmp, "source.wav")
+        sf.write(source, _test_signal(args.duration, args.sr, args.channels).T, args.sr, subtype='PCM_24')
+        control = soundfix.BatchControl()
+        service = soundfix.IngestService([folder], output, args.csv, None, args.algorithm, args.workers,
+                                         poll_seconds=args.poll, settle_seconds=args.settle, control=control)
+        thread = threading.Thread(target=service.run)
+        thread.start()
+        while service.executor is None and thread.is_alive():
+            time.sleep(0.05)
+        # Thả file (tên khớp preset đầu tiên) vào folder theo dõi, đều đặn theo args.interval
+        keyword = soundfix.load_presets_from_csv(args.csv)[0]['keywords'][0]
+        for i in range(args.files):
+            tmp_path = os.path.join(folder, f".{keyword}_{i}.wav")
+            shutil.copy(source, tmp_path)
+            os.replace(tmp_path, os.path.join(folder, f"{keyword}_{i}.wav"))
+            time.sleep(args.interval)
+        deadline = time.perf_counter() + 60
+        while service.counts['success'] + service.counts['error'] < args.files and time.perf_counter() < deadline:
+            time.sleep(0.1)
+        status = service.status()
+        control.cancel()
+        thread.join()
+    rows = [[name, *(f"{status[key][p]:.3f}" if status[key][p] is not None else "-" for p in ('p50', 'p90', 'p99', 'max'))]
+            for name, key in (("phát hiện → output", 'latency_seconds'), ("trong worker", 'processing_seconds'))]
+    print(f"Dịch vụ: {args.files} file {args.duration:g}s @ {args.sr} Hz, mỗi {args.interval:g}s một file, {args.workers} worker, "
+          f"quét mỗi {args.poll:g}s, chờ ghi xong {args.settle:g}s (giây)")
+    _print_table(["", "p50", "p90", "p99", "max"], rows)
+    print(f"Throughput: {status['throughput']['files_per_minute']:.1f} file/phút, lỗi: {status['counts']['error']}")
+
+
+# ==============================================================================
+# CLI
+# ==============================================================================
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark SoundFix")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('limiter', help="So sánh apply_limiter_mono mới với bản vòng lặp cũ")
+    p.add_argument('--sr', type=int, default=48000)
+    p.add_argument('--durations', type=float, nargs='+', default=[1.0, 10.0, 60.0])
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_limiter)
+
+    p = sub.add_parser('channels', help="Xử lý nhiều kênh trong một lần gọi so với từng kênh")
+    p.add_argument('--csv', default='info.csv')
+    p.add_argument('--sr', type=int, default=48000)
+    p.add_argument('--durations', type=float, nargs='+', default=[0.1, 5.0])
+    p.add_argument('--channels', type=int, nargs='+', default=[1, 2, 6, 16])
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_channels)
+
+    p = sub.add_parser('brickwall', help="Engine FIR pha tuyến tính so với các engine Butterworth")
+    p.add_argument('--csv', default='info.csv')
+    p.add_argument('--sample-rates', type=int, nargs='+', default=[44100, 48000, 96000])
+    p.add_argument('--durations', type=float, nargs='+', default=[1.0, 10.0, 60.0])
+    p.add_argument('--channels', type=int, default=2)
+    p.add_argument('--transitions', type=float, nargs='+', default=[200.0, 50.0, 10.0], help="Dải chuyển tiếp (Hz) của kernel FIR")
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_brickwall)
+
+    p = sub.add_parser('preview', help="Độ trễ render nghe thử khi đổi tham số (có cache)")
+    p.add_argument('--csv', default='info.csv')
+    p.add_argument('--sr', type=int, default=48000)
+    p.add_argument('--channels', type=int, default=2)
+    p.add_argument('--durations', type=float, nargs='+', default=[0.5, 2.0, 10.0])
+    p.add_argument('--algorithms', nargs='+', choices=list(soundfix.engine_functions))
+    p.add_argument('--repeat', type=int, default=5)
+    p.set_defaults(func=bench_preview)
+
+    p = sub.add_parser('loudness', help="Chi phí đo loudness / true peak trên output engine so với giải mã lại file")
+    p.add_argument('--csv', default='info.csv')
+    p.add_argument('--sr', type=int, default=48000)
+    p.add_argument('--channels', type=int, default=2)
+    p.add_argument('--durations', type=float, nargs='+', default=[1.0, 60.0, 600.0])
+    p.add_argument('--algorithm', default="Butterworth Filter", choices=list(soundfix.engine_functions))
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_loudness)
+
+    p = sub.add_parser('bank', help="Biên dịch / nạp preset bank so với đọc CSV và thiết kế bộ lọc mỗi lần chạy")
+    p.add_argument('--sizes', type=int, nargs='+', default=[100, 1000], help="Số preset của bảng sinh tự động")
+    p.add_argument('--algorithm', default="Dynamic Hybrid Brickwall", choices=list(soundfix.engine_functions))
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_bank)
+
+    p = sub.add_parser('service', help="Độ trễ từ lúc thả file vào folder theo dõi đến lúc có output (chế độ dịch vụ)")
+    p.add_argument('--csv', default='info.csv')
+    p.add_argument('--sr', type=int, default=48000)
+    p.add_argument('--channels', type=int, default=2)
+    p.add_argument('--duration', type=float, default=2.0, help="Độ dài mỗi file (giây)")
+    p.add_argument('--files', type=int, default=20)
+    p.add_argument('--interval', type=float, default=0.2, help="Khoảng cách giữa hai lần thả file (giây)")
+    p.add_argument('--workers', type=int, default=2)
+    p.add_argument('--poll', type=float, default=soundfix.SERVICE_POLL_SECONDS)
+    p.add_argument('--settle', type=float, default=soundfix.SERVICE_SETTLE_SECONDS)
+    p.add_argument('--algorithm', default="Dynamic Hybrid Brickwall", choices=list(soundfix.engine_functions))
+    p.set_defaults(func=bench_service)
+
+    p = sub.add_parser('startup', help="Thời gian import, mở cửa sổ và xử lý file đầu tiên")
+    p.add_argument('--csv', default='info.csv')
+    p.add_argument('--sr', type=int, default=48000)
+    p.add_argument('--algorithm', default="Dynamic Hybrid Brickwall", choices=list(soundfix.engine_functions))
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser('suite', help="Mọi engine trên ma trận độ dài / sample rate / số kênh, có so sánh baseline")
+    p.add_argument('--csv', default='info.csv')
+    p.add_argument('--category', help="Preset dùng để đo (mặc định: preset đầu tiên)")
+    p.add_argument('--matrix', choices=list(SUITE_MATRICES), default='quick')
+    p.add_argument('--algorithms', nargs='+', choices=list(soundfix.engine_functions))
+    p.add_argument('--durations', type=_positive_float, nargs='+', help="Ghi đè độ dài (giây) của ma trận")
+    p.add_argument('--sample-rates', type=int, nargs='+', help="Ghi đè sample rate của ma trận")
+    p.add_argument('--channels', type=int, nargs='+', help="Ghi đè số kênh của ma trận")
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--no-memory', action='store_true', help="Bỏ lượt đo bộ nhớ bằng tracemalloc")
+    p.add_argument('--tolerance', type=float, default=1e-4, help="Sai khác tối đa coi là tương đương")
+    p.add_argument('--save-baseline', metavar='PATH', help="Lưu kết quả làm baseline (JSON)")
+    p.add_argument('--compare', metavar='PATH', help="So sánh với baseline đã lưu")
+    p.add_argument('--threshold', type=float, default=1.25, help="Chậm hơn baseline quá tỉ lệ này là hồi quy (mã thoát 1)")
+    p.set_defaults(func=bench_suite)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
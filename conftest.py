@@ -0,0 +1,61 @@
+"""Fixture dùng chung cho các test của SoundFix."""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import soundfix
+
+CSV_PATH = Path(__file__).parent / "info.csv"
+
+
+@pytest.fixture(autouse=True)
+def preset_cache(tmp_path_factory, monkeypatch):
+    """Bank biên dịch trong test nằm trong thư mục tạm, không đụng tới ~/.cache/soundfix."""
+    cache_dir = tmp_path_factory.mktemp("preset_cache")
+    monkeypatch.setenv("SOUNDFIX_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture(scope="session")
+def csv_path():
+    return str(CSV_PATH)
+
+
+@pytest.fixture(scope="session")
+def presets():
+    with open(CSV_PATH, encoding="utf-8") as infile:
+        return soundfix.parse_presets_csv(infile)
+
+
+@pytest.fixture(scope="session")
+def preset(presets):
+    """Preset 'Board Piece': volume -2 dB để output khác đúng tín hiệu engine."""
+    return next(p for p in presets if p["category_name"] == "Board Piece")
+
+
+def synthetic_signal(seconds: float, sr: int, channels: int, seed: int = 0) -> np.ndarray:
+    """
+    Tín hiệu (n, channels): nhiễu trắng nhỏ + sine 60 Hz / 1 kHz / 12 kHz, nửa sau lớn
+    hơn 20 dB để limiter và gate đều phải làm việc.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    tones = np.sin(2 * np.pi * 60 * t) + 0.5 * np.sin(2 * np.pi * 1000 * t) + 0.3 * np.sin(2 * np.pi * 12000 * t)
+    envelope = np.where(t < seconds / 2, 0.02, 0.2)
+    data = (tones * envelope)[:, None] + 0.005 * rng.standard_normal((t.size, channels))
+    return data * np.linspace(1.0, 0.6, channels)
+
+
+@pytest.fixture
+def make_wav(tmp_path):
+    """make_wav(tên, giây, sr, số kênh, subtype) ghi một file thử trong tmp_path và trả về đường dẫn."""
+    import soundfile as sf
+
+    def make(name: str = "board_piece.wav", seconds: float = 1.0, sr: int = 48000, channels: int = 2,
+             subtype: str = "FLOAT", seed: int = 0) -> str:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sf.write(path, synthetic_signal(seconds, sr, channels, seed), sr, subtype=subtype)
+        return str(path)
+    return make
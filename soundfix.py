@@ -1,309 +1,4057 @@
 import os
+import re
+import sys
+import argparse
 import shutil
 import threading
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+# numpy được import ngay vì mọi thứ dưới đây đều dùng nó (và nó nhẹ so với phần còn lại).
+# scipy, soundfile, librosa và tkinter được import khi cần để khởi động nhanh.
 import numpy as np
 from numpy.typing import NDArray
-import librosa
-import soundfile as sf
-from scipy.signal import butter, sosfilt
-from pathlib import Path
+from pathlib import Path, PurePosixPath
+from functools import lru_cache
+from contextlib import contextmanager, nullcontext
 import datetime
+import time
 import csv
-from typing import Dict, List, Optional, Union, Any, Tuple
-
-# Xử lý import tkinterdnd2 một cách an toàn
-DND_SUPPORT = False
-try:
-    print("DEBUG: Attempting to import tkinterdnd2...")
-    from tkinterdnd2 import DND_FILES, TkinterDnD
-    DND_SUPPORT = True
-    print("DEBUG: tkinterdnd2 imported successfully.")
-except Exception as e:
-    print(f"DEBUG: Failed to import tkinterdnd2. Error type: {type(e).__name__}, Message: {e}")
-    # Tạo dummy classes để tránh lỗi type checking
-    class DND_FILES:
-        pass
-    
-    class TkinterDnD:
-        class Tk(tk.Tk):
-            def __init__(self, *args, **kwargs):
-                super().__init__(*args, **kwargs)
-            
-            def drop_target_register(self, *args, **kwargs):
+import io
+import json
+import hashlib
+import heapq
+import importlib
+import itertools
+import struct
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Union, Any, Tuple
+
+# ==============================================================================
+# LOGIC ĐỌC CẤU HÌNH VÀ XỬ LÝ ÂM THANH
+# ==============================================================================
+def load_presets_from_csv(csv_path: str) -> List[Dict[str, Any]]:
+    """
+    Preset của file CSV theo thứ tự priority, đọc trực tiếp và không ghi gì ra đĩa.
+    Lần chạy batch / service dùng compile_preset_bank để có bank biên dịch sẵn trong cache.
+    """
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Không tìm thấy file: {csv_path}")
+    with open(csv_path, mode='r', encoding='utf-8', newline='') as infile:
+        return parse_presets_csv(infile)
+
+class PresetError(ValueError):
+    """Lỗi dữ liệu preset: line là số dòng trong file CSV, column là tên cột (None nếu không rõ)."""
+    def __init__(self, reason: str, line: Optional[int] = None, column: Optional[str] = None):
+        self.reason, self.line, self.column = reason, line, column
+        where = ', '.join(part for part in (f"dòng {line}" if line else '', f"cột '{column}'" if column else '') if part)
+        super().__init__(f"{where[0].upper()}{where[1:]}: {reason}" if where else reason)
+
+# Cột bắt buộc của preset CSV và kiểu của các cột số; mọi cột số khác là float
+PRESET_REQUIRED_COLUMNS = ('priority', 'keywords', 'category_name', 'lowcut', 'highcut', 'volume',
+                           'attenuation_db', 'gate_threshold_db', 'expansion_ratio')
+PRESET_INT_COLUMNS = ('priority', 'lowcut', 'highcut')
+
+def parse_presets_csv(infile: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Đọc và kiểm tra preset từ nội dung CSV (file đã mở hoặc danh sách dòng), không qua cache.
+    Dữ liệu sai ném PresetError chỉ rõ dòng và cột.
+    """
+    reader = csv.DictReader(infile)
+    missing = [column for column in PRESET_REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise PresetError(f"thiếu cột {', '.join(missing)}", line=1)
+    presets = [_parse_preset_row(row, reader.line_num) for row in reader]
+    presets.sort(key=lambda x: x['priority'])
+    return presets
+
+def _parse_preset_row(row: Dict[str, str], line: int) -> Dict[str, Any]:
+    def text(column: str) -> str:
+        value = row.get(column)
+        if value is None:
+            raise PresetError("thiếu giá trị", line, column)
+        return value
+
+    def number(column: str, default: Optional[float] = None) -> Any:
+        # Cột tùy chọn (có default): thiếu cột hoặc ô trống thì dùng giá trị mặc định
+        value = row.get(column)
+        if value is None or not value.strip():
+            if default is None:
+                raise PresetError("thiếu giá trị", line, column)
+            return default
+        kind = int if column in PRESET_INT_COLUMNS else float
+        try:
+            parsed = kind(value)
+        except ValueError:
+            raise PresetError(f"'{value}' không phải số {'nguyên' if kind is int else 'thực'}", line, column) from None
+        if not np.isfinite(parsed):
+            raise PresetError(f"'{value}' không phải số hữu hạn", line, column)
+        return parsed
+
+    preset = {
+        'priority': number('priority'),
+        'keywords': [k.strip().lower() for k in text('keywords').split(',')],
+        'category_name': text('category_name'),
+        'lowcut': number('lowcut'),
+        'highcut': number('highcut'),
+        'volume': number('volume'),
+        'attenuation_db': number('attenuation_db'),
+        'gate_threshold_db': number('gate_threshold_db'),
+        'expansion_ratio': number('expansion_ratio'),
+    }
+    if not 0 < preset['lowcut'] < preset['highcut']:
+        raise PresetError(f"cần 0 < lowcut < highcut (đang là {preset['lowcut']} và {preset['highcut']})", line, 'lowcut')
+    # Các cột mb_* tùy chọn của Multiband Limiting: điểm chia dải và tham số limiter từng dải
+    preset['mb_xover_low'] = number('mb_xover_low', MULTIBAND_CROSSOVERS[0])
+    preset['mb_xover_high'] = number('mb_xover_high', MULTIBAND_CROSSOVERS[1])
+    if not 0 < preset['mb_xover_low'] < preset['mb_xover_high']:
+        raise PresetError("cần 0 < mb_xover_low < mb_xover_high", line, 'mb_xover_low')
+    for band, defaults in MULTIBAND_DEFAULTS.items():
+        for param, default in defaults.items():
+            key = f"mb_{band.lower()}_{param}"
+            preset[key] = number(key, default)
+            # ratio, attack và release là mẫu số trong limiter
+            if param != 'thresh' and preset[key] <= 0:
+                raise PresetError(f"cần giá trị dương (đang là {preset[key]:g})", line, key)
+    # Các cột target_lufs / true_peak_db tùy chọn của bước chuẩn hóa loudness. Chỉ có trong
+    # preset khi ô có giá trị, nên preset không chuẩn hóa giữ nguyên fingerprint trong manifest.
+    for key in LOUDNESS_COLUMNS:
+        if (row.get(key) or '').strip():
+            preset[key] = number(key)
+    return preset
+
+def get_preset_for_file(filename: str, presets: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    fn_lower = filename.lower()
+    for preset in presets:
+        if any(keyword in fn_lower for keyword in preset['keywords']): 
+            return preset
+    return None
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """Regex dạng trie cho tập keyword; nhánh dài hơn được ưu tiên (greedy)."""
+    trie: Dict[str, Any] = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+    def build(node: Dict[str, Any]) -> str:
+        ends = '' in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if ends:
+            return '(?:' + body + ')?'
+        return body
+    return build(trie)
+
+def build_preset_matcher(presets: List[Dict[str, Any]]) -> Callable[[str], Optional[Dict[str, Any]]]:
+    """
+    Biên dịch keyword của mọi preset thành một regex duy nhất, cho cùng kết quả với
+    get_preset_for_file: preset đầu tiên (theo thứ tự priority) có keyword nằm trong tên file.
+
+    Keyword chứa một keyword khác có priority tốt hơn (hoặc bằng) là thừa nên bị bỏ.
+    Sau bước này, trong các keyword cùng bắt đầu tại một vị trí, keyword dài nhất luôn
+    có priority tốt nhất, nên regex trie greedy chỉ cần tìm tại mỗi vị trí một lần.
+    """
+    return _matcher_from_tables(presets, preset_matcher_tables(presets))
+
+def preset_matcher_tables(presets: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Phần dữ liệu của build_preset_matcher (lưu được dạng JSON trong preset bank):
+    catch_all là chỉ số preset có keyword rỗng, best là keyword → chỉ số preset tốt nhất,
+    keywords là các keyword còn lại sau khi bỏ keyword thừa.
+    """
+    # Keyword rỗng khớp mọi tên file (giống `'' in fn_lower`)
+    catch_all = next((i for i, p in enumerate(presets) if '' in p['keywords']), None)
+    best: Dict[str, int] = {}
+    for i, preset in enumerate(presets):
+        if catch_all is not None and i >= catch_all:
+            break
+        for keyword in preset['keywords']:
+            best.setdefault(keyword, i)
+    keywords = [k for k in best
+                if not any(other != k and other in k and best[other] <= best[k] for other in best)]
+    return {'catch_all': catch_all, 'best': best, 'keywords': keywords}
+
+def _matcher_from_tables(presets: List[Dict[str, Any]], tables: Dict[str, Any]) -> Callable[[str], Optional[Dict[str, Any]]]:
+    catch_all, best, keywords = tables['catch_all'], tables['best'], tables['keywords']
+    pattern = re.compile('(?=(' + _trie_pattern(keywords) + '))') if keywords else None
+
+    def match(filename: str) -> Optional[Dict[str, Any]]:
+        index = catch_all
+        if pattern is not None:
+            for m in pattern.finditer(filename.lower()):
+                found = best[m.group(1)]
+                if index is None or found < index:
+                    index = found
+                    if index == 0:
+                        break
+        return None if index is None else presets[index]
+    return match
+
+def classify_files(file_paths: Iterable[str], matcher: Callable[[str], Optional[Dict[str, Any]]]) -> Iterator[Tuple[str, Optional[str]]]:
+    """(đường dẫn, tên category hoặc None) cho từng file, không xử lý âm thanh."""
+    for file_path in file_paths:
+        preset = matcher(os.path.basename(file_path))
+        yield file_path, preset['category_name'] if preset else None
+
+def write_classification_report(file_paths: Iterable[str], matcher: Callable[[str], Optional[Dict[str, Any]]],
+                                report_path: Union[str, Path]) -> Dict[str, int]:
+    """Ghi báo cáo dry-run file → category ra CSV, trả về số file theo từng category."""
+    counts: Dict[str, int] = {}
+    with open(report_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'category_name'])
+        for file_path, category in classify_files(file_paths, matcher):
+            writer.writerow([file_path, category or ''])
+            counts[category or ''] = counts.get(category or '', 0) + 1
+    return counts
+
+# ==============================================================================
+# PRESET BANK: CSV ĐÃ BIÊN DỊCH, CACHE TRÊN ĐĨA
+# ==============================================================================
+# Tăng khi thay đổi định dạng bank, cách đọc CSV hoặc bộ lọc thiết kế sẵn, để bank cũ trên đĩa được biên dịch lại
+PRESET_BANK_VERSION = 2
+# Số bank (file CSV khác nhau) giữ lại trong thư mục cache, bank cũ nhất bị xóa trước
+PRESET_BANK_CACHE_SIZE = 32
+
+def preset_cache_dir() -> Path:
+    """Thư mục cache của preset bank: $SOUNDFIX_CACHE_DIR, ngược lại <$XDG_CACHE_HOME hoặc ~/.cache>/soundfix."""
+    if os.environ.get('SOUNDFIX_CACHE_DIR'):
+        return Path(os.environ['SOUNDFIX_CACHE_DIR'])
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'soundfix'
+
+def _preset_record_dtype(name_width: int) -> np.dtype:
+    """Một dòng của bảng preset, các cột theo thứ tự trong dict preset (trừ keywords)."""
+    mb_columns = [f"mb_{band.lower()}_{param}" for band, defaults in MULTIBAND_DEFAULTS.items() for param in defaults]
+    numbers = ['lowcut', 'highcut', 'volume', 'attenuation_db', 'gate_threshold_db', 'expansion_ratio',
+               'mb_xover_low', 'mb_xover_high', *mb_columns, *LOUDNESS_COLUMNS]
+    return np.dtype([('priority', 'i8'), ('category_name', f'U{max(1, name_width)}')] +
+                    [(name, 'i8' if name in PRESET_INT_COLUMNS else 'f8') for name in numbers])
+
+def _replace_file(path: Path, write: Callable[[Any], None], mode: str = 'wb') -> None:
+    """Ghi ra file tạm rồi đổi tên, để process khác không bao giờ đọc phải file ghi dở."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def _bank_designs(presets: List[Dict[str, Any]], algorithm: str, sample_rates: Optional[Iterable[int]] = None) -> Tuple[NDArray, List[List[Any]]]:
+    """
+    Các thiết kế SOS mà thuật toán dùng với mọi preset ở các sample rate phổ biến, xếp liền
+    nhau trong một mảng (n, 6); index là [loại, tham số..., dòng đầu, dòng cuối] của từng
+    thiết kế. sample_rates=None dùng COMMON_SAMPLE_RATES. Thiết kế không hợp lệ ở một
+    sample rate được bỏ qua như warm_filter_cache.
+    """
+    blocks: List[NDArray] = []
+    index: List[List[Any]] = []
+    rows = 0
+
+    def add(entry: List[Any], sos: NDArray) -> None:
+        nonlocal rows
+        index.append(entry + [rows, rows + len(sos)])
+        blocks.append(sos)
+        rows += len(sos)
+
+    designs = sorted({d for preset in presets for d in filter_designs_for(algorithm, preset)})
+    for sr in (COMMON_SAMPLE_RATES if sample_rates is None else sample_rates):
+        for order, lowcut, highcut in designs:
+            try:
+                add(['sos', order, lowcut, highcut, sr], design_sos(order, lowcut, highcut, sr, 'band'))
+            except ValueError:
                 pass
-            
-            def dnd_bind(self, *args, **kwargs):
+        if algorithm == 'Multiband Limiting':
+            for freq in sorted({f for preset in presets for f in crossover_layout(preset, sr)[0]}):
+                add(['crossover', freq, sr, CROSSOVER_ORDER], np.vstack(design_crossover(freq, sr)))
+    return (np.vstack(blocks) if blocks else np.empty((0, 6))), index
+
+class PresetBank:
+    """
+    Preset đã biên dịch từ một file CSV: records là mảng có cấu trúc (một dòng mỗi preset,
+    theo priority, cột target_lufs / true_peak_db là NaN khi ô trống), keywords và bảng của
+    matcher, cùng thiết kế bộ lọc của từng thuật toán (ensure_designs).
+    Bank đã lưu trên đĩa được mở bằng memory map: pickle sang worker chỉ gửi đường dẫn, mọi
+    worker đọc chung một bản trong page cache. records và thiết kế chỉ được đọc.
+    """
+    def __init__(self, sha256: str, records: NDArray, keywords: List[List[str]], tables: Dict[str, Any], path: Optional[Path] = None):
+        self.sha256 = sha256
+        self.records = records
+        self.keywords = keywords
+        self.tables = tables
+        self.path = path
+        self.designs: Dict[str, Tuple[NDArray, List[List[Any]]]] = {}
+        self._presets: Optional[List[Dict[str, Any]]] = None
+        self._matcher: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None
+
+    @classmethod
+    def from_presets(cls, presets: List[Dict[str, Any]], sha256: str) -> 'PresetBank':
+        dtype = _preset_record_dtype(max((len(p['category_name']) for p in presets), default=1))
+        records = np.zeros(len(presets), dtype=dtype)
+        for i, preset in enumerate(presets):
+            records[i] = tuple(preset.get(name, np.nan) for name in dtype.names)
+        return cls(sha256, records, [p['keywords'] for p in presets], preset_matcher_tables(presets))
+
+    def _file(self, suffix: str) -> Path:
+        return Path(f"{self.path}{suffix}")
+
+    @classmethod
+    def load(cls, path: Path, sha256: str) -> Optional['PresetBank']:
+        """Bank đã lưu ở path nếu còn dùng được (cùng phiên bản, cùng hash CSV), ngược lại None."""
+        bank = cls(sha256, np.empty(0), [], {}, path)
+        try:
+            with open(bank._file('.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != PRESET_BANK_VERSION or meta.get('sha256') != sha256:
+                return None
+            bank.records = np.load(bank._file('.npy'), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        bank.keywords, bank.tables = meta['keywords'], meta['matcher']
+        return bank
+
+    def save(self, path: Path) -> None:
+        """Lưu bank vào path (không có đuôi); file .json được ghi sau cùng nên có nó là bank đã đủ."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        _replace_file(self._file('.npy'), lambda f: np.save(f, self.records))
+        _replace_file(self._file('.json'), lambda f: json.dump({'version': PRESET_BANK_VERSION, 'sha256': self.sha256, 'keywords': self.keywords,
+                                                               'matcher': self.tables}, f, ensure_ascii=False), mode='w')
+
+    @property
+    def presets(self) -> List[Dict[str, Any]]:
+        """Preset dạng dict giống parse_presets_csv, theo priority (dùng chung, không được sửa)."""
+        if self._presets is None:
+            names = self.records.dtype.names
+            columns = {name: self.records[name].tolist() for name in names}
+            self._presets = []
+            for i, keywords in enumerate(self.keywords):
+                preset = {'priority': columns['priority'][i], 'keywords': list(keywords), 'category_name': columns['category_name'][i]}
+                for name in names[2:]:
+                    value = columns[name][i]
+                    if name not in LOUDNESS_COLUMNS or not np.isnan(value):
+                        preset[name] = value
+                self._presets.append(preset)
+        return self._presets
+
+    @property
+    def matcher(self) -> Callable[[str], Optional[Dict[str, Any]]]:
+        """Như build_preset_matcher(self.presets), nhưng dùng bảng keyword đã biên dịch sẵn."""
+        if self._matcher is None:
+            self._matcher = _matcher_from_tables(self.presets, self.tables)
+        return self._matcher
+
+    def ensure_designs(self, algorithm: str) -> bool:
+        """
+        Nạp thiết kế bộ lọc của thuật toán cho mọi preset ở COMMON_SAMPLE_RATES, hoặc thiết
+        kế rồi lưu cạnh bank khi chưa có (hay scipy đã đổi phiên bản). Trả về True khi vừa
+        phải thiết kế. Kernel FIR của Linear-Phase Brickwall không được lưu (dài hàng nghìn tap).
+        """
+        if algorithm in self.designs:
+            return False
+        import scipy
+        meta = {'version': PRESET_BANK_VERSION, 'sha256': self.sha256, 'scipy': scipy.__version__,
+                'algorithm': algorithm, 'sample_rates': list(COMMON_SAMPLE_RATES)}
+        slug = re.sub(r'\W+', '-', algorithm.lower())
+        if self.path is not None:
+            try:
+                with open(self._file(f'.{slug}.json'), encoding='utf-8') as f:
+                    stored = json.load(f)
+                if {k: stored.get(k) for k in meta} == meta:
+                    # Copy-on-write: sosfilt cần buffer ghi được dù không ghi, page vẫn dùng chung giữa các worker
+                    self.designs[algorithm] = (np.load(self._file(f'.{slug}.npy'), mmap_mode='c'), stored['index'])
+                    return False
+            except (OSError, ValueError):
+                pass
+        sections, index = _bank_designs(self.presets, algorithm)
+        self.designs[algorithm] = (sections, index)
+        if not index:
+            return False
+        if self.path is not None:
+            try:
+                _replace_file(self._file(f'.{slug}.npy'), lambda f: np.save(f, sections))
+                _replace_file(self._file(f'.{slug}.json'), lambda f: json.dump(dict(meta, index=index), f), mode='w')
+            except OSError:
+                pass
+        return True
+
+    def install(self) -> None:
+        """Cho design_sos / design_crossover của process này lấy thẳng các thiết kế đã nạp."""
+        for sections, index in self.designs.values():
+            for kind, *params, start, stop in index:
+                sos = sections[start:stop]
+                if kind == 'sos':
+                    _BANK_SOS[(*params, 'band')] = sos
+                else:
+                    # Crossover lưu liền LP (2m dòng), HP (2m dòng) và all-pass (m dòng)
+                    m = (stop - start) // 5
+                    _BANK_CROSSOVERS[tuple(params)] = (sos[:2 * m], sos[2 * m:4 * m], sos[4 * m:])
+
+    def sample_rate_problems(self, sample_rates: Optional[Iterable[int]] = None) -> List[str]:
+        """Mô tả các preset có lowcut không dùng được với file ở một vài sample rate (mặc định COMMON_SAMPLE_RATES)."""
+        rates = np.asarray(COMMON_SAMPLE_RATES if sample_rates is None else sample_rates)
+        bad = self.records['lowcut'][:, None] >= 0.99 * 0.5 * rates
+        return [f"Preset '{self.records['category_name'][i]}': lowcut {self.records['lowcut'][i]} Hz không dùng được "
+                f"với file {', '.join(str(sr) for sr in rates[bad[i]])} Hz"
+                for i in np.flatnonzero(bad.any(axis=1))]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        if self.path is None:
+            return dict(self.__dict__, _presets=None, _matcher=None)
+        # Bank trên đĩa: worker tự mở lại các file bằng memory map
+        return {'path': self.path, 'sha256': self.sha256, 'algorithms': list(self.designs)}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        if 'records' in state:
+            self.__dict__.update(state)
+            return
+        bank = PresetBank.load(state['path'], state['sha256'])
+        if bank is None:
+            raise PresetError(f"Preset bank {state['path']} đã bị xóa hoặc thay đổi")
+        self.__dict__.update(bank.__dict__)
+        for algorithm in state['algorithms']:
+            self.ensure_designs(algorithm)
+
+def _prune_preset_cache(cache_dir: Path, keep: int = PRESET_BANK_CACHE_SIZE) -> None:
+    """Xóa các bank cũ nhất (theo lần dùng gần nhất) khi thư mục cache có hơn keep bank."""
+    banks = sorted(cache_dir.glob('presets-*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+    for meta_path in banks[keep:]:
+        for path in cache_dir.glob(f"{meta_path.stem}.*"):
+            path.unlink(missing_ok=True)
+
+def compile_preset_bank(csv_path: Union[str, Path], cache_dir: Optional[Union[str, Path]] = None) -> PresetBank:
+    """
+    Preset bank của file CSV. Bank đã biên dịch trong cache_dir (mặc định preset_cache_dir())
+    được dùng lại khi SHA-256 của nội dung CSV trùng; CSV mới hoặc đã sửa được đọc, kiểm tra
+    (dữ liệu sai ném PresetError) rồi lưu lại. Cache không ghi được thì bank chỉ nằm trong bộ nhớ.
+    """
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Không tìm thấy file: {csv_path}")
+    data = Path(csv_path).read_bytes()
+    sha256 = hashlib.sha256(data).hexdigest()
+    cache_dir = Path(cache_dir) if cache_dir is not None else preset_cache_dir()
+    path = cache_dir / f"presets-{sha256[:16]}"
+    bank = PresetBank.load(path, sha256)
+    if bank is not None:
+        try:
+            # mtime của file .json là lần dùng gần nhất, để _prune_preset_cache giữ lại bank đang dùng
+            os.utime(bank._file('.json'))
+        except OSError:
+            pass
+        return bank
+    bank = PresetBank.from_presets(parse_presets_csv(io.StringIO(data.decode('utf-8'), newline='')), sha256)
+    try:
+        bank.save(path)
+        _prune_preset_cache(cache_dir)
+    except OSError:
+        bank.path = None
+    return bank
+
+# ==============================================================================
+# ĐO THỜI GIAN TỪNG BƯỚC (PROFILING)
+# ==============================================================================
+# Các bước được đo, theo thứ tự hiển thị; 'other' là phần còn lại của tổng thời gian
+PROFILE_STAGES = ('decode', 'analysis', 'filter_design', 'sosfilt', 'fir', 'rms', 'limiter', 'gate', 'loudness', 'nan_check', 'encode', 'other')
+
+# Bộ đo của thread hiện tại, None khi không bật profiling
+_PROFILE = threading.local()
+
+class _StageTimer:
+    """Cộng dồn thời gian riêng của từng bước: khi bước lồng nhau, bước ngoài tạm dừng."""
+    def __init__(self):
+        self.times: Dict[str, float] = {}
+        self.stack: List[List[Any]] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        now = time.perf_counter()
+        if self.stack:
+            parent = self.stack[-1]
+            self.times[parent[0]] = self.times.get(parent[0], 0.0) + now - parent[1]
+        entry = [name, now]
+        self.stack.append(entry)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.stack.pop()
+            self.times[name] = self.times.get(name, 0.0) + now - entry[1]
+            if self.stack:
+                self.stack[-1][1] = now
+
+def profile_stage(name: str):
+    """Context manager đo một bước; không làm gì khi thread hiện tại không bật profiling."""
+    timer = getattr(_PROFILE, 'timer', None)
+    return nullcontext() if timer is None else timer.stage(name)
+
+@contextmanager
+def profiling():
+    """Bật đo thời gian trên thread hiện tại trong khối with, trả về dict {bước: giây}."""
+    previous = getattr(_PROFILE, 'timer', None)
+    _PROFILE.timer = _StageTimer()
+    try:
+        yield _PROFILE.timer.times
+    finally:
+        _PROFILE.timer = previous
+
+def peak_rss_mb() -> Optional[float]:
+    """Bộ nhớ thường trú cao nhất từ khi process chạy (MB); None nếu không đo được (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss tính bằng byte trên macOS, KB trên Linux
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+# ==============================================================================
+# CACHE THIẾT KẾ BỘ LỌC
+# ==============================================================================
+# Số thiết kế SOS tối đa giữ trong cache của mỗi process
+FILTER_CACHE_SIZE = 512
+# Các sample rate được thiết kế sẵn khi bắt đầu batch
+COMMON_SAMPLE_RATES = (22050, 44100, 48000, 96000)
+# Multiband Limiting: điểm chia Low/Mid và Mid/High (Hz) và tham số limiter từng dải
+# khi CSV không có cột mb_xover_low / mb_xover_high / mb_<dải>_<tham số>
+MULTIBAND_CROSSOVERS = (250.0, 4000.0)
+MULTIBAND_DEFAULTS = {
+    'Low': {'thresh': -6.0, 'ratio': 4.0, 'attack_ms': 1.0, 'release_ms': 100.0},
+    'Mid': {'thresh': -4.0, 'ratio': 3.0, 'attack_ms': 5.0, 'release_ms': 50.0},
+    'High': {'thresh': -2.0, 'ratio': 2.0, 'attack_ms': 10.0, 'release_ms': 20.0},
+}
+# Bậc Butterworth của mỗi nhánh crossover; Linkwitz-Riley là bình phương nên dốc gấp đôi
+CROSSOVER_ORDER = 4
+
+# Thiết kế SOS / crossover của preset bank đang dùng trong process, theo đúng tham số của
+# design_sos và design_crossover (xem PresetBank.install)
+_BANK_SOS: Dict[Tuple[Any, ...], NDArray] = {}
+_BANK_CROSSOVERS: Dict[Tuple[Any, ...], Tuple[NDArray, NDArray, NDArray]] = {}
+
+def _check_lowcut(lowcut: float, sr: int, limit: float = 0.99) -> None:
+    """lowcut từ limit·Nyquist trở lên không tạo được bộ lọc ở sample rate này."""
+    if lowcut >= limit * 0.5 * sr:
+        raise PresetError(f"{lowcut:g} Hz không dùng được với file {sr} Hz (Nyquist {0.5 * sr:g} Hz)", column='lowcut')
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def design_sos(order: int, lowcut: float, highcut: float, sr: int, btype: str = 'band') -> NDArray:
+    """
+    Thiết kế Butterworth SOS, có cache theo (order, lowcut, highcut, sr, btype).
+    Mảng trả về được dùng chung giữa các lần gọi và các thread, không được sửa tại chỗ.
+    Thiết kế có sẵn trong preset bank đang dùng (PresetBank.install) được lấy thẳng từ bank.
+    """
+    sos = _BANK_SOS.get((order, lowcut, highcut, sr, btype))
+    if sos is not None:
+        return sos
+    from scipy.signal import butter
+    nyq = 0.5 * sr
+    if btype == 'band':
+        _check_lowcut(lowcut, sr)
+    low, high = max(0.01, lowcut / nyq), min(0.99, highcut / nyq)
+    sos = butter(order, [low, high], analog=False, btype=btype, output='sos')
+    return sos
+
+# Engine FIR pha tuyến tính: độ rộng dải chuyển tiếp (Hz) và độ suy hao stop-band (dB) của kernel
+FIR_TRANSITION_HZ = 50.0
+FIR_ATTENUATION_DB = 80.0
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def design_brickwall_kernel(lowcut: float, highcut: float, sr: int, attenuation_db: float, transition_hz: float = FIR_TRANSITION_HZ) -> NDArray:
+    """
+    Kernel FIR pha tuyến tính (độ dài lẻ) làm cả phép tách pass/stop của brickwall:
+    g·δ + (1 - g)·h_bp, với h_bp là band-pass cửa sổ Kaiser và g là mức giảm stop-band.
+    Dải chuyển tiếp không rộng quá lowcut để không vượt qua 0 Hz; highcut sát Nyquist
+    thì dùng high-pass. Có cache, mảng trả về không được sửa tại chỗ.
+    """
+    from scipy.signal import firwin, kaiserord
+    nyq = 0.5 * sr
+    _check_lowcut(lowcut, sr, limit=1.0)
+    transition = min(transition_hz, lowcut)
+    numtaps, beta = kaiserord(FIR_ATTENUATION_DB, transition / nyq)
+    numtaps |= 1
+    if highcut + transition / 2 >= nyq:
+        h_bp = firwin(numtaps, lowcut, window=('kaiser', beta), pass_zero='highpass', fs=sr)
+    else:
+        h_bp = firwin(numtaps, [lowcut, highcut], window=('kaiser', beta), pass_zero='bandpass', fs=sr)
+    reduction_gain = 10 ** (attenuation_db / 20.0)
+    kernel = (1 - reduction_gain) * h_bp
+    kernel[numtaps // 2] += reduction_gain
+    return kernel
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def design_crossover(freq: float, sr: int, order: int = CROSSOVER_ORDER) -> Tuple[NDArray, NDArray, NDArray]:
+    """
+    Một điểm chia Linkwitz-Riley: (low-pass, high-pass, all-pass) dạng SOS. LP và HP là
+    Butterworth bình phương nên LP + HP bằng đúng all-pass có cùng mẫu số (tử số là mẫu
+    số đảo ngược): các dải cộng lại chỉ lệch pha, không lệch biên độ. Có cache.
+    """
+    bank_design = _BANK_CROSSOVERS.get((freq, sr, order))
+    if bank_design is not None:
+        return bank_design
+    from scipy.signal import butter
+    wn = min(0.99, freq / (0.5 * sr))
+    lowpass = butter(order, wn, btype='low', output='sos')
+    highpass = butter(order, wn, btype='high', output='sos')
+    allpass = lowpass.copy()
+    allpass[:, :3] = lowpass[:, [5, 4, 3]]
+    return np.vstack([lowpass, lowpass]), np.vstack([highpass, highpass]), allpass
+
+def crossover_layout(preset: Dict[str, Any], sr: int) -> Tuple[List[float], List[str]]:
+    """
+    Bộ chia dải limiter của Multiband Limiting cho preset: các điểm chia (mb_xover_low và
+    mb_xover_high, bỏ điểm sát Nyquist) và tên dải limiter của từng dải giữa hai điểm liền kề.
+    EQ lowcut / highcut của preset là bước riêng sau limiter (xem multiband_limiting_filter).
+    """
+    nyq = 0.5 * sr
+    xover_low, xover_high = preset.get('mb_xover_low', MULTIBAND_CROSSOVERS[0]), preset.get('mb_xover_high', MULTIBAND_CROSSOVERS[1])
+    points = sorted({float(p) for p in (xover_low, xover_high) if 0 < p < 0.99 * nyq})
+    edges = [0.0] + points + [nyq]
+    band_names = ['Low' if hi <= xover_low else 'High' if lo >= xover_high else 'Mid' for lo, hi in zip(edges[:-1], edges[1:])]
+    return points, band_names
+
+def filter_cache_info() -> Dict[str, int]:
+    """Thống kê gộp của mọi cache thiết kế bộ lọc (SOS, kernel FIR, crossover)."""
+    infos = [f.cache_info() for f in (design_sos, design_brickwall_kernel, design_crossover)]
+    return {'hits': sum(i.hits for i in infos), 'misses': sum(i.misses for i in infos),
+            'size': sum(i.currsize for i in infos), 'maxsize': sum(i.maxsize for i in infos)}
+
+def filter_designs_for(algorithm: str, preset: Dict[str, Any]) -> List[Tuple[int, float, float]]:
+    """Các bộ lọc (order, lowcut, highcut) mà một thuật toán dùng với preset này."""
+    if algorithm == 'Butterworth Filter':
+        return [(20, preset['lowcut'], preset['highcut'])]
+    if algorithm == 'Hybrid Brickwall':
+        return [(24, preset['lowcut'], preset['highcut'])]
+    if algorithm == 'Dynamic Hybrid Brickwall':
+        return [(32, preset['lowcut'], preset['highcut'])]
+    if algorithm == 'Multiband Limiting':
+        # EQ sau limiter, như Hybrid Brickwall
+        return [(24, preset['lowcut'], preset['highcut'])]
+    return []
+
+def warm_filter_cache(presets: List[Dict[str, Any]], algorithm: str, sample_rates=COMMON_SAMPLE_RATES) -> None:
+    """
+    Thiết kế trước các bộ lọc của mọi preset cho các sample rate phổ biến.
+    Thiết kế không hợp lệ ở một sample rate (vd. lowcut vượt Nyquist) được bỏ qua,
+    lỗi sẽ được báo khi xử lý file tương ứng.
+    """
+    designs = {d for preset in presets for d in filter_designs_for(algorithm, preset)}
+    kernels = {(p['lowcut'], p['highcut'], p['attenuation_db']) for p in presets} if algorithm == 'Linear-Phase Brickwall' else set()
+    for sr in sample_rates:
+        for order, lowcut, highcut in designs:
+            try:
+                design_sos(order, lowcut, highcut, sr, 'band')
+            except ValueError:
+                pass
+        for lowcut, highcut, attenuation_db in kernels:
+            try:
+                design_brickwall_kernel(lowcut, highcut, sr, attenuation_db)
+            except ValueError:
                 pass
+        if algorithm == 'Multiband Limiting':
+            for freq in {f for preset in presets for f in crossover_layout(preset, sr)[0]}:
+                design_crossover(freq, sr)
+
+# Kiểu dữ liệu xử lý: float32 cho tốc độ và bộ nhớ, float64 cho độ chính xác.
+# Mọi engine giữ nguyên dtype của tín hiệu vào.
+PROCESSING_DTYPES = {'float32': np.float32, 'float64': np.float64}
+DEFAULT_DTYPE = 'float32'
+# Đệ quy của sosfilt luôn chạy trong float64 (với float32, bậc 32 ở 192 kHz sai tới -24 dB),
+# nên tín hiệu float32 được lọc theo đoạn chừng này mẫu thay vì đổi cả file sang float64
+SOSFILT_BLOCK_SIZE = 1 << 16
+
+def sosfilt_blocks(sos: NDArray, x: NDArray, zi: Optional[NDArray] = None) -> Tuple[NDArray, NDArray]:
+    """
+    sosfilt theo trục cuối, trả về (y cùng dtype với x, trạng thái cuối). zi=None bắt đầu
+    từ trạng thái 0. Giống hệt từng bit với một lần sosfilt rồi ép kiểu, nhưng chỉ cần
+    bộ nhớ float64 cho một đoạn.
+    """
+    from scipy.signal import sosfilt
+    if zi is None:
+        zi = np.zeros((sos.shape[0],) + x.shape[:-1] + (2,))
+    if x.dtype == np.float64:
+        return sosfilt(sos, x, axis=-1, zi=zi)
+    y = np.empty(x.shape, dtype=x.dtype)
+    for start in range(0, x.shape[-1], SOSFILT_BLOCK_SIZE):
+        part = slice(start, start + SOSFILT_BLOCK_SIZE)
+        y[..., part], zi = sosfilt(sos, x[..., part], axis=-1, zi=zi)
+    return y, zi
+
+def butter_filter(data: NDArray, lowcut: int, highcut: int, sr: int, order: int = 20, btype: str = 'band') -> NDArray:
+    """Lọc mọi kênh theo trục cuối, giữ nguyên dtype của data."""
+    with profile_stage('filter_design'):
+        sos = design_sos(order, lowcut, highcut, sr, btype)
+    with profile_stage('sosfilt'):
+        return sosfilt_blocks(sos, data)[0]
+
+def multiband_limiting_filter(data: NDArray, sr: int, **preset) -> NDArray:
+    """
+    Multiband Limiting Filter với 3 dải Low / Mid / High chia tại mb_xover_low và
+    mb_xover_high (mặc định 250 Hz và 4000 Hz). Tín hiệu được tách một lần bằng bộ chia
+    Linkwitz-Riley (xem _CrossoverBank) nên các dải cộng lại không hở hay chồng nhau.
+    Mỗi dải qua limiter riêng, rồi tổng được tách pass/stop tại lowcut / highcut như
+    Hybrid Brickwall (Butterworth bậc 24) để ngoài dải giảm đúng attenuation_db.
+    """
+    x = data if data.ndim == 2 else data[np.newaxis]
+    with profile_stage('filter_design'):
+        bank = _CrossoverBank(x.shape[0], sr, preset)
+    limiting_params = _multiband_limiting_params(preset)
+    result = np.zeros_like(x)
+    for name, band in bank.bands(x):
+        params = limiting_params[name]
+        gain_signal = limiter_gain_signal(band, 10 ** (params['threshold'] / 20.0), params['ratio'],
+                                          limiter_samples(params['attack'], sr), limiter_samples(params['release'], sr))
+        result += (band * gain_signal).astype(x.dtype, copy=False)
+    return hybrid_brickwall_filter(result, sr, **preset).reshape(data.shape)
+
+def _multiband_limiting_params(preset: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Tham số limiter (dB, ratio, giây) của từng dải, lấy từ các cột mb_* của preset."""
+    params = {}
+    for band, defaults in MULTIBAND_DEFAULTS.items():
+        value = lambda param: preset.get(f"mb_{band.lower()}_{param}", defaults[param])
+        params[band] = {'threshold': value('thresh'), 'ratio': value('ratio'),
+                        'attack': value('attack_ms') / 1000, 'release': value('release_ms') / 1000}
+    return params
+
+def limiter_samples(seconds: float, sr: int) -> int:
+    """Thời gian attack / release (giây) thành số mẫu, ít nhất 1 mẫu (hệ số làm mượt là 1/số mẫu)."""
+    return max(1, int(seconds * sr))
+
+def apply_limiter(data: NDArray, sr: int, threshold: float, ratio: float, attack: float, release: float) -> NDArray:
+    """
+    Áp dụng limiter cho một dải tần số, mọi kênh được xử lý cùng lúc
+    """
+    # Chuyển đổi thời gian attack/release thành số mẫu
+    attack_samples = limiter_samples(attack, sr)
+    release_samples = limiter_samples(release, sr)
+    
+    # Chuyển đổi threshold từ dB sang linear
+    threshold_linear = 10 ** (threshold / 20.0)
+    
+    return apply_limiter_mono(data, threshold_linear, ratio, attack_samples, release_samples)
+
+def _smooth_gain_loop(target: NDArray, attack_alpha: float, release_alpha: float, prev: NDArray) -> NDArray:
+    """
+    Bộ làm mượt attack/release một cực: nhánh attack khi gain giảm, release khi gain tăng.
+    target có dạng (channels, frames), prev là gain trước đó của từng kênh. Trạng thái
+    được làm tròn về dtype của target ở mỗi bước để xử lý theo block cho kết quả
+    giống hệt xử lý một lần.
+    """
+    out = np.empty_like(target)
+    for ch in range(target.shape[0]):
+        last = prev[ch]
+        for i in range(target.shape[1]):
+            alpha = attack_alpha if target[ch, i] < last else release_alpha
+            out[ch, i] = last + alpha * (target[ch, i] - last)
+            last = out[ch, i]
+    return out
+
+# Bộ làm mượt được biên dịch bằng numba ở lần gọi đầu tiên (nếu có numba)
+_gain_smoother = None
+
+def _get_gain_smoother():
+    global _gain_smoother
+    if _gain_smoother is None:
+        try:
+            from numba import njit
+            _gain_smoother = njit(cache=True, nogil=True)(_smooth_gain_loop)
+        except Exception:
+            _gain_smoother = _smooth_gain_loop
+    return _gain_smoother
+
+def warm_gain_smoother() -> None:
+    """Biên dịch (hoặc nạp từ cache của numba) bộ làm mượt cho các kiểu mảng limiter dùng."""
+    # Hai hàng để target[:, 1:] không liền bộ nhớ, giống khi bỏ frame đầu
+    target = np.ones((2, 3), dtype=np.float32)
+    for view in (target, target[:, 1:]):
+        _get_gain_smoother()(view, 0.5, 0.5, np.ones(2))
+
+def _limiter_gain(rms: NDArray, threshold: float, ratio: float) -> NDArray:
+    """Gain computer vector hóa: giảm phần vượt threshold theo ratio."""
+    over = rms > threshold
+    limited = rms - (rms - threshold) * (1 - 1 / ratio)
+    return np.where(over, np.divide(limited, rms, out=np.ones_like(rms), where=over), 1.0).astype(rms.dtype, copy=False)
+
+def _hop_block_sums(padded: NDArray, hop_length: int) -> NDArray:
+    blocks = padded.reshape(padded.shape[:-1] + (-1, hop_length))
+    return np.square(blocks).sum(axis=-1)
+
+def _rms_from_block_sums(sums: NDArray, frame_length: int, hop_length: int) -> NDArray:
+    k = frame_length // hop_length
+    n_frames = sums.shape[-1] - k + 1
+    total = sums[..., :n_frames].copy()
+    for i in range(1, k):
+        total += sums[..., i:i + n_frames]
+    return np.sqrt(total / frame_length)
+
+def frame_rms(data: NDArray, frame_length: int = 512, hop_length: int = 256) -> NDArray:
+    """
+    RMS theo frame, tương đương librosa.feature.rms(center=True): đệm 0 hai đầu
+    frame_length//2 mẫu, frame j có tâm tại mẫu j*hop_length. Kết quả được ghép từ
+    tổng bình phương (dtype của data) của từng block hop_length nên giống hệt _FrameRms
+    khi tín hiệu được đưa vào theo từng block.
+    """
+    if frame_length % hop_length:
+        raise ValueError("frame_length phải là bội số của hop_length")
+    with profile_stage('rms'):
+        n = data.shape[-1]
+        pad = frame_length // 2
+        n_blocks = n // hop_length + frame_length // hop_length
+        padded = np.zeros(data.shape[:-1] + (n_blocks * hop_length,), dtype=data.dtype)
+        n_copy = min(n, padded.shape[-1] - pad)
+        padded[..., pad:pad + n_copy] = data[..., :n_copy]
+        return _rms_from_block_sums(_hop_block_sums(padded, hop_length), frame_length, hop_length)
+
+def _frame_gain_to_samples(frame_gain: NDArray, length: int, hop_size: int) -> NDArray:
+    """
+    Nội suy tuyến tính gain theo frame (tâm frame tại j*hop) thành gain theo từng mẫu.
+    Sau tâm frame cuối cùng giữ nguyên giá trị cuối.
+    """
+    n_frames = frame_gain.shape[-1]
+    out = np.empty(frame_gain.shape[:-1] + (n_frames * hop_size,), dtype=frame_gain.dtype)
+    blocks = out.reshape(frame_gain.shape[:-1] + (n_frames, hop_size))
+    frac = np.arange(hop_size, dtype=frame_gain.dtype) / hop_size
+    np.multiply(np.diff(frame_gain, axis=-1)[..., np.newaxis], frac, out=blocks[..., :-1, :])
+    blocks[..., :-1, :] += frame_gain[..., :-1, np.newaxis]
+    blocks[..., -1, :] = frame_gain[..., -1:]
+    if length > out.shape[-1]:
+        out = np.concatenate([out, np.repeat(frame_gain[..., -1:], length - out.shape[-1], axis=-1)], axis=-1)
+    return out[..., :length]
+
+def apply_limiter_mono(data: NDArray, threshold: float, ratio: float, attack_samples: int, release_samples: int, interpolate: bool = True) -> NDArray:
+    """
+    Áp dụng limiter theo trục cuối; data có thể là một kênh (n,) hoặc (channels, n),
+    RMS và gain của mọi kênh được tính cùng lúc. Xem limiter_gain_signal.
+    """
+    data = np.asarray(data)
+    return data * limiter_gain_signal(data, threshold, ratio, attack_samples, release_samples, interpolate)
+
+def limiter_gain_signal(data: NDArray, threshold: float, ratio: float, attack_samples: int, release_samples: int, interpolate: bool = True) -> NDArray:
+    """
+    Gain theo từng mẫu mà limiter áp lên data (cùng dạng với data).
+
+    Gain computer và smoother không còn vòng lặp Python. Với interpolate=False gain
+    được giữ theo từng block hop như bản cũ (np.repeat) và kết quả khớp bản cũ trong
+    sai số làm tròn float32 (~1e-6). Với interpolate=True (mặc định) gain được nội suy
+    tuyến tính giữa các tâm frame; sai khác so với bản cũ bị chặn bởi
+    max|s[j+1] - s[j]| * |x|, tức bước nhảy gain lớn nhất giữa hai frame liền kề.
+    """
+    with profile_stage('limiter'):
+        # Tính RMS của tín hiệu
+        frame_size = 512
+        hop_size = 256
+        rms = frame_rms(data, frame_size, hop_size)
+
+        # Tính gain reduction
+        gain_reduction = _limiter_gain(rms, threshold, ratio)
+
+        # Smooth gain reduction với attack/release (frame đầu tiên giữ gain = 1 như cũ)
+        smoothed_gain = np.ones_like(gain_reduction)
+        if gain_reduction.shape[-1] > 1:
+            target = gain_reduction.reshape(-1, gain_reduction.shape[-1])[:, 1:]
+            smoothed = _get_gain_smoother()(target, 1.0 / max(1, attack_samples), 1.0 / max(1, release_samples), np.ones(target.shape[0]))
+            smoothed_gain[..., 1:] = smoothed.reshape(gain_reduction.shape[:-1] + (-1,))
+
+        # Gain reduction theo từng mẫu
+        n = data.shape[-1]
+        if interpolate:
+            return _frame_gain_to_samples(smoothed_gain, n, hop_size)
+        return np.repeat(smoothed_gain, hop_size, axis=-1)[..., :n]
+
+def hybrid_brickwall_filter(data: NDArray, sr: int, **preset) -> NDArray:
+    y_pass = butter_filter(data, preset['lowcut'], preset['highcut'], sr, order=24, btype='band')
+    y_stop = data - y_pass
+    reduction_gain = 10 ** (preset['attenuation_db'] / 20.0)
+    return y_pass + (y_stop * reduction_gain)
+
+def dynamic_hybrid_filter(data: NDArray, sr: int, **preset) -> NDArray:
+    y_pass = butter_filter(data, preset['lowcut'], preset['highcut'], sr, order=32, btype='band')
+    y_stop = data - y_pass
+    threshold = 10 ** (preset['gate_threshold_db'] / 20.0)
+    frame_size, hop_size = 512, 256
+    
+    # Gate phần stop-band của mọi kênh cùng lúc
+    with profile_stage('gate'):
+        rms = frame_rms(y_stop, frame_size, hop_size)
+        gain = np.where(rms < threshold, preset['expansion_ratio'], 1.0).astype(rms.dtype, copy=False)
+        smooth_gain = np.repeat(gain, hop_size, axis=-1)[..., :y_stop.shape[-1]]
+        y_stop_gated = (y_stop * smooth_gain).astype(y_stop.dtype, copy=False)
+        
+    reduction_gain = 10 ** (preset['attenuation_db'] / 20.0)
+    return y_pass + y_stop_gated * reduction_gain
+
+def apply_fir_kernel(data: NDArray, kernel: NDArray) -> NDArray:
+    """Tích chập overlap-add theo trục cuối, căn giữa kernel nên không trễ và không lệch pha."""
+    from scipy.signal import oaconvolve
+    if data.shape[-1] == 0:
+        return data
+    kernel = kernel.astype(data.dtype, copy=False).reshape((1,) * (data.ndim - 1) + (-1,))
+    with profile_stage('fir'):
+        return oaconvolve(data, kernel, mode='same', axes=-1).astype(data.dtype, copy=False)
+
+def linear_phase_brickwall_filter(data: NDArray, sr: int, **preset) -> NDArray:
+    """
+    Như hybrid_brickwall_filter nhưng tách pass/stop bằng một kernel FIR pha tuyến tính
+    áp dụng qua FFT: chi phí mỗi mẫu chỉ tăng theo log độ dài kernel, không lệch pha.
+    """
+    with profile_stage('filter_design'):
+        kernel = design_brickwall_kernel(preset['lowcut'], preset['highcut'], sr, preset['attenuation_db'])
+    return apply_fir_kernel(data, kernel)
+
+# Các engine xử lý, mọi engine nhận data dạng (n,) hoặc (channels, n)
+engine_functions = {
+    'Butterworth Filter': lambda d, sr, **p: butter_filter(d, p['lowcut'], p['highcut'], sr),
+    'Hybrid Brickwall': hybrid_brickwall_filter,
+    'Dynamic Hybrid Brickwall': dynamic_hybrid_filter,
+    'Multiband Limiting': multiband_limiting_filter,
+    'Linear-Phase Brickwall': linear_phase_brickwall_filter
+}
+
+# ==============================================================================
+# ĐỌC WAV / RF64 / W64 QUA MEMORY MAP
+# ==============================================================================
+# GUID của Sony Wave64 cho các chunk riff, wave, fmt và data
+_W64_RIFF = bytes.fromhex('726966662e91cf11a5d628db04c10000')
+_W64_WAVE = bytes.fromhex('77617665f3acd3118cd100c04f8edb8a')
+_W64_FMT = bytes.fromhex('666d7420f3acd3118cd100c04f8edb8a')
+_W64_DATA = bytes.fromhex('64617461f3acd3118cd100c04f8edb8a')
+# (mã định dạng WAVE, số bit) → (subtype như soundfile, dtype đọc từ đĩa, hệ số đổi sang [-1, 1))
+_WAV_SAMPLE_FORMATS = {
+    (1, 8): ('PCM_U8', 'u1', 2.0 ** -7),
+    (1, 16): ('PCM_16', '<i2', 2.0 ** -15),
+    (1, 24): ('PCM_24', '<i4', 2.0 ** -31),
+    (1, 32): ('PCM_32', '<i4', 2.0 ** -31),
+    (3, 32): ('FLOAT', '<f4', None),
+    (3, 64): ('DOUBLE', '<f8', None),
+}
+
+def _wav_chunks(f) -> Iterator[Tuple[bytes, int, int]]:
+    """(id, vị trí nội dung, kích thước) của các chunk trong file RIFF / RF64 / W64."""
+    f.seek(0)
+    head = f.read(40)
+    if head[:4] in (b'RIFF', b'RF64') and head[8:12] == b'WAVE':
+        pos, wide = 12, False
+    elif head[:16] == _W64_RIFF and head[24:40] == _W64_WAVE:
+        pos, wide = 40, True
+    else:
+        return
+    while True:
+        f.seek(pos)
+        header = f.read(24 if wide else 8)
+        if len(header) < (24 if wide else 8):
+            return
+        if wide:
+            # Kích thước chunk W64 tính cả header 24 byte, chunk căn theo 8 byte
+            chunk_id, size = header[:16], struct.unpack('<Q', header[16:])[0] - 24
+            yield chunk_id, pos + 24, size
+            pos += 24 + ((size + 7) & ~7)
+        else:
+            chunk_id, size = header[:4], struct.unpack('<I', header[4:])[0]
+            yield chunk_id, pos + 8, size
+            pos += 8 + size + (size & 1)
+
+def _wav_layout(audio_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Đọc header WAV / RF64 / W64 PCM hoặc float little-endian; None nếu không map được.
+    'complete' là False khi chunk data khai báo dài hơn phần có trên đĩa (file bị cắt / đang chép).
+    """
+    try:
+        with open(audio_path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            fmt, ds64_data_size = None, None
+            for chunk_id, start, size in _wav_chunks(f):
+                if chunk_id == b'ds64':
+                    f.seek(start)
+                    ds64_data_size = struct.unpack('<QQQ', f.read(24))[1]
+                elif chunk_id in (b'fmt ', _W64_FMT):
+                    f.seek(start)
+                    body = f.read(min(size, 40))
+                    tag, channels, samplerate, _, block_align, bits = struct.unpack('<HHIIHH', body[:16])
+                    if tag == 0xFFFE and len(body) >= 26:
+                        # WAVE_FORMAT_EXTENSIBLE: định dạng thật ở 2 byte đầu GUID subformat
+                        tag = struct.unpack('<H', body[24:26])[0]
+                    fmt = (tag, channels, samplerate, block_align, bits)
+                elif chunk_id in (b'data', _W64_DATA):
+                    if fmt is None:
+                        return None
+                    if size == 0xFFFFFFFF and ds64_data_size is not None:
+                        size = ds64_data_size
+                    tag, channels, samplerate, block_align, bits = fmt
+                    if (tag, bits) not in _WAV_SAMPLE_FORMATS or channels < 1 or block_align != channels * bits // 8:
+                        return None
+                    subtype, stored, scale = _WAV_SAMPLE_FORMATS[(tag, bits)]
+                    frames = min(size, file_size - start) // block_align
+                    return {'offset': start, 'frames': frames, 'channels': channels, 'samplerate': samplerate,
+                            'subtype': subtype, 'stored': stored, 'scale': scale, 'bits': bits, 'complete': size <= file_size - start}
+    except (OSError, struct.error):
+        return None
+    return None
+
+class MappedWav:
+    """
+    File WAV / RF64 / W64 mở bằng np.memmap: chỉ đọc header, mẫu được đổi sang float theo
+    từng block khi được đọc, giống hệt từng bit với soundfile (cùng hệ số lũy thừa 2).
+    Có các thuộc tính và hàm read / blocks như soundfile.SoundFile nên dùng thay được cho nó.
+    """
+    def __init__(self, audio_path: str, layout: Dict[str, Any]):
+        self.name = audio_path
+        self.samplerate, self.channels, self.frames = layout['samplerate'], layout['channels'], layout['frames']
+        self.subtype = layout['subtype']
+        self._scale, self._bits = layout['scale'], layout['bits']
+        shape = (self.frames, self.channels)
+        if not self.frames:
+            self._raw = np.zeros(shape, dtype=layout['stored'])
+        elif self._bits == 24:
+            # Mỗi mẫu 3 byte được đọc như int32 bắt đầu từ 1 byte trước nó (luôn có vì header nằm trước data):
+            # 3 byte cao là mẫu, byte thấp là rác của mẫu trước và được xóa khi đổi sang float
+            samples = self.frames * self.channels
+            mapped = np.memmap(audio_path, dtype=np.uint8, mode='r', offset=layout['offset'] - 1, shape=(3 * samples + 1,))
+            self._raw = np.ndarray(shape, dtype='<i4', buffer=mapped, strides=(3 * self.channels, 3))
+        else:
+            self._raw = np.memmap(audio_path, dtype=layout['stored'], mode='r', offset=layout['offset'], shape=shape)
+
+    def __enter__(self) -> 'MappedWav':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._raw = None
+
+    def _convert(self, raw: NDArray, dtype: str) -> NDArray:
+        if self._bits == 24:
+            # Giá trị 24 bit nằm ở 3 byte cao của int32 như libsndfile, nên hệ số là 2^-31
+            raw = np.bitwise_and(raw, -256)
+        if self._scale is None:
+            return raw.astype(dtype)
+        y = raw.astype(dtype)
+        if self._bits == 8:
+            y -= 128
+        y *= y.dtype.type(self._scale)
+        return y
+
+    def read(self, frames: int = -1, dtype: str = DEFAULT_DTYPE, always_2d: bool = False, start: int = 0) -> NDArray:
+        """Mẫu [start, start + frames) dạng (n, C) (hoặc (n,) với file mono khi always_2d=False)."""
+        stop = self.frames if frames < 0 else min(self.frames, start + frames)
+        y = self._convert(self._raw[start:stop], dtype)
+        return y if always_2d or self.channels > 1 else y[:, 0]
+
+    def read_channel(self, channel: int, dtype: str = DEFAULT_DTYPE, block_size: int = 1 << 18) -> NDArray:
+        """Một kênh (n,) liền bộ nhớ, đổi theo block để không cần bản float của cả file."""
+        out = np.empty(self.frames, dtype=dtype)
+        for start in range(0, self.frames, block_size):
+            out[start:start + block_size] = self._convert(self._raw[start:start + block_size, channel], dtype)
+        return out
+
+    def blocks(self, blocksize: int, dtype: str = DEFAULT_DTYPE, always_2d: bool = False) -> Iterator[NDArray]:
+        for start in range(0, self.frames, blocksize):
+            yield self.read(blocksize, dtype, always_2d, start)
+
+def open_mapped_wav(audio_path: str) -> Optional[MappedWav]:
+    """MappedWav nếu file là WAV / RF64 / W64 không nén đọc được bằng memory map, ngược lại None."""
+    layout = _wav_layout(audio_path)
+    return MappedWav(audio_path, layout) if layout is not None else None
+
+# ==============================================================================
+# XỬ LÝ THEO BLOCK (STREAMING) CHO FILE DÀI
+# ==============================================================================
+# File dài hơn ngưỡng này (giây) được tự động xử lý theo block
+STREAMING_MIN_SECONDS = 300.0
+# Số mẫu mỗi block khi đọc/ghi streaming
+STREAM_BLOCK_SIZE = 65536
+
+class _SosStage:
+    """sosfilt theo block, giữ trạng thái zi giữa các block."""
+    def __init__(self, sos: NDArray, channels: int):
+        self.sos = sos
+        self.zi = np.zeros((sos.shape[0], channels, 2))
+
+    def process(self, x: NDArray) -> NDArray:
+        if x.shape[-1] == 0:
+            return x
+        with profile_stage('sosfilt'):
+            y, self.zi = sosfilt_blocks(self.sos, x, self.zi)
+            return y
+
+class _FrameRms:
+    """frame_rms() cho tín hiệu đến theo block, cho kết quả giống hệt từng bit."""
+    def __init__(self, channels: int, frame_length: int = 512, hop_length: int = 256, dtype: str = DEFAULT_DTYPE):
+        self.frame_length, self.hop_length = frame_length, hop_length
+        # Các mẫu (đã đệm đầu) chưa đủ một block hop, và tổng block chưa ghép đủ frame;
+        # block có dtype khác thì theo block đó như frame_rms theo data
+        self.buffer = np.zeros((channels, frame_length // 2), dtype=dtype)
+        self.sums = np.zeros((channels, 0), dtype=dtype)
+
+    def _consume(self) -> NDArray:
+        n_blocks = self.buffer.shape[-1] // self.hop_length
+        if n_blocks:
+            new_sums = _hop_block_sums(self.buffer[:, :n_blocks * self.hop_length], self.hop_length)
+            self.buffer = self.buffer[:, n_blocks * self.hop_length:]
+            self.sums = np.concatenate([self.sums, new_sums], axis=-1)
+        n_ready = self.sums.shape[-1] - self.frame_length // self.hop_length + 1
+        if n_ready <= 0:
+            return np.zeros((self.sums.shape[0], 0), dtype=self.sums.dtype)
+        rms = _rms_from_block_sums(self.sums, self.frame_length, self.hop_length)
+        self.sums = self.sums[:, n_ready:]
+        return rms
+
+    def feed(self, x: NDArray) -> NDArray:
+        with profile_stage('rms'):
+            if self.buffer.dtype != x.dtype:
+                self.buffer, self.sums = self.buffer.astype(x.dtype), self.sums.astype(x.dtype)
+            self.buffer = np.concatenate([self.buffer, x], axis=-1)
+            return self._consume()
+
+    def finish(self) -> NDArray:
+        with profile_stage('rms'):
+            self.buffer = np.concatenate([self.buffer, np.zeros((self.buffer.shape[0], self.frame_length // 2), dtype=self.buffer.dtype)], axis=-1)
+            return self._consume()
+
+class _FramedGainStage:
+    """
+    Nhân tín hiệu đến theo block với gain tính từ RMS theo frame. Một mẫu chỉ được
+    xuất khi các frame chi phối nó đã đủ dữ liệu, nên đầu ra trễ tối đa frame_length
+    mẫu so với đầu vào; tín hiệu carry đi kèm được trễ tương ứng.
+    """
+    def __init__(self, channels: int, gain_fn, interpolate: bool, frame_length: int = 512, hop_length: int = 256,
+                 dtype: str = DEFAULT_DTYPE):
+        self.rms = _FrameRms(channels, frame_length, hop_length, dtype)
+        self.gain_fn, self.interpolate, self.hop_length = gain_fn, interpolate, hop_length
+        # Gain của các frame chưa dùng hết; mẫu chưa xuất bắt đầu tại tâm frame đầu tiên trong đó
+        self.gains: Optional[NDArray] = None
+        self.pending: Optional[NDArray] = None
+        self.carry: Optional[NDArray] = None
+
+    @staticmethod
+    def _append(buffer: Optional[NDArray], x: Optional[NDArray]) -> Optional[NDArray]:
+        if x is None:
+            return buffer
+        return x if buffer is None else np.concatenate([buffer, x], axis=-1)
+
+    def _apply(self, x: NDArray, gains: NDArray) -> NDArray:
+        length = x.shape[-1]
+        if length == 0:
+            return x
+        if self.interpolate:
+            gain_signal = _frame_gain_to_samples(gains, length, self.hop_length)
+        else:
+            gain_signal = np.repeat(gains, self.hop_length, axis=-1)[..., :length]
+        return (x * gain_signal).astype(x.dtype, copy=False)
+
+    def _emit(self, final: bool) -> Tuple[NDArray, Optional[NDArray]]:
+        if final:
+            out = self._apply(self.pending, self.gains)
+            carry = self.carry
+            self.pending = self.pending[..., :0]
+            self.carry = None if self.carry is None else self.carry[..., :0]
+            return out, carry
+        n_frames = self.gains.shape[-1] - 1 if self.interpolate else self.gains.shape[-1]
+        n_frames = max(0, min(n_frames, self.pending.shape[-1] // self.hop_length))
+        length = n_frames * self.hop_length
+        out = self._apply(self.pending[..., :length], self.gains[..., :n_frames + 1] if self.interpolate else self.gains[..., :n_frames])
+        self.gains = self.gains[..., n_frames:]
+        self.pending = self.pending[..., length:]
+        carry = None
+        if self.carry is not None:
+            carry, self.carry = self.carry[..., :length], self.carry[..., length:]
+        return out, carry
+
+    def process(self, x: NDArray, carry: Optional[NDArray] = None, detector: Optional[NDArray] = None) -> Tuple[NDArray, Optional[NDArray]]:
+        """detector: tín hiệu dùng để đo RMS nếu khác x."""
+        self.gains = self._append(self.gains, self.gain_fn(self.rms.feed(x if detector is None else detector)))
+        self.pending = self._append(self.pending, x)
+        self.carry = self._append(self.carry, carry)
+        return self._emit(final=False)
+
+    def flush(self) -> Tuple[NDArray, Optional[NDArray]]:
+        if self.pending is None:
+            # Chưa nhận mẫu nào (file rỗng): tín hiệu và carry đều rỗng
+            empty = np.zeros((self.rms.buffer.shape[0], 0), dtype=self.rms.buffer.dtype)
+            return empty, empty
+        self.gains = self._append(self.gains, self.gain_fn(self.rms.finish()))
+        return self._emit(final=True)
+
+class _LimiterGain:
+    """Gain computer + smoother của apply_limiter_mono, giữ trạng thái giữa các block."""
+    def __init__(self, channels: int, threshold: float, ratio: float, attack_samples: int, release_samples: int):
+        self.threshold, self.ratio = threshold, ratio
+        self.attack_alpha, self.release_alpha = 1.0 / max(1, attack_samples), 1.0 / max(1, release_samples)
+        self.prev = np.ones(channels)
+        self.started = False
+
+    def __call__(self, rms: NDArray) -> NDArray:
+        target = _limiter_gain(rms, self.threshold, self.ratio)
+        smoothed = np.ones_like(target)
+        start = 0
+        if not self.started and target.shape[-1]:
+            # Frame đầu tiên luôn giữ gain = 1
+            start, self.started = 1, True
+        if target.shape[-1] > start:
+            smoothed[:, start:] = _get_gain_smoother()(target[:, start:], self.attack_alpha, self.release_alpha, self.prev)
+            self.prev = smoothed[:, -1].astype(np.float64)
+        return smoothed
+
+class _CrossoverBank:
+    """
+    Bộ chia dải Linkwitz-Riley một lượt cho Multiband Limiting (xem crossover_layout).
+    Tại mỗi điểm chia, phần còn lại được tách bằng cặp LP/HP; dải thấp hơn đi qua
+    all-pass của mọi điểm chia phía trên để cùng pha, nên tổng các dải là all-pass
+    của đầu vào (tái tạo đủ biên độ, không hở hay chồng dải). Giữ trạng thái bộ lọc
+    nên dùng chung cho xử lý cả file và theo block.
+    """
+    def __init__(self, channels: int, sr: int, preset: Dict[str, Any]):
+        points, self.band_names = crossover_layout(preset, sr)
+        designs = [design_crossover(freq, sr) for freq in points]
+        self.splits = [(_SosStage(lowpass, channels), _SosStage(highpass, channels)) for lowpass, highpass, _ in designs]
+        self.allpass = [_SosStage(np.vstack([ap for _, _, ap in designs[i + 1:]]), channels) if i + 1 < len(designs) else None
+                        for i in range(len(designs))]
+
+    def bands(self, x: NDArray) -> Iterator[Tuple[str, NDArray]]:
+        """Tách x (channels, n) và trả về lần lượt (tên dải limiter, tín hiệu của dải), từ thấp lên cao."""
+        rest = x
+        for i, name in enumerate(self.band_names):
+            if i < len(self.splits):
+                lowpass, highpass = self.splits[i]
+                band = lowpass.process(rest)
+                if self.allpass[i] is not None:
+                    band = self.allpass[i].process(band)
+                rest = highpass.process(rest)
+            else:
+                band = rest
+            yield name, band
+
+class _ButterworthStream:
+    """dtype: kiểu float của các block sẽ được xử lý (PROCESSING_DTYPES), dùng cho bộ đệm của engine."""
+    def __init__(self, channels: int, sr: int, preset: Dict[str, Any], dtype: str = DEFAULT_DTYPE):
+        self.filter = _SosStage(design_sos(20, preset['lowcut'], preset['highcut'], sr, 'band'), channels)
+        self.channels, self.dtype = channels, np.dtype(dtype)
+
+    def process(self, x: NDArray) -> NDArray:
+        return self.filter.process(x)
+
+    def flush(self) -> NDArray:
+        return np.zeros((self.channels, 0), dtype=self.dtype)
+
+class _HybridStream(_ButterworthStream):
+    def __init__(self, channels: int, sr: int, preset: Dict[str, Any], dtype: str = DEFAULT_DTYPE):
+        self.filter = _SosStage(design_sos(24, preset['lowcut'], preset['highcut'], sr, 'band'), channels)
+        self.channels, self.dtype = channels, np.dtype(dtype)
+        self.reduction_gain = 10 ** (preset['attenuation_db'] / 20.0)
+
+    def process(self, x: NDArray) -> NDArray:
+        y_pass = self.filter.process(x)
+        return y_pass + ((x - y_pass) * self.reduction_gain)
+
+class _DynamicHybridStream(_ButterworthStream):
+    def __init__(self, channels: int, sr: int, preset: Dict[str, Any], dtype: str = DEFAULT_DTYPE):
+        self.filter = _SosStage(design_sos(32, preset['lowcut'], preset['highcut'], sr, 'band'), channels)
+        self.channels, self.dtype = channels, np.dtype(dtype)
+        threshold = 10 ** (preset['gate_threshold_db'] / 20.0)
+        ratio = preset['expansion_ratio']
+        self.gate = _FramedGainStage(channels, lambda rms: np.where(rms < threshold, ratio, 1.0).astype(rms.dtype, copy=False), interpolate=False,
+                                     dtype=dtype)
+        self.reduction_gain = 10 ** (preset['attenuation_db'] / 20.0)
+
+    def _combine(self, y_stop_gated: NDArray, y_pass: NDArray) -> NDArray:
+        return y_pass + y_stop_gated * self.reduction_gain
+
+    def process(self, x: NDArray) -> NDArray:
+        y_pass = self.filter.process(x)
+        with profile_stage('gate'):
+            return self._combine(*self.gate.process(x - y_pass, carry=y_pass))
+
+    def flush(self) -> NDArray:
+        with profile_stage('gate'):
+            return self._combine(*self.gate.flush())
+
+class _MultibandStream(_ButterworthStream):
+    def __init__(self, channels: int, sr: int, preset: Dict[str, Any], dtype: str = DEFAULT_DTYPE):
+        self.channels, self.dtype = channels, np.dtype(dtype)
+        self.bank = _CrossoverBank(channels, sr, preset)
+        limiting_params = _multiband_limiting_params(preset)
+        self.limiters = {}
+        for name in self.bank.band_names:
+            params = limiting_params[name]
+            gain_fn = _LimiterGain(channels, 10 ** (params['threshold'] / 20.0), params['ratio'],
+                                   limiter_samples(params['attack'], sr), limiter_samples(params['release'], sr))
+            self.limiters[name] = _FramedGainStage(channels, gain_fn, interpolate=True, dtype=dtype)
+        # EQ lowcut / highcut sau limiter, như multiband_limiting_filter
+        self.eq = _HybridStream(channels, sr, preset, dtype)
+
+    def _combine(self, limited_bands: List[NDArray]) -> NDArray:
+        result = np.zeros_like(limited_bands[0])
+        for band_data in limited_bands:
+            result += band_data
+        return self.eq.process(result)
+
+    def _limit(self, name: str, band: NDArray) -> NDArray:
+        with profile_stage('limiter'):
+            return self.limiters[name].process(band)[0]
+
+    def process(self, x: NDArray) -> NDArray:
+        return self._combine([self._limit(*band) for band in self.bank.bands(x)])
+
+    def flush(self) -> NDArray:
+        with profile_stage('limiter'):
+            limited_bands = [limiter.flush()[0] for limiter in self.limiters.values()]
+        return self._combine(limited_bands)
+
+class _LinearPhaseStream(_ButterworthStream):
+    """
+    Overlap-add theo block. Mẫu ra thứ n cần đầu vào đến n + L//2, nên đầu ra trễ L//2
+    mẫu so với đầu vào và phần còn lại được xuất khi flush. Khác bản trong bộ nhớ
+    ở mức làm tròn float32 do FFT theo block có kích thước khác.
+    """
+    def __init__(self, channels: int, sr: int, preset: Dict[str, Any], dtype: str = DEFAULT_DTYPE):
+        self.channels, self.dtype = channels, np.dtype(dtype)
+        kernel = design_brickwall_kernel(preset['lowcut'], preset['highcut'], sr, preset['attenuation_db'])
+        self.kernel = kernel[None, :]
+        self.tail = np.zeros((channels, kernel.shape[0] - 1), dtype=self.dtype)
+        # Số mẫu đầu của tích chập 'full' cần bỏ để căn giữa kernel
+        self.skip = kernel.shape[0] // 2
+        self.remaining = 0
+
+    def _emit(self, y: NDArray) -> NDArray:
+        drop = min(self.skip, y.shape[-1])
+        self.skip -= drop
+        y = y[:, drop:drop + self.remaining]
+        self.remaining -= y.shape[-1]
+        return y
+
+    def process(self, x: NDArray) -> NDArray:
+        from scipy.signal import oaconvolve
+        n = x.shape[-1]
+        if n == 0:
+            return x
+        self.remaining += n
+        with profile_stage('fir'):
+            full = oaconvolve(x, self.kernel.astype(x.dtype, copy=False), mode='full', axes=-1)
+        full[:, :self.tail.shape[-1]] += self.tail
+        self.tail = full[:, n:]
+        return self._emit(full[:, :n])
+
+    def flush(self) -> NDArray:
+        return self._emit(self.tail)
+
+# Phiên bản streaming của các engine trong process_audio_file
+stream_engine_classes = {
+    'Butterworth Filter': _ButterworthStream,
+    'Hybrid Brickwall': _HybridStream,
+    'Dynamic Hybrid Brickwall': _DynamicHybridStream,
+    'Multiband Limiting': _MultibandStream,
+    'Linear-Phase Brickwall': _LinearPhaseStream,
+}
+
+def should_stream(audio_path: str) -> bool:
+    """File đủ dài và đọc được bằng soundfile thì xử lý theo block."""
+    import soundfile as sf
+    try:
+        info = sf.info(audio_path)
+    except Exception:
+        return False
+    return info.frames / info.samplerate > STREAMING_MIN_SECONDS
+
+def level_db(value: float) -> float:
+    """Biên độ tuyến tính sang dBFS, sàn -200 dB cho tín hiệu câm."""
+    return 20 * float(np.log10(max(value, 1e-10)))
+
+class _LevelMeter:
+    """RMS và peak (dBFS) trên mọi kênh của tín hiệu được đưa vào theo từng block."""
+    def __init__(self):
+        self.sum_squares, self.peak, self.count = 0.0, 0.0, 0
+
+    def update(self, x: NDArray) -> None:
+        if x.size:
+            flat = x.ravel(order='K')
+            self.sum_squares += float(np.vdot(flat, flat))
+            self.peak = max(self.peak, float(x.max()), -float(x.min()))
+            self.count += x.size
+
+    def levels(self) -> Dict[str, float]:
+        rms = np.sqrt(self.sum_squares / self.count) if self.count else 0.0
+        return {'rms_db': level_db(rms), 'peak_db': level_db(self.peak)}
+
+def process_audio_stream(audio_path: str, output_path: Union[str, Path], algorithm: str, preset: Dict[str, Any], block_size: int = STREAM_BLOCK_SIZE,
+                         dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Đọc, xử lý và ghi file theo từng block nên bộ nhớ không phụ thuộc độ dài file.
+    Kết quả giống hệt từng bit với xử lý toàn bộ file trong bộ nhớ.
+    WAV / RF64 / W64 không nén được mở bằng memory map, mỗi block chỉ được đổi sang float
+    khi engine cần nên bắt đầu xử lý ngay cả với file nhiều GB.
+    Trả về (số frame, sample rate) của file.
+    """
+    run = process_audio_stream_targets(audio_path, [(output_path, algorithm, preset)], block_size, dtype, subtype)
+    if run['errors'][0] is not None:
+        raise run['errors'][0]
+    return run['frames'], run['sr']
+
+def process_audio_stream_targets(audio_path: str, targets: List[Tuple[Union[str, Path], str, Dict[str, Any]]],
+                                 block_size: int = STREAM_BLOCK_SIZE, dtype: str = DEFAULT_DTYPE,
+                                 subtype: Optional[str] = None, levels: bool = False) -> Dict[str, Any]:
+    """
+    Như process_audio_stream cho nhiều output cùng lúc: mỗi block chỉ được giải mã một lần rồi
+    đưa qua engine của từng target (output_path, algorithm, preset).
+    Target có preset chuẩn hóa loudness được đo trên block output engine đang có trong bộ nhớ và
+    ghi tạm ở dạng float (không volume) cạnh output; gain chỉ biết được ở cuối file nên lượt
+    thứ hai chép file tạm sang output với gain đó (không chạy lại engine hay phép đo).
+    Target bị lỗi (NaN, lỗi ghi...) bị xóa output và dừng, các target khác vẫn chạy tiếp.
+    Trả về {'frames', 'sr', 'errors' (Exception hoặc None theo thứ tự targets), 'loudness'
+    (kết quả loudness_normalization, None nếu target không chuẩn hóa hoặc lỗi)}, thêm 'levels'
+    (RMS / peak của từng output, None nếu lỗi) và 'source_levels' khi levels=True.
+    """
+    import soundfile as sf
+    errors: List[Optional[Exception]] = [None] * len(targets)
+    meters = [_LevelMeter() for _ in targets]
+    loudness: List[Optional[Dict[str, Any]]] = [None] * len(targets)
+    source_meter = _LevelMeter()
+    # File tạm (float, chưa nhân gain) của các target chuẩn hóa: {i: (đường dẫn, LoudnessMeter)}
+    staged: Dict[int, Tuple[Path, LoudnessMeter]] = {}
+    with open_mapped_wav(audio_path) or sf.SoundFile(audio_path) as src:
+        active = []
+        try:
+            try:
+                for i, (output_path, algorithm, preset) in enumerate(targets):
+                    try:
+                        with profile_stage('filter_design'):
+                            engine = stream_engine_classes[algorithm](src.channels, src.samplerate, preset, dtype)
+                        volume_gain = 10 ** (preset['volume'] / 20.0)
+                        if normalizes_loudness(preset):
+                            part_path = Path(output_path).with_name(f".{Path(output_path).name}.part")
+                            staged[i] = (part_path, LoudnessMeter(src.channels, src.samplerate, 'true_peak_db' in preset))
+                            dst = sf.SoundFile(part_path, 'w', src.samplerate, src.channels, format='RF64',
+                                               subtype='DOUBLE' if np.dtype(dtype) == np.float64 else 'FLOAT')
+                            volume_gain = 1.0
+                        else:
+                            dst = sf.SoundFile(output_path, 'w', src.samplerate, src.channels, subtype=subtype or src.subtype)
+                    except Exception as e:
+                        errors[i] = e
+                        continue
+                    active.append((i, engine, dst, volume_gain))
+                blocks = src.blocks(blocksize=block_size, dtype=dtype, always_2d=True)
+                while active:
+                    with profile_stage('decode'):
+                        block = next(blocks, None)
+                    if levels and block is not None:
+                        source_meter.update(block)
+                    for target in list(active):
+                        i, engine, dst, volume_gain = target
+                        try:
+                            y_processed = to_output_layout(engine.process(block.T) if block is not None else engine.flush(), volume_gain)
+                            with profile_stage('nan_check'):
+                                if np.any(np.isnan(y_processed)):
+                                    raise ValueError("Dữ liệu lỗi (NaN)")
+                            if i in staged:
+                                with profile_stage('loudness'):
+                                    staged[i][1].update(y_processed.T)
+                            elif levels:
+                                meters[i].update(y_processed)
+                            with profile_stage('encode'):
+                                dst.write(y_processed)
+                        except Exception as e:
+                            errors[i] = e
+                            active.remove(target)
+                            dst.close()
+                    if block is None:
+                        break
+            finally:
+                for _, _, dst, _ in active:
+                    dst.close()
+            for i, (part_path, meter) in staged.items():
+                if errors[i] is not None:
+                    continue
+                output_path, _, preset = targets[i]
+                try:
+                    gain_db, loudness[i] = loudness_normalization(preset, meter.measurement())
+                    _apply_gain_copy(part_path, output_path, 10 ** (gain_db / 20.0), subtype or src.subtype,
+                                     block_size, dtype, meters[i] if levels else None)
+                except Exception as e:
+                    errors[i] = e
+        except Exception:
+            # Lỗi đọc file nguồn: không để lại output dở dang nào
+            for output_path, _, _ in targets:
+                Path(output_path).unlink(missing_ok=True)
+            raise
+        finally:
+            for part_path, _ in staged.values():
+                part_path.unlink(missing_ok=True)
+        for (output_path, _, _), error in zip(targets, errors):
+            if error is not None:
+                Path(output_path).unlink(missing_ok=True)
+        run = {'frames': src.frames, 'sr': src.samplerate, 'errors': errors,
+               'loudness': [info if error is None else None for info, error in zip(loudness, errors)]}
+    if levels:
+        run['levels'] = [meter.levels() if error is None else None for meter, error in zip(meters, errors)]
+        run['source_levels'] = source_meter.levels()
+    return run
+
+def _apply_gain_copy(part_path: Path, output_path: Union[str, Path], gain: float, subtype: str,
+                     block_size: int, dtype: str, meter: Optional[_LevelMeter]) -> None:
+    """Lượt thứ hai của chuẩn hóa streaming: chép file tạm float sang output, nhân gain từng block."""
+    import soundfile as sf
+    with open_mapped_wav(str(part_path)) or sf.SoundFile(part_path) as part, \
+            sf.SoundFile(output_path, 'w', part.samplerate, part.channels, subtype=subtype) as dst:
+        for block in part.blocks(blocksize=block_size, dtype=dtype, always_2d=True):
+            y_processed = np.multiply(block, gain, dtype=block.dtype)
+            if meter is not None:
+                meter.update(y_processed)
+            with profile_stage('encode'):
+                dst.write(y_processed)
+
+# ==============================================================================
+# ĐO LOUDNESS (BS.1770) VÀ CHUẨN HÓA
+# ==============================================================================
+# Cột tùy chọn của CSV: loudness đích (LUFS) và trần true peak (dBTP) của output
+LOUDNESS_COLUMNS = ('target_lufs', 'true_peak_db')
+# Block đo 400 ms chồng 75%: năng lượng được cộng theo đoạn 100 ms, mỗi block là 4 đoạn liền nhau
+LOUDNESS_HOP_SECONDS = 0.1
+LOUDNESS_BLOCK_HOPS = 4
+# Ngưỡng gate tuyệt đối (LUFS) và tương đối (LU dưới loudness của các block qua gate tuyệt đối)
+LOUDNESS_ABSOLUTE_GATE = -70.0
+LOUDNESS_RELATIVE_GATE = -10.0
+# Số mẫu mỗi lượt lọc K-weighting / nội suy true peak, để bộ nhớ tạm không phụ thuộc độ dài file
+LOUDNESS_CHUNK = 65536
+# Số tap mỗi pha của bộ lọc nội suy true peak (BS.1770 phụ lục 2: 48 tap cho 4 pha)
+TRUE_PEAK_TAPS_PER_PHASE = 12
+
+def normalizes_loudness(preset: Dict[str, Any]) -> bool:
+    return any(key in preset for key in LOUDNESS_COLUMNS)
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def design_k_weighting(sr: int) -> NDArray:
+    """
+    Bộ lọc K-weighting của BS.1770 (shelf tần cao rồi high-pass RLB) dạng SOS, hệ số được tính
+    lại cho sample rate bất kỳ bằng biến đổi song tuyến (ở 48 kHz trùng hệ số trong chuẩn).
+    Có cache, mảng trả về không được sửa tại chỗ.
+    """
+    k = np.tan(np.pi * 1681.974450955533 / sr)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    k = np.tan(np.pi * 38.13547087602444 / sr)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, highpass])
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def design_true_peak_filter(sr: int) -> NDArray:
+    """
+    Bộ lọc nội suy của phép đo true peak dạng đa pha (tap, pha): cột p cho mẫu nội suy thứ p
+    sau mỗi mẫu gốc, hàng theo thứ tự mẫu cũ → mới. Oversample 4× dưới 96 kHz, 2× dưới 192 kHz,
+    từ 192 kHz là sample peak. Có cache, mảng trả về không được sửa tại chỗ.
+    """
+    from scipy.signal import firwin
+    up = 4 if sr < 96000 else 2 if sr < 192000 else 1
+    if up == 1:
+        return np.ones((1, 1))
+    h = firwin(TRUE_PEAK_TAPS_PER_PHASE * up, 1.0 / up, window=('kaiser', 5.0)) * up
+    return np.ascontiguousarray(h.reshape(TRUE_PEAK_TAPS_PER_PHASE, up)[::-1])
+
+def loudness_channel_weights(channels: int) -> NDArray:
+    """
+    Trọng số kênh của BS.1770 theo thứ tự kênh WAV: 5 kênh là L R C Ls Rs, 6 kênh (5.1) là
+    L R C LFE Ls Rs (LFE không được tính), surround có trọng số 1.41; bố cục khác đều là 1.0.
+    """
+    if channels == 5:
+        return np.array([1.0, 1.0, 1.0, 1.41, 1.41])
+    if channels == 6:
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    return np.ones(channels)
+
+class LoudnessMeter:
+    """
+    Integrated loudness (BS.1770-4) và true peak của tín hiệu (C, n) được đưa vào theo từng block.
+    Năng lượng K-weighting được cộng theo đoạn 100 ms (phần dư chờ block sau) và gate chạy trên
+    các tổng đó ở cuối, nên số đo không phụ thuộc cách chia block: streaming, trong bộ nhớ hay
+    mỗi kênh ở một process (stack) cho cùng kết quả. true_peak=False bỏ phép nội suy khi không
+    cần trần true peak.
+    """
+    def __init__(self, channels: int, sr: int, true_peak: bool = True):
+        self.channels, self.sr = channels, sr
+        self.hop = max(1, int(round(sr * LOUDNESS_HOP_SECONDS)))
+        self.sos = design_k_weighting(sr)
+        self.zi = np.zeros((self.sos.shape[0], channels, 2))
+        self.pending = np.zeros((channels, 0))
+        self.segments: List[NDArray] = []
+        self.phases = design_true_peak_filter(sr) if true_peak else None
+        # Các mẫu cuối của block trước cho cửa sổ nội suy (tín hiệu coi như bằng 0 trước mẫu đầu)
+        self.context = np.zeros((channels, self.phases.shape[0] - 1)) if true_peak else None
+        # Mẫu nội suy không vượt quá chừng này lần biên độ lớn nhất trong cửa sổ của nó
+        self.peak_bound = float(np.abs(self.phases).sum(axis=0).max()) if true_peak else 0.0
+        self.peak = 0.0
+
+    def update(self, x: NDArray) -> None:
+        x = x if x.ndim == 2 else x[np.newaxis]
+        for start in range(0, x.shape[-1], LOUDNESS_CHUNK):
+            chunk = x[:, start:start + LOUDNESS_CHUNK]
+            self._update_loudness(chunk)
+            if self.phases is not None:
+                self.peak = max(self.peak, self._interpolated_peak(chunk))
+
+    def _update_loudness(self, chunk: NDArray) -> None:
+        from scipy.signal import sosfilt
+        weighted, self.zi = sosfilt(self.sos, chunk, axis=-1, zi=self.zi)
+        power = np.square(weighted, out=weighted)
+        if self.pending.shape[-1]:
+            power = np.concatenate([self.pending, power], axis=-1)
+        whole = power.shape[-1] // self.hop * self.hop
+        if whole:
+            self.segments.append(power[:, :whole].reshape(self.channels, -1, self.hop).sum(axis=-1))
+        self.pending = power[:, whole:]
+
+    def _interpolated_peak(self, chunk: NDArray) -> float:
+        padded = np.concatenate([self.context.astype(chunk.dtype, copy=False), chunk], axis=-1)
+        self.context = padded[:, chunk.shape[-1]:]
+        sample_peak = max(float(padded.max()), -float(padded.min()))
+        if sample_peak * self.peak_bound <= self.peak:
+            # Không mẫu nội suy nào của chunk vượt được true peak đã đo
+            return sample_peak
+        windows = np.lib.stride_tricks.sliding_window_view(padded, self.phases.shape[0], axis=-1)
+        # Mỗi cửa sổ tap mẫu cho oversample mẫu nội suy: một phép nhân ma trận cho cả chunk
+        interpolated = np.ascontiguousarray(windows) @ self.phases.astype(chunk.dtype, copy=False)
+        return max(float(interpolated.max()), -float(interpolated.min())) if interpolated.size else 0.0
+
+    def true_peak(self) -> float:
+        """True peak tuyến tính, kể cả phần đuôi của bộ lọc nội suy sau mẫu cuối."""
+        if self.phases is None:
+            return 0.0
+        if not self.context.shape[-1]:
+            return self.peak
+        tail = np.zeros((self.channels, self.context.shape[-1]), dtype=self.context.dtype)
+        return max(self.peak, self._interpolated_peak(tail))
+
+    @classmethod
+    def stack(cls, meters: List['LoudnessMeter']) -> 'LoudnessMeter':
+        """Gộp meter của từng nhóm kênh (cùng sample rate, cùng số mẫu) thành meter của cả file."""
+        merged = cls(sum(meter.channels for meter in meters), meters[0].sr, meters[0].phases is not None)
+        merged.segments = [np.concatenate([meter.segment_sums() for meter in meters])]
+        merged.pending = np.concatenate([meter.pending for meter in meters])
+        merged.peak = max(meter.true_peak() for meter in meters)
+        return merged
+
+    def segment_sums(self) -> NDArray:
+        """(C, số đoạn 100 ms đủ mẫu) tổng năng lượng K-weighting của từng đoạn."""
+        return np.concatenate(self.segments, axis=-1) if self.segments else np.zeros((self.channels, 0))
+
+    def measurement(self) -> Dict[str, Optional[float]]:
+        """
+        {'lufs', 'true_peak_db'}: None khi tín hiệu câm (không block nào qua gate tuyệt đối) hoặc
+        không đo true peak. Tín hiệu ngắn hơn một block 400 ms được đo như một block duy nhất.
+        """
+        segments = self.segment_sums()
+        if segments.shape[-1] >= LOUDNESS_BLOCK_HOPS:
+            windows = np.lib.stride_tricks.sliding_window_view(segments, LOUDNESS_BLOCK_HOPS, axis=-1)
+            blocks = windows.sum(axis=-1) / (LOUDNESS_BLOCK_HOPS * self.hop)
+        else:
+            count = segments.shape[-1] * self.hop + self.pending.shape[-1]
+            blocks = (segments.sum(axis=-1) + self.pending.sum(axis=-1))[:, np.newaxis] / max(1, count)
+        power = loudness_channel_weights(self.channels) @ blocks
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10 * np.log10(power)
+        gated = power[loudness > LOUDNESS_ABSOLUTE_GATE]
+        lufs = None
+        if gated.size:
+            relative = -0.691 + 10 * float(np.log10(gated.mean())) + LOUDNESS_RELATIVE_GATE
+            gated = power[loudness > max(LOUDNESS_ABSOLUTE_GATE, relative)]
+            lufs = -0.691 + 10 * float(np.log10(gated.mean()))
+        peak = self.true_peak()
+        return {'lufs': lufs, 'true_peak_db': level_db(peak) if peak > 0 else None}
+
+def measure_loudness(data: NDArray, sr: int, true_peak: bool = True) -> Dict[str, Optional[float]]:
+    """LoudnessMeter.measurement của tín hiệu (n,) hoặc (C, n) đã có trong bộ nhớ."""
+    meter = LoudnessMeter(data.shape[0] if data.ndim == 2 else 1, sr, true_peak)
+    meter.update(data)
+    return meter.measurement()
+
+def loudness_normalization(preset: Dict[str, Any], measured: Dict[str, Optional[float]]) -> Tuple[float, Dict[str, Any]]:
+    """
+    Gain (dB) thay cho volume của preset chuẩn hóa, từ số đo output engine trước volume: đưa
+    loudness về target_lufs (giữ volume khi không có cột này hoặc tín hiệu câm), rồi hạ thêm
+    nếu true peak sau gain vượt true_peak_db. Trả về (gain, {'lufs', 'true_peak_db', 'gain_db'})
+    với số đo của output sau gain.
+    """
+    gain = preset['volume']
+    if preset.get('target_lufs') is not None and measured['lufs'] is not None:
+        gain = preset['target_lufs'] - measured['lufs']
+    if preset.get('true_peak_db') is not None and measured['true_peak_db'] is not None:
+        gain = min(gain, preset['true_peak_db'] - measured['true_peak_db'])
+    after = {key: None if value is None else value + gain for key, value in measured.items()}
+    return gain, dict(after, gain_db=gain)
+
+def loudness_note(loudness: Dict[str, Any]) -> str:
+    """Phần log của bước chuẩn hóa: '🔊 -23.0 LUFS, -1.0 dBTP (+4.2 dB)'."""
+    parts = [f"{loudness['lufs']:.1f} LUFS" if loudness['lufs'] is not None else "im lặng"]
+    if loudness['true_peak_db'] is not None:
+        parts.append(f"{loudness['true_peak_db']:.1f} dBTP")
+    return f"🔊 {', '.join(parts)} ({loudness['gain_db']:+.1f} dB)"
+
+# ==============================================================================
+# PHÂN TÍCH NHANH: BỎ QUA ENGINE CHO FILE IM LẶNG HOẶC ĐÃ SẠCH
+# ==============================================================================
+# Độ dài frame FFT (Hann, chồng 50%) của ước lượng năng lượng ngoài dải
+FAST_PATH_FRAME = 4096
+# Số frame FFT mỗi lượt, để bộ nhớ tạm không phụ thuộc độ dài file
+FAST_PATH_BATCH = 64
+# Phần trong dải cách lowcut / highcut dưới chừng này octave vẫn bị bộ lọc làm suy hao nên được tính như ngoài dải
+FAST_PATH_EDGE_OCTAVES = 1 / 3
+# Engine mà file đã sạch ngoài dải cho output như tín hiệu nguồn (tới mức attenuation_db):
+# Butterworth không có sàn attenuation_db, gate của Dynamic Hybrid và limiter của Multiband
+# đổi cả nội dung trong dải theo mức tín hiệu, nên với chúng chỉ file im lặng được bỏ qua engine
+FAST_PATH_ENGINES = ('Hybrid Brickwall', 'Linear-Phase Brickwall')
+# Quyết định của phân tích nhanh và nhãn trong log
+FAST_PATH_LABELS = {'silent': "im lặng", 'copy': "chép nguyên", 'gain': "chỉ gain", 'process': "xử lý đầy đủ"}
+
+def out_of_band_rms(data: NDArray, sr: int, lowcut: float, highcut: float) -> float:
+    """
+    Ước lượng thô RMS lớn nhất (theo frame, mọi kênh) của phần tín hiệu ngoài [lowcut, highcut]:
+    phổ công suất của các frame FAST_PATH_FRAME mẫu cửa sổ Hann chồng 50%, chuẩn hóa theo
+    năng lượng cửa sổ. Rò phổ của phần trong dải chỉ làm ước lượng cao hơn (an toàn).
+    """
+    from scipy.fft import rfft
+    x = data if data.ndim == 2 else data[np.newaxis]
+    n, hop = x.shape[-1], FAST_PATH_FRAME // 2
+    n_frames = 1 if n <= FAST_PATH_FRAME else -(-(n - FAST_PATH_FRAME) // hop) + 1
+    padded = np.zeros((x.shape[0], (n_frames - 1) * hop + FAST_PATH_FRAME), dtype=x.dtype)
+    padded[:, :n] = x
+    frames = np.lib.stride_tricks.sliding_window_view(padded, FAST_PATH_FRAME, axis=-1)[:, ::hop]
+    window = np.hanning(FAST_PATH_FRAME).astype(x.dtype)
+    freqs = np.fft.rfftfreq(FAST_PATH_FRAME, 1.0 / sr)
+    # Trọng số phổ một phía (Parseval) chỉ trên các bin ngoài dải
+    weights = np.where((freqs < lowcut) | (freqs > highcut), 2.0, 0.0)
+    weights[0] /= 2
+    weights[-1] /= 2
+    scale = FAST_PATH_FRAME * FAST_PATH_FRAME * float(np.mean(np.square(window, dtype=np.float64)))
+    peak_energy = 0.0
+    for start in range(0, n_frames, FAST_PATH_BATCH):
+        spectrum = rfft(frames[:, start:start + FAST_PATH_BATCH] * window, axis=-1)
+        energy = np.square(spectrum.real, dtype=np.float64) + np.square(spectrum.imag, dtype=np.float64)
+        peak_energy = max(peak_energy, float((energy @ weights).max()))
+    return float(np.sqrt(peak_energy / scale))
+
+def analyze_fast_path(data: NDArray, sr: int, preset: Dict[str, Any], algorithm: str) -> Dict[str, Any]:
+    """
+    Phân tích rẻ trước engine, trả về {'decision', 'reason'}; 'decision' là:
+    'silent' (im lặng số: output là im lặng, giống hệt engine, với mọi engine),
+    'copy' / 'gain' (chỉ với FAST_PATH_ENGINES: năng lượng ngoài dải, kể cả vùng sát lowcut /
+    highcut, đã dưới attenuation_db dBFS nên engine không còn gì để cắt: chép nguyên khi volume
+    0 dB, ngược lại chỉ nhân gain; phổ biên độ giống engine tới mức phần ngoài dải đó, với
+    Linear-Phase Brickwall giống cả dạng sóng, với Hybrid Brickwall chỉ khác ở pha của bộ lọc),
+    'process' (cần chạy engine).
+    """
+    peak = max(float(data.max()), -float(data.min())) if data.size else 0.0
+    if peak == 0.0:
+        return {'decision': 'silent', 'reason': "im lặng số"}
+    if algorithm not in FAST_PATH_ENGINES:
+        return {'decision': 'process', 'reason': f"{algorithm} luôn chạy engine"}
+    edge = 2.0 ** FAST_PATH_EDGE_OCTAVES
+    outside_db = level_db(out_of_band_rms(data, sr, preset['lowcut'] * edge, preset['highcut'] / edge))
+    if outside_db > preset['attenuation_db']:
+        return {'decision': 'process', 'reason': f"ngoài dải {outside_db:.0f} dB"}
+    decision = 'copy' if preset['volume'] == 0 else 'gain'
+    return {'decision': decision, 'reason': f"ngoài dải {outside_db:.0f} dB"}
+
+def source_key(audio_path: str, source_roots: Sequence[str] = ()) -> str:
+    """
+    Khóa của file nguồn (khóa manifest): đường dẫn tương đối dạng posix trong folder nguồn đầu
+    tiên chứa nó, thêm tên folder phía trước khi có nhiều folder nguồn. File không nằm trong
+    folder nguồn nào chỉ dùng tên file.
+    """
+    for root in source_roots:
+        try:
+            rel = os.path.relpath(audio_path, root)
+        except ValueError:
+            # Khác ổ đĩa (Windows)
+            continue
+        if rel != os.pardir and not rel.startswith(os.pardir + os.sep):
+            key = Path(rel)
+            if len(source_roots) > 1:
+                key = Path(os.path.basename(os.path.normpath(root))) / key
+            return key.as_posix()
+    return os.path.basename(audio_path)
+
+def output_name_for(audio_path: str, source_roots: Sequence[str] = ()) -> str:
+    """
+    Đường dẫn output (posix, tương đối trong thư mục output): processed_<tên file> trong cùng
+    thư mục con với file nguồn (xem source_key), để hai file cùng tên ở hai thư mục con
+    không ghi đè lên nhau.
+    """
+    key = PurePosixPath(source_key(audio_path, source_roots))
+    return str(key.with_name(f"processed_{key.name}"))
+
+def output_path_for(output_dir: Union[str, Path], output_name: str) -> Path:
+    """output_dir / output_name, tạo thư mục con của output nếu chưa có."""
+    path = Path(output_dir) / output_name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+def load_audio(audio_path: str, dtype: str = DEFAULT_DTYPE) -> Tuple[NDArray, int]:
+    """
+    Đọc file ở sample rate gốc, dạng (n,) hoặc (C, n) như librosa.load(sr=None, mono=False).
+    Dùng soundfile; librosa chỉ được import cho định dạng soundfile không đọc được.
+    """
+    y, sr, _ = read_audio(audio_path, dtype)
+    return y, sr
+
+def read_audio(audio_path: str, dtype: str = DEFAULT_DTYPE) -> Tuple[NDArray, int, Optional[str]]:
+    """Như load_audio, thêm subtype của file nguồn (PCM_16, PCM_24, FLOAT...; None nếu giải mã bằng librosa)."""
+    import soundfile as sf
+    try:
+        with open_mapped_wav(audio_path) or sf.SoundFile(audio_path) as f:
+            return f.read(dtype=dtype, always_2d=False).T, f.samplerate, f.subtype
+    except sf.LibsndfileError:
+        import librosa
+        y, sr = librosa.load(audio_path, sr=None, mono=False, dtype=np.dtype(dtype))
+        return y, sr, None
+
+def to_output_layout(y_eq: NDArray, volume_gain: float) -> NDArray:
+    """
+    Nhân volume và chuyển (C, n) sang (n, C) liền bộ nhớ, dạng soundfile ghi không cần
+    chép thêm, trong một lượt và giữ nguyên dtype.
+    """
+    y_processed = np.empty(y_eq.shape[::-1], dtype=y_eq.dtype)
+    np.multiply(y_eq.T, volume_gain, out=y_processed)
+    return y_processed
+
+def process_file(audio_path: str, output_dir: str, algorithm: str, preset: Optional[Dict[str, Any]], streaming: Optional[bool] = None, profile: bool = False,
+                 dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None, fast_path: bool = False,
+                 source_roots: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Xử lý một file, trả về kết quả có cấu trúc:
+    {'file', 'status' ('success' | 'skipped' | 'error'), 'category', 'output', 'message'},
+    thêm 'duration' (giây âm thanh) khi thành công.
+    streaming=None tự bật xử lý theo block cho file dài hơn STREAMING_MIN_SECONDS,
+    True/False để ép chế độ.
+    profile=True thêm 'profile': {'total', 'stages' (giây theo PROFILE_STAGES),
+    'samples_per_sec' (frame/giây), 'peak_rss_mb'}.
+    dtype ('float32' | 'float64') là kiểu dữ liệu xử lý từ lúc đọc đến lúc ghi; subtype là
+    subtype của file output (PCM_16, PCM_24, FLOAT...), None để giữ subtype của file nguồn.
+    fast_path=True chạy analyze_fast_path trước engine cho file không streaming: file im lặng
+    hoặc đã sạch ngoài dải được ghi thẳng (im lặng / chép nguyên / chỉ gain) mà không chạy
+    engine; kết quả có thêm 'fast_path' (quyết định, xem FAST_PATH_LABELS).
+    source_roots: các folder nguồn; output giữ thư mục con của file trong folder nguồn
+    (xem output_name_for), 'output' là đường dẫn tương đối trong output_dir.
+    """
+    if not profile:
+        result = _process_file(audio_path, output_dir, algorithm, preset, streaming, dtype, subtype, fast_path, source_roots)
+        result.pop('frames', None)
+        return result
+    t0 = time.perf_counter()
+    with profiling() as stages:
+        result = _process_file(audio_path, output_dir, algorithm, preset, streaming, dtype, subtype, fast_path, source_roots)
+    return _attach_profile(result, stages, time.perf_counter() - t0)
+
+def _attach_profile(result: Dict[str, Any], stages: Dict[str, float], total: float) -> Dict[str, Any]:
+    stages = {name: stages[name] for name in PROFILE_STAGES if name in stages}
+    stages['other'] = max(0.0, total - sum(stages.values()))
+    frames = result.pop('frames', 0)
+    result['profile'] = {'total': total, 'stages': stages, 'samples_per_sec': frames / total if total > 0 else 0.0,
+                         'peak_rss_mb': peak_rss_mb()}
+    return result
+
+def _process_file(audio_path: str, output_dir: str, algorithm: str, preset: Optional[Dict[str, Any]], streaming: Optional[bool],
+                  dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None, fast_path: bool = False,
+                  source_roots: Sequence[str] = ()) -> Dict[str, Any]:
+    job = _read_stage(audio_path, algorithm, preset, streaming, dtype, subtype, fast_path, source_roots)
+    return _write_stage(_compute_stage(job, output_dir, algorithm), output_dir)
+
+def _file_result(audio_path: str, preset: Optional[Dict[str, Any]], status: str, message: str,
+                 output: Optional[str] = None, frames: int = 0, sr: int = 0) -> Dict[str, Any]:
+    category = preset['category_name'] if preset is not None else None
+    res = {'file': audio_path, 'status': status, 'category': category, 'output': output, 'message': message}
+    if status == 'success':
+        res.update(duration=frames / sr, frames=frames)
+    return res
+
+def _read_stage(audio_path: str, algorithm: str, preset: Optional[Dict[str, Any]], streaming: Optional[bool],
+                dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None, fast_path: bool = False,
+                source_roots: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Bước đọc của process_file: giải mã vào job['y'], job['sr'], job['subtype'] (subtype output).
+    File streaming chưa được đọc ở đây. File bị bỏ qua hoặc lỗi đã có job['result'] và đi
+    thẳng qua các bước sau.
+    """
+    file_name = os.path.basename(audio_path)
+    job: Dict[str, Any] = {'file': audio_path, 'preset': preset, 'result': None, 'dtype': dtype, 'subtype': subtype,
+                           'fast_path': fast_path, 'copy_ok': subtype is None,
+                           'output_name': output_name_for(audio_path, source_roots)}
+    if preset is None: 
+        job['result'] = _file_result(audio_path, preset, 'skipped', f"🟡 Bỏ qua: {file_name} (Không khớp quy tắc)")
+        return job
+    if algorithm not in engine_functions:
+        job['result'] = _file_result(audio_path, preset, 'error', f"❌ Không tìm thấy engine: {algorithm}")
+        return job
+    try:
+        job['streaming'] = should_stream(audio_path) if streaming is None else streaming
+        if not job['streaming']:
+            with profile_stage('decode'):
+                job['y'], job['sr'], source_subtype = read_audio(audio_path, dtype)
+            job['subtype'] = subtype or source_subtype
+    except Exception as e: 
+        job['result'] = _file_result(audio_path, preset, 'error', f"❌ Lỗi xử lý '{file_name}': {e}")
+    return job
+
+def _compute_stage(job: Dict[str, Any], output_dir: str, algorithm: str) -> Dict[str, Any]:
+    """
+    Bước xử lý: engine và volume, job['y'] được thay bằng kết quả ở dạng (n, C) để ghi.
+    Preset có target_lufs / true_peak_db được đo loudness trên output engine đang trong bộ nhớ
+    và dùng gain chuẩn hóa thay cho volume (job['loudness']). File streaming được xử lý trọn ở đây.
+    """
+    if job['result'] is not None:
+        return job
+    audio_path, preset = job['file'], job['preset']
+    file_name = os.path.basename(audio_path)
+    output_name = job['output_name']
+    try:
+        if job['streaming']:
+            run = process_audio_stream_targets(audio_path, [(output_path_for(output_dir, output_name), algorithm, preset)],
+                                               dtype=job['dtype'], subtype=job['subtype'])
+            if run['errors'][0] is not None:
+                raise run['errors'][0]
+            loudness = run['loudness'][0]
+            note = f", {loudness_note(loudness)}" if loudness is not None else ''
+            job['result'] = _file_result(audio_path, preset, 'success', f"✅ {file_name} → {output_name} ({preset['category_name']}, streaming{note})",
+                                         output_name, run['frames'], run['sr'])
+            if loudness is not None:
+                job['result']['loudness'] = loudness
+            return job
+        y = job.pop('y')
+        job['frames'] = y.shape[-1]
+        volume_gain = 10 ** (preset['volume'] / 20.0)
+        if job['fast_path']:
+            with profile_stage('analysis'):
+                job['analysis'] = analyze_fast_path(y, job['sr'], preset, algorithm)
+            decision = job['analysis']['decision']
+            if decision in ('copy', 'gain') and normalizes_loudness(preset):
+                # Output coi như tín hiệu nguồn nên gain chuẩn hóa được đo trên chính nguồn
+                volume_gain = _normalization_gain(job, y)
+                job['analysis']['decision'] = decision = 'gain'
+            if decision == 'copy' and job['copy_ok']:
+                # Output là chính file nguồn: không cần mã hóa lại
+                job['copy'] = True
+                return job
+            if decision == 'silent':
+                job['y'] = np.zeros(y.shape[::-1], dtype=y.dtype)
+                return job
+            if decision in ('copy', 'gain'):
+                job['y'] = to_output_layout(y, volume_gain)
+                return job
+        y_eq = engine_functions[algorithm](y, sr=job['sr'], **preset)
+        if normalizes_loudness(preset):
+            volume_gain = _normalization_gain(job, y_eq)
+        y_processed = to_output_layout(y_eq, volume_gain)
+        with profile_stage('nan_check'):
+            if np.any(np.isnan(y_processed)): 
+                job['result'] = _file_result(audio_path, preset, 'error', f"❌ Dữ liệu lỗi cho file: {file_name}")
+                return job
+        job['y'] = y_processed
+    except Exception as e: 
+        job['result'] = _file_result(audio_path, preset, 'error', f"❌ Lỗi xử lý '{file_name}': {e}")
+    return job
+
+def _normalization_gain(job: Dict[str, Any], y: NDArray) -> float:
+    """Gain tuyến tính của bước chuẩn hóa loudness cho output engine y, ghi số đo vào job['loudness']."""
+    preset = job['preset']
+    with profile_stage('loudness'):
+        measured = measure_loudness(y, job['sr'], true_peak='true_peak_db' in preset)
+    gain_db, job['loudness'] = loudness_normalization(preset, measured)
+    return 10 ** (gain_db / 20.0)
+
+def _write_stage(job: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+    """Bước ghi: mã hóa job['y'] ra file output, trả về kết quả của process_file."""
+    if job['result'] is not None:
+        return job['result']
+    audio_path, preset = job['file'], job['preset']
+    file_name = os.path.basename(audio_path)
+    output_name = job['output_name']
+    try:
+        with profile_stage('encode'):
+            if job.get('copy'):
+                shutil.copyfile(audio_path, output_path_for(output_dir, output_name))
+            else:
+                import soundfile as sf
+                sf.write(output_path_for(output_dir, output_name), job.pop('y'), job['sr'], subtype=job['subtype'])
+    except Exception as e: 
+        return _file_result(audio_path, preset, 'error', f"❌ Lỗi xử lý '{file_name}': {e}")
+    note = ''
+    if 'analysis' in job:
+        analysis = job['analysis']
+        note = f", ⚡ {FAST_PATH_LABELS[analysis['decision']]}: {analysis['reason']}"
+    if 'loudness' in job:
+        note += f", {loudness_note(job['loudness'])}"
+    result = _file_result(audio_path, preset, 'success', f"✅ {file_name} → {output_name} ({preset['category_name']}{note})", output_name, job['frames'], job['sr'])
+    if 'analysis' in job:
+        result['fast_path'] = job['analysis']['decision']
+    if 'loudness' in job:
+        result['loudness'] = job['loudness']
+    return result
+
+def process_audio_file(audio_path: str, output_dir: str, algorithm: str, preset: Optional[Dict[str, Any]], streaming: Optional[bool] = None) -> str:
+    """Như process_file nhưng chỉ trả về dòng log."""
+    return process_file(audio_path, output_dir, algorithm, preset, streaming)['message']
+
+# ==============================================================================
+# PIPELINE ĐỌC / XỬ LÝ / GHI
+# ==============================================================================
+# Tổng dung lượng audio đã giải mã (MB) được nằm trong pipeline cùng lúc
+PIPELINE_MEMORY_MB = 512
+# Số thread giải mã và mã hóa chạy song song với bước xử lý
+PIPELINE_READERS = 2
+PIPELINE_WRITERS = 2
+# Định dạng nén soundfile không đọc được header (giải mã bằng librosa): float32 lớn khoảng
+# chừng này lần file nén, chỉ dùng để ước lượng ngân sách
+COMPRESSED_DECODE_RATIO = 20
+
+class _PipelineBudget:
+    """
+    Semaphore tính theo byte và số file. Chỉ thread nạp gọi acquire, theo thứ tự file,
+    nên không thể kẹt; một file lớn hơn cả ngân sách vẫn được nhận khi pipeline rỗng.
+    """
+    def __init__(self, limit_bytes: int, max_files: int):
+        self.limit_bytes = limit_bytes
+        self.max_files = max_files
+        self.used_bytes = 0
+        self.files = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, size: int) -> bool:
+        """Chờ đến khi đủ chỗ; trả về False nếu pipeline đã đóng."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self.files == 0 or
+                                (self.files < self.max_files and self.used_bytes + size <= self.limit_bytes))
+            self.used_bytes += size
+            self.files += 1
+            return not self.closed
+
+    def release(self, size: int) -> None:
+        with self._cond:
+            self.used_bytes -= size
+            self.files -= 1
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+def _pipeline_admission(audio_path: str, preset: Optional[Dict[str, Any]], streaming: Optional[bool], itemsize: int = 4) -> Tuple[Optional[bool], int]:
+    """(streaming, số byte giữ trong pipeline) của một file, đọc header một lần cho cả hai."""
+    if preset is None or streaming:
+        return streaming, 0
+    import soundfile as sf
+    try:
+        info = sf.info(audio_path)
+    except Exception:
+        try:
+            return False if streaming is None else streaming, os.path.getsize(audio_path) * COMPRESSED_DECODE_RATIO * itemsize // 4
+        except OSError:
+            return streaming, 0
+    if streaming is None:
+        streaming = info.frames / info.samplerate > STREAMING_MIN_SECONDS
+    # File streaming chỉ giữ vài block trong bộ nhớ
+    return streaming, 0 if streaming else info.frames * info.channels * itemsize
+
+def process_files_pipelined(file_paths: Iterable[str], output_dir: str, algorithm: str,
+                            matcher: Callable[[str], Optional[Dict[str, Any]]], streaming: Optional[bool] = None,
+                            profile: bool = False, memory_mb: float = PIPELINE_MEMORY_MB,
+                            readers: int = PIPELINE_READERS, writers: int = PIPELINE_WRITERS,
+                            dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None, fast_path: bool = False,
+                            source_roots: Sequence[str] = ()) -> Iterator[Dict[str, Any]]:
+    """
+    Như gọi process_file lần lượt cho từng file (preset lấy từ matcher), nhưng ba bước chạy
+    chồng lên nhau: thread đọc giải mã trước các file kế tiếp, thread hiện tại chạy engine,
+    thread ghi mã hóa output. Nhờ vậy CPU không chờ ổ đĩa (hay ổ mạng) và ngược lại.
+    Audio đã đọc mà chưa ghi xong không vượt quá memory_mb, trừ file lớn hơn cả ngân sách
+    (được xử lý một mình). Kết quả giống hệt process_file, yield theo thứ tự file_paths.
+    """
+    budget = _PipelineBudget(int(memory_mb * 1024 * 1024), max_files=2 * (readers + writers) + 1)
+    admitted: queue.Queue = queue.Queue()
+    read_pool = ThreadPoolExecutor(readers, thread_name_prefix='soundfix-read')
+    write_pool = ThreadPoolExecutor(writers, thread_name_prefix='soundfix-write')
+
+    def timed(job: Optional[Dict[str, Any]], fn: Callable, *args):
+        # Bộ đo profiling là của từng thread nên mỗi bước được đo riêng rồi cộng vào job
+        if not profile:
+            return fn(*args)
+        t0 = time.perf_counter()
+        with profiling() as stages:
+            out = fn(*args)
+        job = out if job is None else job
+        totals = job.setdefault('stages', {})
+        for name, seconds in stages.items():
+            totals[name] = totals.get(name, 0.0) + seconds
+        job['seconds'] = job.get('seconds', 0.0) + time.perf_counter() - t0
+        return out
+
+    def read(audio_path: str, preset: Optional[Dict[str, Any]], file_streaming: Optional[bool], size: int) -> Dict[str, Any]:
+        job = timed(None, _read_stage, audio_path, algorithm, preset, file_streaming, dtype, subtype, fast_path, source_roots)
+        job['charge'] = size
+        return job
+
+    def write(job: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            result = timed(job, _write_stage, job, output_dir)
+        finally:
+            budget.release(job['charge'])
+        if profile:
+            return _attach_profile(result, job.get('stages', {}), job.get('seconds', 0.0))
+        result.pop('frames', None)
+        return result
+
+    def feed() -> None:
+        try:
+            for audio_path in file_paths:
+                preset = matcher(os.path.basename(audio_path))
+                file_streaming, size = _pipeline_admission(audio_path, preset, streaming, np.dtype(dtype).itemsize)
+                if not budget.acquire(size):
+                    return
+                admitted.put(read_pool.submit(read, audio_path, preset, file_streaming, size))
+        except BaseException as e:
+            admitted.put(e)
+        finally:
+            admitted.put(None)
+
+    feeder = threading.Thread(target=feed, name='soundfix-feed', daemon=True)
+    feeder.start()
+    pending: deque = deque()
+    try:
+        while True:
+            item = admitted.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            job = item.result()
+            timed(job, _compute_stage, job, output_dir, algorithm)
+            pending.append(write_pool.submit(write, job))
+            # Chưa có file kế tiếp (file_paths đang chờ, vd. quét thư mục): trả luôn kết quả đang ghi
+            while pending and (pending[0].done() or admitted.empty()):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        budget.close()
+        read_pool.shutdown(cancel_futures=True)
+        write_pool.shutdown()
+        feeder.join()
+
+# ==============================================================================
+# MANIFEST CHO XỬ LÝ TĂNG DẦN (INCREMENTAL)
+# ==============================================================================
+MANIFEST_NAME = "soundfix_manifest.json"
+# Tăng khi thay đổi DSP hoặc vị trí output làm output cũ không còn dùng lại được
+MANIFEST_VERSION = 5
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def preset_fingerprint(preset: Dict[str, Any]) -> str:
+    """Hash các tham số xử lý của preset; priority và keywords chỉ ảnh hưởng việc khớp file."""
+    params = {k: v for k, v in preset.items() if k not in ('priority', 'keywords')}
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def load_manifest(output_dir: Union[str, Path]) -> Dict[str, Dict[str, Any]]:
+    path = Path(output_dir) / MANIFEST_NAME
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('files', {})
+
+def save_manifest(output_dir: Union[str, Path], entries: Dict[str, Dict[str, Any]]) -> None:
+    path = Path(output_dir) / MANIFEST_NAME
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'files': entries}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def find_previous_run(dest_folder: Union[str, Path], folder_name: str, exclude: Optional[Path] = None, suffix: str = '') -> Optional[Path]:
+    """Thư mục SoundFix_<name>_<ngày><suffix> mới nhất có manifest (suffix phân biệt các shard)."""
+    name_re = re.compile(rf"SoundFix_{re.escape(folder_name)}_\d{{8}}_\d{{6}}{re.escape(suffix)}")
+    runs = sorted(p for p in Path(dest_folder).glob(f"SoundFix_{folder_name}_*")
+                  if p != exclude and name_re.fullmatch(p.name) and (p / MANIFEST_NAME).is_file())
+    return runs[-1] if runs else None
+
+def source_unchanged(file_path: str, entry: Dict[str, Any]) -> Optional[str]:
+    """
+    So file nguồn với entry trong manifest. Trả về sha256 nếu nội dung không đổi, None nếu đã đổi.
+    Size/mtime khớp thì tin luôn, chỉ hash lại khi chúng khác.
+    """
+    st = os.stat(file_path)
+    if st.st_size == entry.get('size') and st.st_mtime_ns == entry.get('mtime_ns'):
+        return entry['sha256']
+    if st.st_size != entry.get('size'):
+        return None
+    digest = file_sha256(file_path)
+    return digest if digest == entry.get('sha256') else None
+
+def manifest_entry(file_path: str, sha256: str, preset: Dict[str, Any], algorithm: str, output_name: str,
+                   dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None, fast_path: Optional[str] = None) -> Dict[str, Any]:
+    """fast_path là quyết định của analyze_fast_path khi output không do engine tạo ra."""
+    st = os.stat(file_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': sha256,
+            'preset': preset_fingerprint(preset), 'category': preset['category_name'],
+            'algorithm': algorithm, 'dtype': dtype, 'subtype': subtype, 'fast_path': fast_path, 'output': output_name}
+
+def reusable_manifest_entry(entry: Optional[Dict[str, Any]], file_path: str, output_dir: Optional[Path], preset: Optional[Dict[str, Any]],
+                            algorithm: str, dtype: str, subtype: Optional[str], fast_path: bool) -> Optional[Dict[str, Any]]:
+    """
+    Entry manifest mới cho file_path nếu output cũ (output_dir / entry['output']) dùng lại được:
+    nguồn, preset, thuật toán và định dạng không đổi; ngược lại None.
+    """
+    if entry is None or preset is None or entry['algorithm'] != algorithm or entry['preset'] != preset_fingerprint(preset):
+        return None
+    if entry['dtype'] != dtype or entry['subtype'] != subtype:
+        return None
+    # Output chép nguyên / chỉ gain chỉ dùng lại khi vẫn bật fast_path và engine vẫn cho phép
+    # (output im lặng giống hệt engine)
+    if entry.get('fast_path') in ('copy', 'gain') and (not fast_path or algorithm not in FAST_PATH_ENGINES):
+        return None
+    if not (Path(output_dir) / entry['output']).is_file():
+        return None
+    sha256 = source_unchanged(file_path, entry)
+    if sha256 is None:
+        return None
+    return manifest_entry(file_path, sha256, preset, algorithm, entry['output'], dtype, subtype, entry.get('fast_path'))
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Hard-link output cũ sang thư mục mới, chép nếu không link được (khác ổ đĩa...)."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+# ==============================================================================
+# BÁO CÁO PROFILING
+# ==============================================================================
+PROFILE_REPORT_NAME = "soundfix_profile"
+
+def format_profile(profile: Dict[str, Any], duration: float) -> str:
+    """Một dòng log: tổng thời gian, các bước chiếm nhiều nhất, tốc độ so với thời gian thực và RSS."""
+    total = profile['total']
+    top = sorted(profile['stages'].items(), key=lambda kv: -kv[1])[:4]
+    parts = [f"⏱️ {total:.2f}s", ", ".join(f"{name} {100 * t / total:.0f}%" for name, t in top if total > 0),
+             f"{duration / total:.0f}x realtime" if total > 0 else "", f"RSS {profile['peak_rss_mb']:.0f} MB" if profile['peak_rss_mb'] is not None else ""]
+    return " | ".join(p for p in parts if p)
+
+def summarize_profiles(files: List[Dict[str, Any]], algorithm: str) -> Dict[str, Any]:
+    """Cộng dồn profile của các file theo preset (category) và cho cả lượt chạy."""
+    def empty() -> Dict[str, Any]:
+        return {'files': 0, 'audio_seconds': 0.0, 'total': 0.0, 'stages': dict.fromkeys(PROFILE_STAGES, 0.0), 'peak_rss_mb': None}
+    run, by_category = empty(), {}
+    for res in files:
+        profile = res.get('profile')
+        if profile is None or res['status'] != 'success':
+            continue
+        for agg in (run, by_category.setdefault(res['category'] or '', empty())):
+            agg['files'] += 1
+            agg['audio_seconds'] += res.get('duration', 0.0)
+            agg['total'] += profile['total']
+            for name, t in profile['stages'].items():
+                agg['stages'][name] += t
+            if profile['peak_rss_mb'] is not None:
+                agg['peak_rss_mb'] = max(agg['peak_rss_mb'] or 0.0, profile['peak_rss_mb'])
+    for agg in [run, *by_category.values()]:
+        agg['realtime'] = agg['audio_seconds'] / agg['total'] if agg['total'] > 0 else None
+    return {'algorithm': algorithm, 'run': run, 'by_category': by_category}
+
+def write_profile_report(output_dir: Union[str, Path], files: List[Dict[str, Any]], summary: Dict[str, Any]) -> Tuple[Path, Path]:
+    """Ghi soundfix_profile.csv (mỗi file một dòng) và soundfix_profile.json (từng file + tổng hợp)."""
+    csv_path = Path(output_dir) / f"{PROFILE_REPORT_NAME}.csv"
+    json_path = Path(output_dir) / f"{PROFILE_REPORT_NAME}.json"
+    profiled = [res for res in files if 'profile' in res]
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'status', 'category', 'algorithm', 'duration_s', 'total_s', 'samples_per_sec', 'peak_rss_mb',
+                         *(f"{name}_s" for name in PROFILE_STAGES)])
+        for res in profiled:
+            profile = res['profile']
+            writer.writerow([res['file'], res['status'], res['category'] or '', summary['algorithm'], f"{res.get('duration', 0.0):.3f}",
+                             f"{profile['total']:.4f}", f"{profile['samples_per_sec']:.0f}",
+                             '' if profile['peak_rss_mb'] is None else f"{profile['peak_rss_mb']:.1f}",
+                             *(f"{profile['stages'].get(name, 0.0):.4f}" for name in PROFILE_STAGES)])
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, 'files': [{k: res.get(k) for k in ('file', 'status', 'category', 'duration', 'profile')} for res in profiled]},
+                  f, ensure_ascii=False, indent=1)
+    return csv_path, json_path
+
+# Cấu hình dùng chung trong mỗi worker process, nạp một lần qua initializer
+_WORKER_CONTEXT: Dict[str, Any] = {}
+
+def _init_worker(bank: PresetBank, output_dir: str, algorithm: str, streaming: Optional[bool] = None, incremental: bool = False, profile: bool = False,
+                 pipeline_memory_mb: Optional[float] = PIPELINE_MEMORY_MB, dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None,
+                 fast_path: bool = False, source_roots: Sequence[str] = ()) -> None:
+    bank.install()
+    _WORKER_CONTEXT.update(presets=bank.presets, matcher=bank.matcher, output_dir=output_dir,
+                           algorithm=algorithm, streaming=streaming, incremental=incremental, profile=profile,
+                           pipeline_memory_mb=pipeline_memory_mb, dtype=dtype, subtype=subtype, fast_path=fast_path,
+                           source_roots=source_roots)
+    warm_filter_cache(bank.presets, algorithm)
+    # Bộ lọc lấy từ preset bank nên thiết kế không còn import scipy.signal: nạp sẵn ở đây
+    # (cùng soundfile) để file đầu tiên của worker không phải chờ import
+    for module in ('scipy.signal', 'soundfile'):
+        importlib.import_module(module)
+    if algorithm == 'Multiband Limiting':
+        # Biên dịch numba ở đây để không tính vào thời gian của file đầu tiên
+        warm_gain_smoother()
+
+def _worker_results(file_paths: List[str]) -> Iterator[Dict[str, Any]]:
+    """Xử lý các file theo cấu hình của worker; pipeline_memory_mb=None tắt pipeline."""
+    ctx = _WORKER_CONTEXT
+    if ctx['pipeline_memory_mb'] is None:
+        results = (process_file(f, ctx['output_dir'], ctx['algorithm'], ctx['matcher'](os.path.basename(f)), ctx['streaming'], ctx['profile'],
+                                ctx['dtype'], ctx['subtype'], ctx['fast_path'], ctx['source_roots'])
+                   for f in file_paths)
+    else:
+        results = process_files_pipelined(file_paths, ctx['output_dir'], ctx['algorithm'], ctx['matcher'], ctx['streaming'],
+                                          ctx['profile'], ctx['pipeline_memory_mb'], dtype=ctx['dtype'], subtype=ctx['subtype'],
+                                          fast_path=ctx['fast_path'], source_roots=ctx['source_roots'])
+    try:
+        for result in results:
+            result.update(pid=os.getpid(), filter_cache=filter_cache_info())
+            if ctx['incremental'] and result['status'] == 'success':
+                file_path = result['file']
+                preset = ctx['matcher'](os.path.basename(file_path))
+                result['manifest'] = manifest_entry(file_path, file_sha256(file_path), preset, ctx['algorithm'], result['output'],
+                                                    ctx['dtype'], ctx['subtype'], result.get('fast_path'))
+            yield result
+    finally:
+        results.close()
+
+def _process_worker_chunk(file_paths: List[str]) -> List[Dict[str, Any]]:
+    return list(_worker_results(file_paths))
+
+def default_worker_count() -> int:
+    return os.cpu_count() or 1
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """'K/N' (K từ 1) → (K - 1, N)."""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", value)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise ValueError(f"Shard không hợp lệ: '{value}' (cần dạng K/N với 1 <= K <= N)")
+    return int(match.group(1)) - 1, int(match.group(2))
+
+# ==============================================================================
+# CHIA KÊNH CỦA FILE LỚN CHO NHIỀU PROCESS (SHARED MEMORY)
+# ==============================================================================
+# File nhiều kênh dài từ chừng này (giây) được chia theo kênh khi bật split_channels
+SPLIT_MIN_SECONDS = 30.0
+
+def _shared_array(shape: Tuple[int, ...], dtype: str, name: Optional[str] = None) -> Tuple[Any, NDArray]:
+    """Mảng numpy trên multiprocessing.shared_memory: tạo mới (name=None) hoặc mở lại theo tên."""
+    from multiprocessing import shared_memory
+    if name is None:
+        shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+    else:
+        shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _process_channel_job(spec: Dict[str, Any], channel: int) -> Dict[str, Any]:
+    """
+    Chạy engine trên một kênh của file đã giải mã vào shared memory (C, n) và ghi kết quả
+    sau volume vào cột tương ứng của buffer output (n, C), không chép tín hiệu qua pickle.
+    Với WAV map được (spec['input'] là None) mỗi worker tự đọc kênh của mình từ memory map
+    của spec['source'], page cache của file được dùng chung giữa các process.
+    Các engine xử lý từng kênh độc lập nên kết quả giống hệt xử lý cả file một lần.
+    Preset chuẩn hóa loudness: kênh được đo ngay trên output engine và ghi chưa nhân volume,
+    'loudness' là LoudnessMeter của kênh để gộp lại ở _split_finish.
+    """
+    in_shm, x = _shared_array(spec['shape'], spec['dtype'], spec['input']) if spec['input'] else (None, None)
+    out_shm, out = _shared_array(spec['shape'][::-1], spec['dtype'], spec['output'])
+    preset = spec['preset']
+    t0 = time.perf_counter()
+    try:
+        with profiling() if spec['profile'] else nullcontext({}) as stages:
+            if x is None:
+                with profile_stage('decode'), MappedWav(spec['source'], spec['layout']) as f:
+                    x_channel = f.read_channel(channel, spec['dtype'])
+            else:
+                x_channel = x[channel]
+            y = engine_functions[spec['algorithm']](x_channel, sr=spec['sr'], **preset)
+            meter = None
+            if normalizes_loudness(preset):
+                meter = LoudnessMeter(1, spec['sr'], 'true_peak_db' in preset)
+                with profile_stage('loudness'):
+                    meter.update(y)
+                np.copyto(out[:, channel], y)
+            else:
+                np.multiply(y, 10 ** (preset['volume'] / 20.0), out=out[:, channel])
+            del y
+            with profile_stage('nan_check'):
+                has_nan = bool(np.any(np.isnan(out[:, channel])))
+        return {'nan': has_nan, 'loudness': meter, 'stages': dict(stages), 'seconds': time.perf_counter() - t0,
+                'pid': os.getpid(), 'filter_cache': filter_cache_info()}
+    finally:
+        # Phải bỏ mọi view vào buffer trước khi đóng shared memory
+        x_channel = None
+        del x, out
+        if in_shm is not None:
+            in_shm.close()
+        out_shm.close()
+
+def split_channel_candidates(file_paths: Iterable[str], matcher: Callable[[str], Optional[Dict[str, Any]]],
+                             streaming: Optional[bool] = None) -> Dict[str, int]:
+    """{file: số kênh} của các file nên chia theo kênh: nhiều kênh, đủ dài, đọc được bằng soundfile."""
+    import soundfile as sf
+    candidates = {}
+    if streaming:
+        return candidates
+    for audio_path in file_paths:
+        if matcher(os.path.basename(audio_path)) is None:
+            continue
+        try:
+            info = sf.info(audio_path)
+        except Exception:
+            continue
+        if info.channels > 1 and info.frames / info.samplerate >= SPLIT_MIN_SECONDS:
+            candidates[audio_path] = info.channels
+    return candidates
+
+def _split_start(executor, audio_path: str, preset: Dict[str, Any], algorithm: str, dtype: str,
+                 subtype: Optional[str], profile: bool, source_roots: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Giải mã file vào shared memory theo block rồi gửi mỗi kênh thành một job cho pool.
+    WAV / RF64 / W64 không nén không cần giải mã ở đây: mỗi job đọc kênh của nó qua memory map.
+    """
+    import soundfile as sf
+    job: Dict[str, Any] = {'file': audio_path, 'preset': preset, 'result': None, 'shm': [], 'futures': [], 'stages': {},
+                           'output_name': output_name_for(audio_path, source_roots)}
+    t0 = time.perf_counter()
+    try:
+        with profiling() if profile else nullcontext({}) as stages:
+            layout = _wav_layout(audio_path)
+            if layout is not None:
+                shape = (layout['channels'], layout['frames'])
+                job.update(sr=layout['samplerate'], subtype=subtype or layout['subtype'], frames=layout['frames'])
+                source = {'input': None, 'source': audio_path, 'layout': layout}
+            else:
+                with profile_stage('decode'), sf.SoundFile(audio_path) as f:
+                    shape = (f.channels, f.frames)
+                    in_shm, x = _shared_array(shape, dtype)
+                    job['shm'].append(in_shm)
+                    pos = 0
+                    for block in f.blocks(blocksize=STREAM_BLOCK_SIZE, dtype=dtype, always_2d=True):
+                        x[:, pos:pos + block.shape[0]] = block.T
+                        pos += block.shape[0]
+                    del x
+                    job.update(sr=f.samplerate, subtype=subtype or f.subtype, frames=pos)
+                if pos != shape[1]:
+                    raise ValueError(f"Đọc được {pos}/{shape[1]} frame")
+                source = {'input': in_shm.name}
+            out_shm, job['output'] = _shared_array(shape[::-1], dtype)
+            job['shm'].append(out_shm)
+            spec = dict(source, output=out_shm.name, shape=shape, dtype=dtype, sr=job['sr'],
+                        algorithm=algorithm, preset=preset, profile=profile)
+            job['futures'] = [executor.submit(_process_channel_job, spec, channel) for channel in range(shape[0])]
+        job['stages'] = dict(stages)
+    except Exception as e:
+        job['result'] = _file_result(audio_path, preset, 'error', f"❌ Lỗi xử lý '{os.path.basename(audio_path)}': {e}")
+    job['seconds'] = time.perf_counter() - t0
+    return job
+
+def _split_finish(job: Dict[str, Any], output_dir: str, profile: bool) -> Dict[str, Any]:
+    """Chờ các job kênh, ghi output từ shared memory và giải phóng nó; trả về kết quả như process_file."""
+    import soundfile as sf
+    audio_path, preset = job['file'], job['preset']
+    file_name = os.path.basename(audio_path)
+    output_name = job['output_name']
+    result = job['result']
+    stages, seconds = job['stages'], job['seconds']
+    worker = {'pid': os.getpid(), 'filter_cache': filter_cache_info()}
+    try:
+        if result is None:
+            channel_results = [future.result() for future in job['futures']]
+            for channel_result in channel_results:
+                seconds += channel_result['seconds']
+                for name, stage_seconds in channel_result['stages'].items():
+                    stages[name] = stages.get(name, 0.0) + stage_seconds
+            worker = {'pid': channel_results[-1]['pid'], 'filter_cache': channel_results[-1]['filter_cache']}
+            if any(channel_result['nan'] for channel_result in channel_results):
+                result = _file_result(audio_path, preset, 'error', f"❌ Dữ liệu lỗi cho file: {file_name}")
+            else:
+                t0 = time.perf_counter()
+                note = ''
+                if normalizes_loudness(preset):
+                    measured = LoudnessMeter.stack([channel_result['loudness'] for channel_result in channel_results]).measurement()
+                    gain_db, loudness = loudness_normalization(preset, measured)
+                    np.multiply(job['output'], 10 ** (gain_db / 20.0), out=job['output'])
+                    note = f", {loudness_note(loudness)}"
+                sf.write(output_path_for(output_dir, output_name), job['output'], job['sr'], subtype=job['subtype'])
+                stages['encode'] = stages.get('encode', 0.0) + time.perf_counter() - t0
+                seconds += stages['encode']
+                result = _file_result(audio_path, preset, 'success',
+                                      f"✅ {file_name} → {output_name} ({preset['category_name']}, {len(channel_results)} kênh song song{note})",
+                                      output_name, job['frames'], job['sr'])
+                if note:
+                    result['loudness'] = loudness
+    except Exception as e:
+        result = _file_result(audio_path, preset, 'error', f"❌ Lỗi xử lý '{file_name}': {e}")
+    finally:
+        job.pop('output', None)
+        for shm in job['shm']:
+            shm.close()
+            shm.unlink()
+    if profile:
+        result = _attach_profile(result, stages, seconds)
+    else:
+        result.pop('frames', None)
+    result.update(worker)
+    return result
+
+def process_split_files(executor, split_files: Dict[str, int], workers: int, output_dir: str, algorithm: str,
+                        matcher: Callable[[str], Optional[Dict[str, Any]]], dtype: str = DEFAULT_DTYPE,
+                        subtype: Optional[str] = None, profile: bool = False, incremental: bool = False,
+                        source_roots: Sequence[str] = ()) -> Dict[str, Dict[str, Any]]:
+    """
+    Xử lý các file lớn bằng mọi worker của executor: mỗi kênh là một job trên shared memory.
+    Nhiều file được xử lý cùng lúc khi tổng số kênh đang chạy không vượt quá workers.
+    Trả về {file: kết quả như process_file, thêm 'pid', 'filter_cache' và 'manifest' nếu incremental}.
+    """
+    results = {}
+    in_flight: deque = deque()
+
+    def finish() -> None:
+        job = in_flight.popleft()
+        result = _split_finish(job, output_dir, profile)
+        if incremental and result['status'] == 'success':
+            result['manifest'] = manifest_entry(job['file'], file_sha256(job['file']), job['preset'], algorithm, result['output'], dtype, subtype)
+        results[job['file']] = result
+
+    for audio_path, channels in split_files.items():
+        while in_flight and sum(len(job['futures']) for job in in_flight) + channels > workers:
+            finish()
+        in_flight.append(_split_start(executor, audio_path, matcher(os.path.basename(audio_path)), algorithm, dtype, subtype, profile,
+                                      source_roots))
+    while in_flight:
+        finish()
+    return results
+
+# ==============================================================================
+# QUÉT THƯ MỤC VÀ ĐIỀU KHIỂN LẦN CHẠY
+# ==============================================================================
+AUDIO_EXTENSIONS = ('.wav', '.w64', '.mp3', '.flac', '.ogg')
+# Số thread đọc danh sách thư mục song song (có ích nhất với ổ mạng)
+SCAN_THREADS = 8
+# Log tiến độ quét thư mục sau mỗi chừng này giây
+SCAN_PROGRESS_SECONDS = 2.0
+
+class BatchControl:
+    """Tạm dừng / tiếp tục / hủy một lần chạy batch_process từ thread khác (vd. nút của giao diện)."""
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    def pause(self) -> None:
+        self._running.clear()
+
+    def resume(self) -> None:
+        self._running.set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        self._running.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Chờ tối đa timeout giây khi đang tạm dừng; True nếu được chạy tiếp (không tạm dừng, không bị hủy)."""
+        return self._running.wait(timeout) and not self.cancelled
+
+def _hold(control: Optional[BatchControl], log_func: Callable[[str], None], idle: Optional[Callable[[], None]] = None) -> None:
+    """Chờ khi control đang tạm dừng (đến khi tiếp tục hoặc bị hủy), gọi idle() mỗi 0.2 giây trong lúc chờ."""
+    if control is not None and control.paused and not control.cancelled:
+        log_func("⏸️ Tạm dừng")
+        while not control.wait(0.2) and not control.cancelled:
+            if idle is not None:
+                idle()
+        if not control.cancelled:
+            log_func("▶️ Tiếp tục")
+
+def _list_audio_dir(path: str) -> List[Tuple[str, str, bool]]:
+    """
+    (khóa, đường dẫn, là thư mục) của file âm thanh và thư mục con trong path, theo thứ tự khóa.
+    Khóa của thư mục có thêm os.sep nên duyệt sâu theo khóa cho đúng thứ tự sorted() của
+    các đường dẫn đầy đủ. Như os.walk: symlink tới thư mục không được duyệt, lỗi đọc bị bỏ qua.
+    """
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                    if is_dir and not entry.is_symlink():
+                        entries.append((entry.name + os.sep, entry.path, True))
+                    elif not is_dir and entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                        entries.append((entry.name, entry.path, False))
+                except OSError:
+                    continue
+    except OSError:
+        return []
+    entries.sort()
+    return entries
+
+def scan_audio_files(folder_path: str, control: Optional[BatchControl] = None,
+                     progress: Optional[Callable[[int, int], None]] = None, threads: int = SCAN_THREADS) -> Iterator[str]:
+    """
+    Như find_audio_files nhưng yield từng file ngay khi tìm thấy, cùng thứ tự. Thư mục được duyệt
+    sâu; danh sách các thư mục con của mỗi thư mục đã mở được đọc trước song song bằng os.scandir
+    trên threads thread. progress(số file, số thư mục) được gọi sau mỗi file và mỗi thư mục
+    được mở. Dừng khi control bị hủy.
+    """
+    pool = ThreadPoolExecutor(threads, thread_name_prefix='soundfix-scan')
+    files = dirs = 0
+
+    def open_dir(listing) -> Iterator[Tuple[str, Any]]:
+        nonlocal dirs
+        entries = listing.result()
+        subdirs = {path: pool.submit(_list_audio_dir, path) for _, path, is_dir in entries if is_dir}
+        dirs += 1
+        if progress is not None:
+            progress(files, dirs)
+        return iter([(path, subdirs.get(path)) for _, path, _ in entries])
+
+    try:
+        stack = [open_dir(pool.submit(_list_audio_dir, folder_path))]
+        while stack:
+            if control is not None and control.cancelled:
+                return
+            item = next(stack[-1], None)
+            if item is None:
+                stack.pop()
+            elif item[1] is None:
+                files += 1
+                if progress is not None:
+                    progress(files, dirs)
+                yield item[0]
+            else:
+                stack.append(open_dir(item[1]))
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def find_audio_files(folder_path: str) -> List[str]:
+    # Sắp xếp để thứ tự (và cách chia shard) không phụ thuộc hệ thống file
+    return list(scan_audio_files(folder_path))
+
+class _FileDispatcher:
+    """
+    Gửi từng file cho worker ngay khi quét thấy và trả kết quả theo đúng thứ tự gửi.
+    Lớp con cài đặt submit, flush, busy, collect, cancel và close.
+    """
+    def __init__(self):
+        self.ready: deque = deque()
+
+    def poll(self, timeout: Optional[float]) -> Optional[Dict[str, Any]]:
+        """Kết quả kế tiếp, chờ tối đa timeout giây (None: đến khi có); None nếu chưa xong."""
+        if not self.ready:
+            self.collect(timeout)
+        return self.ready.popleft() if self.ready else None
+
+class _PoolDispatcher(_FileDispatcher):
+    """
+    Pool process: mỗi worker nhận một nhóm file để pipeline của nó có file kế tiếp mà đọc
+    trước. Nhóm lớn dần theo số file đã gửi (tối đa 16). run_chunk là hàm worker nhận một nhóm
+    đường dẫn và trả về danh sách kết quả.
+    """
+    def __init__(self, executor, workers: int, run_chunk: Optional[Callable[[List[str]], List[Dict[str, Any]]]] = None):
+        super().__init__()
+        self.executor = executor
+        self.workers = workers
+        self.run_chunk = run_chunk or _process_worker_chunk
+        self.submitted = 0
+        self.chunk: List[Dict[str, Any]] = []
+        self.in_flight: deque = deque()  # (future, các mục của nhóm)
+
+    def submit(self, item: Dict[str, Any]) -> None:
+        self.chunk.append(item)
+        self.submitted += 1
+        if len(self.chunk) >= min(16, max(1, self.submitted // (self.workers * 4))):
+            self.flush()
+
+    def flush(self) -> None:
+        if self.chunk:
+            items, self.chunk = self.chunk, []
+            self.in_flight.append((self.executor.submit(self.run_chunk, [item['file'] for item in items]), items))
+
+    def busy(self) -> bool:
+        # Đủ việc cho mọi worker và một nhóm chờ sẵn
+        return len(self.in_flight) >= 2 * self.workers
+
+    def collect(self, timeout: Optional[float]) -> None:
+        if self.in_flight:
+            try:
+                self.ready.extend(self.in_flight[0][0].result(timeout))
+            except TimeoutError:
+                return
+            self.in_flight.popleft()
+
+    def cancel(self) -> List[Dict[str, Any]]:
+        """Bỏ các file chưa bắt đầu (nhóm chưa gửi và nhóm chưa worker nào nhận); trả về các mục bị bỏ."""
+        dropped, self.chunk = self.chunk, []
+        running: deque = deque()
+        for future, items in self.in_flight:
+            if future.cancel():
+                dropped.extend(items)
+            else:
+                running.append((future, items))
+        self.in_flight = running
+        return dropped
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+class _ThreadDispatcher(_FileDispatcher):
+    """
+    workers=1: một thread chạy pipeline của worker (_worker_results) trên luồng file được
+    gửi vào dần, nên vẫn đọc trước / ghi sau như khi có sẵn danh sách file.
+    """
+    def __init__(self, worker_args: Tuple):
+        super().__init__()
+        self.files: queue.Queue = queue.Queue()
+        self.results: queue.Queue = queue.Queue()
+        self.submitted: deque = deque()
+        self.thread = threading.Thread(target=self._run, args=(worker_args,), name='soundfix-worker', daemon=True)
+        self.thread.start()
+
+    def _run(self, worker_args: Tuple) -> None:
+        try:
+            _init_worker(*worker_args)
+            results = _worker_results(iter(self.files.get, None))
+            try:
+                for result in results:
+                    self.results.put(result)
+            finally:
+                results.close()
+        except BaseException as e:
+            self.results.put(e)
+
+    def submit(self, item: Dict[str, Any]) -> None:
+        self.submitted.append(item)
+        self.files.put(item['file'])
+
+    def flush(self) -> None:
+        pass
+
+    def busy(self) -> bool:
+        # Pipeline tự đọc trước các file đã nhận; giữ hàng chờ ngắn để tạm dừng / hủy có hiệu lực ngay
+        return self.files.qsize() >= 2
+
+    def collect(self, timeout: Optional[float]) -> None:
+        try:
+            result = self.results.get(timeout=timeout)
+        except queue.Empty:
+            return
+        if isinstance(result, BaseException):
+            raise result
+        self.submitted.popleft()
+        self.ready.append(result)
+
+    def cancel(self) -> List[Dict[str, Any]]:
+        dropped = []
+        while True:
+            try:
+                self.files.get_nowait()
+            except queue.Empty:
+                break
+            dropped.append(self.submitted.pop())
+        dropped.reverse()
+        return dropped
+
+    def close(self) -> None:
+        self.cancel()
+        self.files.put(None)
+        self.thread.join()
+
+def _check_run_options(algorithm: str, dtype: str, subtype: Optional[str]) -> Optional[str]:
+    """Lỗi của thuật toán / dtype / subtype không hợp lệ, None nếu hợp lệ."""
+    if algorithm not in engine_functions:
+        return f"Không tìm thấy engine: {algorithm}"
+    if dtype not in PROCESSING_DTYPES:
+        return f"Kiểu dữ liệu không hợp lệ: {dtype} (chọn {', '.join(PROCESSING_DTYPES)})"
+    if subtype is not None:
+        import soundfile as sf
+        if subtype not in sf.available_subtypes():
+            return f"Subtype không hợp lệ: {subtype}"
+    return None
+
+def batch_process(folder_path: str, dest_folder: str, csv_path: str, log_func: Optional[Callable[[str], None]], algorithm: str,
+                  workers: Optional[int] = None, streaming: Optional[bool] = None, incremental: bool = False,
+                  shard: Optional[Tuple[int, int]] = None, profile: bool = False,
+                  pipeline_memory_mb: Optional[float] = PIPELINE_MEMORY_MB, dtype: str = DEFAULT_DTYPE,
+                  subtype: Optional[str] = None, split_channels: bool = False, fast_path: bool = False,
+                  control: Optional[BatchControl] = None) -> Dict[str, Any]:
+    """
+    Xử lý toàn bộ folder. Thư mục được quét dần (scan_audio_files) và mỗi file được gửi
+    cho worker ngay khi tìm thấy; tiến độ quét được log sau mỗi SCAN_PROGRESS_SECONDS giây.
+    workers=None dùng số nhân CPU, workers=1 chạy tuần tự trong một thread của process
+    hiện tại. streaming được chuyển cho process_audio_file.
+    incremental=True so với manifest của lần chạy trước: file nguồn, preset và thuật
+    toán không đổi thì output cũ được hard-link sang thay vì xử lý lại.
+    shard=(k, n) chỉ xử lý các file thứ k, k+n, k+2n... trong danh sách đã sắp xếp,
+    để chia một thư viện cho n máy; output vào thư mục riêng có hậu tố _shard<k+1>of<n>.
+    profile=True đo thời gian từng bước của mỗi file (xem process_file), in ra log và
+    ghi báo cáo soundfix_profile.csv / .json vào thư mục output.
+    pipeline_memory_mb: mỗi worker đọc trước / ghi sau song song với xử lý (xem
+    process_files_pipelined), tổng audio trong pipeline của mọi worker không quá số MB này;
+    None để đọc, xử lý, ghi tuần tự từng file.
+    dtype, subtype: kiểu dữ liệu xử lý và subtype của output (xem process_file).
+    split_channels=True xử lý file nhiều kênh dài từ SPLIT_MIN_SECONDS bằng mọi worker,
+    mỗi kênh một job trên shared memory (xem process_split_files), gom đủ kênh cho mọi
+    worker rồi mới chạy; cần bộ nhớ gấp đôi audio đã giải mã của các file đang xử lý.
+    fast_path=True bỏ qua engine cho file im lặng hoặc đã sạch ngoài dải (xem process_file,
+    analyze_fast_path); file streaming và file chia kênh luôn chạy engine.
+    control: BatchControl để tạm dừng / hủy từ thread khác. Khi hủy, việc quét dừng lại, file
+    chưa bắt đầu bị bỏ, file đang chạy được làm xong và vẫn có trong kết quả.
+
+    Trả về {'output_dir', 'counts', 'files', 'filter_cache', 'profile', 'fast_path', 'scan', 'cancelled', 'error'}:
+    'files' là danh sách kết quả từng file theo thứ tự (xem process_file, thêm status 'reused'),
+    'fast_path' là số file theo quyết định của analyze_fast_path khi bật, 'scan' là {'files', 'dirs',
+    'seconds'} của lần quét, 'cancelled' là số file đã tìm thấy nhưng bị bỏ do hủy (None nếu không hủy),
+    'error' khác None khi không chạy được (lỗi cấu hình...).
+    """
+    if log_func is None:
+        log_func = lambda msg: None
+    counts = {'success': 0, 'skipped': 0, 'error': 0, 'reused': 0}
+    summary: Dict[str, Any] = {'output_dir': None, 'counts': counts, 'files': [], 'filter_cache': None, 'profile': None,
+                               'fast_path': None, 'scan': None, 'cancelled': None, 'error': None}
+    summary['error'] = _check_run_options(algorithm, dtype, subtype)
+    if summary['error'] is None and not os.path.isdir(folder_path):
+        summary['error'] = f"Không tìm thấy folder: {folder_path}"
+    if summary['error'] is not None:
+        log_func(f"❌ Lỗi: {summary['error']}")
+        return summary
+    try:
+        bank = compile_preset_bank(csv_path)
+        log_func(f"Tải thành công {len(bank.presets)} quy tắc từ {os.path.basename(csv_path)}")
+        for problem in bank.sample_rate_problems():
+            log_func(f"🟡 {problem}")
+        design_start = time.perf_counter()
+        if bank.ensure_designs(algorithm):
+            log_func(f"🧮 Đã thiết kế sẵn bộ lọc của preset bank ({time.perf_counter() - design_start:.1f}s, dùng lại cho lần chạy sau)")
+    except Exception as e:
+        summary['error'] = f"Không thể tải file cấu hình: {e}"
+        log_func(f"❌ Lỗi: Không thể tải file cấu hình.\n{e}")
+        return summary
+    scan: Dict[str, Any] = {'files': 0, 'dirs': 0, 'seconds': 0.0}
+    summary['scan'] = scan
+    scan_start = last_progress = time.perf_counter()
+
+    def scan_progress(files: int, dirs: int) -> None:
+        nonlocal last_progress
+        scan.update(files=files, dirs=dirs)
+        if time.perf_counter() - last_progress >= SCAN_PROGRESS_SECONDS:
+            last_progress = time.perf_counter()
+            log_func(f"🔎 Đang quét: {files} file trong {dirs} thư mục...")
+
+    # File được xử lý ngay khi quét thấy, không chờ quét xong cả thư viện
+    scanner = scan_audio_files(folder_path, control, scan_progress)
+    audio_files: Iterator[str] = scanner
+    suffix = ''
+    if shard is not None:
+        index, count = shard
+        audio_files = (f for i, f in enumerate(scanner) if i % count == index)
+        suffix = f"_shard{index + 1}of{count}"
+    try:
+        file_path = next(audio_files, None)
+        if file_path is None:
+            log_func("⛔ Đã hủy." if control is not None and control.cancelled else "Không tìm thấy file âm thanh.")
+            return summary
+        output_dir = Path(dest_folder) / f"SoundFix_{Path(folder_path).name}_{datetime.datetime.now():%Y%m%d_%H%M%S}{suffix}"
+        output_dir.mkdir(parents=True, exist_ok=True)
+        summary['output_dir'] = str(output_dir)
+
+        matcher = bank.matcher
+        manifest: Dict[str, Dict[str, Any]] = {}
+        previous: Dict[str, Dict[str, Any]] = {}
+        previous_dir = None
+        if incremental:
+            previous_dir = find_previous_run(dest_folder, Path(folder_path).name, exclude=output_dir, suffix=suffix)
+            previous = load_manifest(previous_dir) if previous_dir else {}
+            log_func(f"♻️ Manifest trước: {previous_dir or 'không có'} ({len(previous)} file)")
+
+        def reusable_entry(file_path: str, key: str) -> Optional[Dict[str, Any]]:
+            entry = reusable_manifest_entry(previous.get(key), file_path, previous_dir, matcher(os.path.basename(file_path)),
+                                            algorithm, dtype, subtype, fast_path)
+            return None if entry is None else dict(entry, source_dir=previous_dir)
+
+        workers = workers or default_worker_count()
+        log_func(f"Bắt đầu xử lý với {workers} worker...\nThư mục output: {output_dir}")
+        worker_memory_mb = pipeline_memory_mb / workers if pipeline_memory_mb is not None else None
+        source_roots = (folder_path,)
+        worker_args = (bank, str(output_dir), algorithm, streaming, incremental, profile, worker_memory_mb, dtype, subtype, fast_path,
+                       source_roots)
+        dispatcher = None
+
+        def get_dispatcher():
+            # Chỉ tạo worker khi có file cần xử lý (lần chạy incremental có thể dùng lại tất cả)
+            nonlocal dispatcher
+            if dispatcher is None:
+                if workers == 1:
+                    dispatcher = _ThreadDispatcher(worker_args)
+                else:
+                    # Dùng 'spawn' để không fork một process đang chạy Tk
+                    dispatcher = _PoolDispatcher(ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                                                     initializer=_init_worker, initargs=worker_args), workers)
+            return dispatcher
+
+        # File lớn chia kênh được gom lại đến khi đủ kênh cho mọi worker rồi mới chạy
+        split_pending: Dict[str, int] = {}
+        split_results: Dict[str, Dict[str, Any]] = {}
+
+        def run_split() -> None:
+            if split_pending:
+                log_func(f"🔀 {len(split_pending)} file lớn được chia theo kênh cho các worker")
+                split_results.update(process_split_files(get_dispatcher().executor, dict(split_pending), workers, str(output_dir),
+                                                         algorithm, matcher, dtype, subtype, profile, incremental, source_roots))
+                split_pending.clear()
+
+        # Mục của từng file theo thứ tự quét; kind: 'process', 'split', 'reused' hoặc 'cancelled'
+        order: deque = deque()
+        # Thống kê cache bộ lọc mới nhất của từng process
+        cache_stats: Dict[int, Dict[str, int]] = {}
+        found = done = 0
+        scanning = True
+
+        def emit(timeout: Optional[float]) -> None:
+            """Log các file đầu hàng đã có kết quả, chờ mỗi file tối đa timeout giây (None: chờ hết hàng)."""
+            nonlocal done
+            while order:
+                item = order[0]
+                key = item['key']
+                if item['kind'] == 'cancelled':
+                    order.popleft()
+                    continue
+                if item['kind'] == 'reused':
+                    entry = item['entry']
+                    try:
+                        link_or_copy(entry.pop('source_dir') / entry['output'], output_path_for(output_dir, entry['output']))
+                    except OSError as e:
+                        result = {'file': item['file'], 'status': 'error', 'category': entry['category'], 'output': None,
+                                  'message': f"❌ Không dùng lại được output của '{key}': {e}"}
+                    else:
+                        manifest[key] = entry
+                        result = {'file': item['file'], 'status': 'reused', 'category': entry['category'], 'output': entry['output'],
+                                  'message': f"♻️ Không đổi: {os.path.basename(item['file'])} → {entry['output']} ({entry['category']})"}
+                else:
+                    if item['kind'] == 'split':
+                        if item['file'] not in split_results:
+                            if timeout is not None:
+                                return
+                            run_split()
+                        result = split_results.pop(item['file'])
+                    else:
+                        result = dispatcher.poll(timeout)
+                        if result is None:
+                            return
+                    cache_stats[result.pop('pid')] = result.pop('filter_cache')
+                    if 'manifest' in result:
+                        manifest[key] = result.pop('manifest')
+                order.popleft()
+                done += 1
+                log_func(f"[{done}/{found}{'+' if scanning else ''}] {result['message']}")
+                if 'profile' in result:
+                    log_func(f"    {format_profile(result['profile'], result.get('duration', 0.0))}")
+                counts[result['status']] += 1
+                summary['files'].append(result)
+
+        def stopped() -> bool:
+            return control is not None and control.cancelled
+
+        def hold() -> None:
+            # Tạm dừng: không gửi thêm file, các file worker đã nhận vẫn chạy xong và được log
+            _hold(control, log_func, lambda: emit(0))
+
+        try:
+            while file_path is not None:
+                hold()
+                if stopped():
+                    break
+                found += 1
+                item = {'file': file_path, 'key': source_key(file_path, source_roots), 'kind': 'process'}
+                entry = reusable_entry(file_path, item['key']) if incremental else None
+                split = split_channel_candidates([file_path], matcher, streaming) if entry is None and split_channels and workers > 1 else {}
+                order.append(item)
+                if entry is not None:
+                    item.update(kind='reused', entry=entry)
+                elif split:
+                    item['kind'] = 'split'
+                    split_pending.update(split)
+                    if sum(split_pending.values()) >= workers:
+                        run_split()
+                else:
+                    get_dispatcher().submit(item)
+                    while dispatcher.busy() and not stopped():
+                        hold()
+                        dispatcher.collect(0.2)
+                        emit(0)
+                emit(0)
+                file_path = next(audio_files, None)
+            scanning = False
+            scan['seconds'] = time.perf_counter() - scan_start
+            scan_complete = not stopped()
+            if scan_complete:
+                log_func(f"🔎 Quét xong: {scan['files']} file trong {scan['dirs']} thư mục ({scan['seconds']:.1f}s)")
+                if shard is not None:
+                    log_func(f"🧩 Shard {shard[0] + 1}/{shard[1]}: {found} file")
+                if dispatcher is not None:
+                    dispatcher.flush()
+                run_split()
+            while order and not stopped():
+                hold()
+                emit(0.2)
+            if stopped():
+                # Hủy: bỏ các file chưa bắt đầu, các file đang chạy được làm xong và vẫn có trong kết quả
+                dropped = dispatcher.cancel() if dispatcher is not None else []
+                dropped += [item for item in order if item['kind'] == 'split' and item['file'] in split_pending]
+                split_pending.clear()
+                for item in dropped:
+                    item['kind'] = 'cancelled'
+                summary['cancelled'] = len(dropped)
+                where = "" if scan_complete else f"ngừng quét sau {found} file, "
+                log_func(f"⛔ Đã hủy: {where}{len(dropped)} file chưa xử lý bị bỏ qua")
+            emit(None)
+        finally:
+            if dispatcher is not None:
+                dispatcher.close()
+            if incremental:
+                save_manifest(output_dir, manifest)
+    finally:
+        scanner.close()
+    cache_hits = sum(c['hits'] for c in cache_stats.values())
+    cache_misses = sum(c['misses'] for c in cache_stats.values())
+    summary['filter_cache'] = {'hits': cache_hits, 'misses': cache_misses, 'processes': len(cache_stats)}
+    log_func(f"\n📊 Thống kê:\n✅ Thành công: {counts['success']} file\n♻️ Không đổi: {counts['reused']} file\n🟡 Bỏ qua: {counts['skipped']} file\n❌ Lỗi: {counts['error']} file")
+    log_func(f"🧮 Cache bộ lọc: {cache_hits} hit / {cache_misses} miss ({len(cache_stats)} process)")
+    if fast_path:
+        decisions = {decision: sum(result.get('fast_path') == decision for result in summary['files']) for decision in FAST_PATH_LABELS}
+        summary['fast_path'] = decisions
+        shortcuts = sum(count for decision, count in decisions.items() if decision != 'process')
+        log_func(f"⚡ Bỏ qua engine: {shortcuts} file (" + ", ".join(f"{FAST_PATH_LABELS[d]} {c}" for d, c in decisions.items() if d != 'process') + ")")
+    if profile:
+        summary['profile'] = summarize_profiles(summary['files'], algorithm)
+        run = summary['profile']['run']
+        csv_report, _ = write_profile_report(output_dir, summary['files'], summary['profile'])
+        if run['total'] > 0:
+            stages = ", ".join(f"{name} {100 * t / run['total']:.0f}%" for name, t in sorted(run['stages'].items(), key=lambda kv: -kv[1]) if t > 0)
+            log_func(f"⏱️ Profiling: {run['total']:.1f}s xử lý cho {run['audio_seconds']:.1f}s âm thanh ({run['realtime']:.0f}x realtime)\n   {stages}")
+            for category, agg in sorted(summary['profile']['by_category'].items(), key=lambda kv: -kv[1]['total']):
+                log_func(f"   {category}: {agg['files']} file, {agg['total']:.1f}s, {agg['realtime']:.0f}x realtime")
+        log_func(f"📄 Báo cáo profiling: {csv_report}")
+    return summary
+
+def dry_run_report(folder_path: str, dest_folder: str, csv_path: str, log_func, control: Optional[BatchControl] = None) -> Optional[Path]:
+    """
+    Phân loại mọi file trong folder mà không xử lý âm thanh, ghi báo cáo CSV vào thư mục đích.
+    File được phân loại ngay khi quét thấy (scan_audio_files). control: BatchControl như
+    batch_process; khi hủy, việc quét dừng lại và báo cáo chỉ có các file đã phân loại.
+    """
+    try:
+        # Cùng preset bank có cache và matcher với lần chạy batch
+        bank = compile_preset_bank(csv_path)
+    except Exception as e:
+        log_func(f"❌ Lỗi: Không thể tải file cấu hình.\n{e}")
+        return None
+    if not os.path.isdir(folder_path):
+        log_func(f"❌ Lỗi: Không tìm thấy folder: {folder_path}")
+        return None
+    Path(dest_folder).mkdir(parents=True, exist_ok=True)
+    report_path = Path(dest_folder) / f"SoundFix_{Path(folder_path).name}_{datetime.datetime.now():%Y%m%d_%H%M%S}_phan_loai.csv"
+
+    def audio_files() -> Iterator[str]:
+        scanner = scan_audio_files(folder_path, control)
+        try:
+            for file_path in scanner:
+                _hold(control, log_func)
+                if control is not None and control.cancelled:
+                    return
+                yield file_path
+        finally:
+            scanner.close()
+
+    counts = write_classification_report(audio_files(), bank.matcher, report_path)
+    found = sum(counts.values())
+    if control is not None and control.cancelled:
+        log_func(f"⛔ Đã hủy: ngừng quét sau {found} file")
+    log_func(f"🔎 Phân loại {found} file → {report_path}")
+    for category, count in sorted(counts.items(), key=lambda kv: -kv[1]):
+        log_func(f"   {category or '🟡 (không khớp)'}: {count} file")
+    return report_path
 
 # ==============================================================================
-# LOGIC ĐỌC CẤU HÌNH VÀ XỬ LÝ ÂM THANH
+# CHẾ ĐỘ DỊCH VỤ: THEO DÕI FOLDER VÀ XỬ LÝ FILE MỚI LIÊN TỤC
 # ==============================================================================
-def load_presets_from_csv(csv_path: str) -> List[Dict[str, Any]]:
-    if not os.path.exists(csv_path): 
-        raise FileNotFoundError(f"Không tìm thấy file: {csv_path}")
-    presets = []
-    with open(csv_path, mode='r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-        for row in reader:
+# Quét lại các folder theo dõi sau mỗi chừng này giây
+SERVICE_POLL_SECONDS = 1.0
+# File chỉ được xử lý khi size / mtime không đổi giữa hai lần quét và mtime đã cũ chừng này
+# giây, để file đang được chép vào không bị xử lý dở
+SERVICE_SETTLE_SECONDS = 2.0
+# Ghi file trạng thái và manifest sau mỗi chừng này giây
+SERVICE_STATUS_SECONDS = 1.0
+SERVICE_MANIFEST_SECONDS = 5.0
+# Số file gần nhất dùng cho percentile độ trễ, và cửa sổ (giây) tính throughput
+SERVICE_LATENCY_WINDOW = 1000
+SERVICE_THROUGHPUT_SECONDS = 60.0
+SERVICE_STATUS_NAME = "soundfix_service_status.json"
+
+def _percentiles(values: Iterable[float]) -> Dict[str, Optional[float]]:
+    values = list(values)
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None, 'max': None}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99]).tolist()
+    return {'p50': round(p50, 3), 'p90': round(p90, 3), 'p99': round(p99, 3), 'max': round(max(values), 3)}
+
+def _wav_incomplete(path: str) -> bool:
+    """WAV / RF64 / W64 có chunk data dài hơn phần đã có trên đĩa: đang được chép dở dù đứng yên."""
+    layout = _wav_layout(path)
+    return layout is not None and not layout['complete']
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+class IngestService:
+    """
+    Xử lý liên tục các file được thả vào input_folders. Mỗi poll_seconds các folder được quét
+    lại; file mới hoặc đã đổi chờ đến khi ghi xong (xem SERVICE_SETTLE_SECONDS), rồi vào hàng
+    đợi theo priority của preset (số nhỏ trước) và được xử lý bởi một pool worker giữ ấm suốt
+    thời gian chạy: preset bank, bộ lọc và numba chỉ được nạp một lần mỗi process. Mỗi worker
+    chỉ nhận một file một lúc để file có priority tốt hơn vừa được thả vào không phải chờ.
+
+    Output nằm trong output_dir (giữ thư mục con của file nguồn, xem output_name_for) cùng
+    manifest: khi chạy lại, file không đổi không bị xử
+    lý lại. File CSV cấu hình được theo dõi: khi nó đổi, worker được khởi động lại với preset
+    mới sau khi các file đang xử lý xong, và file có preset đổi được xử lý lại.
+    status() (và file SERVICE_STATUS_NAME trong output_dir) cho biết hàng đợi, percentile độ
+    trễ (từ lúc phát hiện file đến lúc ghi xong output) và throughput. control: BatchControl để
+    tạm dừng (không gửi thêm file) hoặc dừng dịch vụ từ thread khác.
+    """
+    def __init__(self, input_folders: List[str], output_dir: str, csv_path: str, log_func: Optional[Callable[[str], None]] = None,
+                 algorithm: str = "Dynamic Hybrid Brickwall", workers: Optional[int] = None, streaming: Optional[bool] = None,
+                 dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None, fast_path: bool = False,
+                 poll_seconds: float = SERVICE_POLL_SECONDS, settle_seconds: float = SERVICE_SETTLE_SECONDS,
+                 control: Optional[BatchControl] = None):
+        self.input_folders = [os.path.abspath(folder) for folder in input_folders]
+        self.output_dir = Path(output_dir).resolve()
+        self.csv_path = csv_path
+        self.log = log_func or (lambda msg: None)
+        self.algorithm, self.streaming, self.dtype, self.subtype, self.fast_path = algorithm, streaming, dtype, subtype, fast_path
+        self.workers = workers or default_worker_count()
+        self.poll_seconds, self.settle_seconds = poll_seconds, settle_seconds
+        self.control = control or BatchControl()
+        self.bank: Optional[PresetBank] = None
+        self.next_bank: Optional[PresetBank] = None
+        self.csv_stat: Optional[Tuple[int, int]] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.manifest = load_manifest(self.output_dir)
+        self.manifest_dirty = False
+        # (size, mtime_ns) của các file đã vào hàng đợi / đã xử lý, và của các file đang chờ ghi
+        # xong cùng thời điểm phát hiện
+        self.known: Dict[str, Tuple[int, int]] = {}
+        self.pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        # Heap (priority, thứ tự, file, khóa manifest, lúc phát hiện) và file đang ở worker
+        self.queue: List[Tuple[int, int, str, str, float]] = []
+        self.order = itertools.count()
+        self.in_flight: Dict[Any, Tuple[str, str, float, float]] = {}
+        self.counts = {'success': 0, 'skipped': 0, 'error': 0, 'reused': 0}
+        self.latencies: deque = deque(maxlen=SERVICE_LATENCY_WINDOW)
+        self.processing: deque = deque(maxlen=SERVICE_LATENCY_WINDOW)
+        self.finished: deque = deque()  # (lúc xong, giây âm thanh) trong SERVICE_THROUGHPUT_SECONDS gần nhất
+        self.started = time.monotonic()
+        self.snapshot: Dict[str, Any] = {}
+
+    def _is_output(self, path: str) -> bool:
+        # output_dir nằm trong folder theo dõi: không xử lý lại output của chính dịch vụ
+        return path.startswith(str(self.output_dir) + os.sep)
+
+    def check_config(self) -> None:
+        """Nạp lại file CSV khi nó đổi. CSV mới bị lỗi thì giữ cấu hình cũ (lần nạp đầu tiên thì ném lỗi)."""
+        try:
+            st = os.stat(self.csv_path)
+        except OSError:
+            if self.bank is None:
+                raise
+            return
+        if (st.st_size, st.st_mtime_ns) == self.csv_stat:
+            return
+        self.csv_stat = (st.st_size, st.st_mtime_ns)
+        try:
+            bank = compile_preset_bank(self.csv_path)
+            bank.ensure_designs(self.algorithm)
+        except Exception as e:
+            if self.bank is None:
+                raise
+            self.log(f"❌ File cấu hình mới không hợp lệ, vẫn dùng cấu hình cũ: {e}")
+            return
+        current = self.next_bank or self.bank
+        if current is not None and bank.sha256 == current.sha256:
+            return
+        for problem in bank.sample_rate_problems():
+            self.log(f"🟡 {problem}")
+        if self.bank is None:
+            self.bank = bank
+        else:
+            self.next_bank = bank
+            self.log(f"🔁 File cấu hình đã đổi ({len(bank.presets)} quy tắc): nạp lại sau khi {len(self.in_flight)} file đang xử lý xong")
+
+    def _swap_bank(self) -> None:
+        # Worker mới nạp preset mới; mọi file được xét lại với manifest ở lần quét sau
+        self._close_pool()
+        self.bank, self.next_bank = self.next_bank, None
+        self.known.clear()
+        self.queue.clear()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            start = time.perf_counter()
+            worker_args = (self.bank, str(self.output_dir), self.algorithm, self.streaming, True, False, None,
+                           self.dtype, self.subtype, self.fast_path, tuple(self.input_folders))
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_init_worker, initargs=worker_args)
+            # Khởi động mọi worker ngay để file đầu tiên không phải chờ nạp preset / bộ lọc
+            for future in [self.executor.submit(_worker_ready) for _ in range(self.workers)]:
+                future.result()
+            self.log(f"🔥 {self.workers} worker sẵn sàng ({time.perf_counter() - start:.1f}s)")
+        return self.executor
+
+    def _close_pool(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def poll(self) -> None:
+        """Một lượt quét: file mới / đã đổi vào hàng chờ ghi xong, file đã ghi xong vào hàng đợi."""
+        self.check_config()
+        now, wall = time.monotonic(), time.time()
+        seen = set()
+        reused = self.counts['reused']
+        for folder in self.input_folders:
+            for path in scan_audio_files(folder, self.control):
+                # File tạm (rsync, trình chỉnh sửa...) thường bắt đầu bằng '.'
+                if os.path.basename(path).startswith('.') or self._is_output(path):
+                    continue
+                seen.add(path)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                signature = (st.st_size, st.st_mtime_ns)
+                if self.known.get(path) == signature:
+                    continue
+                waiting = self.pending.get(path)
+                detected = waiting[1] if waiting is not None else now
+                settled = (waiting is None or waiting[0] == signature) and wall - st.st_mtime_ns / 1e9 >= self.settle_seconds
+                if settled and not _wav_incomplete(path):
+                    self.pending.pop(path, None)
+                    self.known[path] = signature
+                    self._enqueue(path, detected)
+                else:
+                    self.pending[path] = (signature, detected)
+        if not self.control.cancelled:
+            # File đã bị xóa / đổi tên: quên đi, để file mới cùng tên được xử lý lại
+            for table in (self.pending, self.known):
+                for path in [path for path in table if path not in seen]:
+                    del table[path]
+        if self.counts['reused'] > reused:
+            self.log(f"♻️ {self.counts['reused'] - reused} file không đổi so với manifest, không xử lý lại")
+
+    def _enqueue(self, path: str, detected: float) -> None:
+        # Cùng khóa (và thư mục con của output) như worker tính từ input_folders
+        key = source_key(path, self.input_folders)
+        preset = self.bank.matcher(os.path.basename(path))
+        if preset is None:
+            self._finish(_file_result(path, None, 'skipped', f"🟡 Bỏ qua: {os.path.basename(path)} (Không khớp quy tắc)"), detected)
+            return
+        try:
+            entry = reusable_manifest_entry(self.manifest.get(key), path, self.output_dir, preset, self.algorithm,
+                                            self.dtype, self.subtype, self.fast_path)
+        except OSError:
+            entry = None
+        if entry is not None:
+            self.manifest[key] = entry
+            self.manifest_dirty = True
+            self.counts['reused'] += 1
+            return
+        heapq.heappush(self.queue, (preset['priority'], next(self.order), path, key, detected))
+
+    def dispatch(self) -> None:
+        """Gửi các file ưu tiên nhất cho worker rảnh (không gửi khi tạm dừng hoặc chờ nạp lại cấu hình)."""
+        if self.control.paused or self.next_bank is not None:
+            return
+        while self.queue and len(self.in_flight) < self.workers:
+            _, _, path, key, detected = heapq.heappop(self.queue)
+            self.in_flight[self._pool().submit(_process_worker_chunk, [path])] = (path, key, detected, time.monotonic())
+
+    def collect(self, timeout: Optional[float]) -> None:
+        """Nhận kết quả các file đã xong, chờ tối đa timeout giây (None: đến khi có một file xong)."""
+        from concurrent.futures import FIRST_COMPLETED, wait
+        from concurrent.futures.process import BrokenProcessPool
+        done, _ = wait(list(self.in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            path, key, detected, submitted = self.in_flight.pop(future)
             try:
-                presets.append({
-                    'priority': int(row['priority']),
-                    'keywords': [k.strip().lower() for k in row['keywords'].split(',')],
-                    'category_name': row['category_name'],
-                    'lowcut': int(row['lowcut']), 
-                    'highcut': int(row['highcut']),
-                    'volume': float(row['volume']), 
-                    'attenuation_db': float(row['attenuation_db']),
-                    'gate_threshold_db': float(row['gate_threshold_db']),
-                    'expansion_ratio': float(row['expansion_ratio']),
-                    'mb_low_thresh': float(row.get('mb_low_thresh', -6.0)),
-                    'mb_low_ratio': float(row.get('mb_low_ratio', 4.0)),
-                    'mb_mid_thresh': float(row.get('mb_mid_thresh', -4.0)),
-                    'mb_mid_ratio': float(row.get('mb_mid_ratio', 3.0)),
-                    'mb_high_thresh': float(row.get('mb_high_thresh', -2.0)),
-                    'mb_high_ratio': float(row.get('mb_high_ratio', 2.0)),
-                })
-            except (ValueError, KeyError) as e:
-                raise ValueError(f"Lỗi dữ liệu CSV ở hàng: {row}. Chi tiết: {e}")
-    presets.sort(key=lambda x: x['priority'])
-    return presets
+                result = future.result()[0]
+            except Exception as e:
+                result = _file_result(path, self.bank.matcher(os.path.basename(path)), 'error',
+                                      f"❌ Lỗi xử lý '{os.path.basename(path)}': {e}")
+                if isinstance(e, BrokenProcessPool):
+                    # Một worker chết (hết bộ nhớ...): pool mới được tạo cho file kế tiếp
+                    self._close_pool()
+            result.pop('pid', None)
+            result.pop('filter_cache', None)
+            if 'manifest' in result:
+                self.manifest[key] = result.pop('manifest')
+                self.manifest_dirty = True
+            self._finish(result, detected, submitted)
 
-def get_preset_for_file(filename: str, presets: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-    fn_lower = filename.lower()
-    for preset in presets:
-        if any(keyword in fn_lower for keyword in preset['keywords']): 
-            return preset
-    return None
+    def _finish(self, result: Dict[str, Any], detected: float, submitted: Optional[float] = None) -> None:
+        now = time.monotonic()
+        self.counts[result['status']] += 1
+        if submitted is None:
+            self.log(result['message'])
+            return
+        self.latencies.append(now - detected)
+        self.processing.append(now - submitted)
+        self.finished.append((now, result.get('duration', 0.0)))
+        self.log(f"{result['message']} ⏱️ {now - detected:.1f}s")
 
-def butter_filter(data: NDArray, lowcut: int, highcut: int, sr: int, order: int = 20, btype: str = 'band') -> NDArray:
-    nyq = 0.5 * sr
-    low, high = max(0.01, lowcut / nyq), min(0.99, highcut / nyq)
-    sos = butter(order, [low, high], analog=False, btype=btype, output='sos')
-    if data.ndim > 1:
-        result = data.copy()
-        for ch in range(data.shape[0]): 
-            result[ch] = sosfilt(sos, data[ch])
-        return result
-    return sosfilt(sos, data)
+    def status(self) -> Dict[str, Any]:
+        """Trạng thái hiện tại: hàng đợi, số file theo kết quả, percentile độ trễ (giây) và throughput."""
+        now = time.monotonic()
+        while self.finished and now - self.finished[0][0] > SERVICE_THROUGHPUT_SECONDS:
+            self.finished.popleft()
+        window = max(min(SERVICE_THROUGHPUT_SECONDS, now - self.started), 1e-9)
+        state = 'stopping' if self.control.cancelled else 'paused' if self.control.paused else 'running'
+        return {'state': state, 'updated': datetime.datetime.now().isoformat(timespec='seconds'),
+                'uptime_seconds': round(now - self.started, 1), 'inputs': self.input_folders, 'output_dir': str(self.output_dir),
+                'algorithm': self.algorithm, 'workers': self.workers, 'preset_bank': self.bank.sha256[:16] if self.bank else None,
+                'queue': {'waiting': len(self.queue), 'settling': len(self.pending), 'processing': len(self.in_flight)},
+                'counts': dict(self.counts),
+                'latency_seconds': _percentiles(self.latencies), 'processing_seconds': _percentiles(self.processing),
+                'throughput': {'files_per_minute': round(len(self.finished) * 60 / window, 2),
+                               'audio_seconds_per_minute': round(sum(d for _, d in self.finished) * 60 / window, 2)}}
 
-def multiband_limiting_filter(data: NDArray, sr: int, **preset) -> NDArray:
+    def _write_status(self, **extra: Any) -> None:
+        self.snapshot = dict(self.status(), **extra)
+        try:
+            _replace_file(self.output_dir / SERVICE_STATUS_NAME,
+                          lambda f: json.dump(self.snapshot, f, ensure_ascii=False, indent=1), mode='w')
+        except OSError:
+            pass
+
+    def _save_manifest(self) -> None:
+        if self.manifest_dirty:
+            save_manifest(self.output_dir, self.manifest)
+            self.manifest_dirty = False
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Chạy đến khi control bị hủy (hoặc Ctrl+C): các file đang xử lý được làm xong, file
+        còn trong hàng đợi để lần chạy sau. Trả về status() cuối cùng.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.check_config()
+        self.log(f"👀 Theo dõi {', '.join(self.input_folders)} → {self.output_dir}\n"
+                 f"   {len(self.bank.presets)} quy tắc, {self.algorithm}, {self.workers} worker, quét mỗi {self.poll_seconds:g}s")
+        self._pool()
+        next_poll = next_status = next_manifest = 0.0
+        paused = False
+        try:
+            while not self.control.cancelled:
+                now = time.monotonic()
+                if now >= next_poll:
+                    self.poll()
+                    next_poll = now + self.poll_seconds
+                if self.next_bank is not None and not self.in_flight:
+                    self._swap_bank()
+                    self.log(f"🔁 Đã nạp cấu hình mới: {len(self.bank.presets)} quy tắc")
+                    next_poll = now
+                    continue
+                if self.control.paused != paused:
+                    paused = self.control.paused
+                    self.log("⏸️ Tạm dừng" if paused else "▶️ Tiếp tục")
+                self.dispatch()
+                if now >= next_status:
+                    self._write_status()
+                    next_status = now + SERVICE_STATUS_SECONDS
+                if now >= next_manifest:
+                    self._save_manifest()
+                    next_manifest = now + SERVICE_MANIFEST_SECONDS
+                timeout = max(0.0, min(next_poll, next_status) - time.monotonic())
+                if self.in_flight:
+                    self.collect(timeout)
+                else:
+                    time.sleep(min(timeout, 0.2))
+        except KeyboardInterrupt:
+            self.control.cancel()
+        finally:
+            self.log(f"⛔ Dừng dịch vụ: chờ {len(self.in_flight)} file đang xử lý, {len(self.queue)} file trong hàng đợi để lần sau")
+            while self.in_flight:
+                self.collect(None)
+            self._close_pool()
+            self._save_manifest()
+            self._write_status(state='stopped')
+        counts = self.counts
+        self.log(f"\n📊 Thống kê:\n✅ Thành công: {counts['success']} file\n♻️ Không đổi: {counts['reused']} file\n"
+                 f"🟡 Bỏ qua: {counts['skipped']} file\n❌ Lỗi: {counts['error']} file")
+        return self.snapshot
+
+def serve_service_status(service: IngestService, port: int, host: str = '127.0.0.1') -> Any:
     """
-    Multiband Limiting Filter với 3 dải tần số:
-    - Low band: 20Hz - 250Hz
-    - Mid band: 250Hz - 4000Hz  
-    - High band: 4000Hz - 20000Hz
-    """
-    # Định nghĩa các dải tần số
-    bands = [
-        {'low': 20, 'high': 250, 'name': 'Low'},
-        {'low': 250, 'high': 4000, 'name': 'Mid'},
-        {'low': 4000, 'high': 20000, 'name': 'High'}
-    ]
-    
-    # Các tham số limiting cho từng dải
-    limiting_params = {
-        'Low': {'threshold': preset.get('mb_low_thresh', -6.0), 'ratio': preset.get('mb_low_ratio', 4.0), 'attack': 0.001, 'release': 0.1},
-        'Mid': {'threshold': preset.get('mb_mid_thresh', -4.0), 'ratio': preset.get('mb_mid_ratio', 3.0), 'attack': 0.005, 'release': 0.05},
-        'High': {'threshold': preset.get('mb_high_thresh', -2.0), 'ratio': preset.get('mb_high_ratio', 2.0), 'attack': 0.01, 'release': 0.02}
-    }
-    
-    processed_bands = []
-    
-    for band in bands:
-        # Lọc dải tần số
-        band_data = butter_filter(data.copy(), band['low'], band['high'], sr, order=24, btype='band')
-        
-        # Áp dụng limiting cho dải này
-        params = limiting_params[band['name']]
-        limited_band = apply_limiter(band_data, sr, **params)
-        
-        processed_bands.append(limited_band)
-    
-    # Kết hợp các dải đã xử lý
-    result = np.zeros_like(data)
-    for band_data in processed_bands:
-        result += band_data
-    
-    # Áp dụng EQ chính từ preset
-    y_pass = butter_filter(result, preset['lowcut'], preset['highcut'], sr, order=24, btype='band')
-    y_stop = result - y_pass
-    reduction_gain = 10 ** (preset['attenuation_db'] / 20.0)
-    
-    return y_pass + (y_stop * reduction_gain)
+    Endpoint HTTP cục bộ: GET /status (hoặc /) trả trạng thái mới nhất của dịch vụ dạng JSON.
+    Server chạy trong thread riêng; gọi shutdown() để dừng.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-def apply_limiter(data: NDArray, sr: int, threshold: float, ratio: float, attack: float, release: float) -> NDArray:
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split('?')[0].rstrip('/') not in ('', '/status'):
+                self.send_error(404)
+                return
+            body = json.dumps(service.snapshot, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    threading.Thread(target=server.serve_forever, name='soundfix-status', daemon=True).start()
+    return server
+
+def run_service(input_folders: List[str], output_dir: str, csv_path: str, log_func: Optional[Callable[[str], None]],
+                algorithm: str, workers: Optional[int] = None, streaming: Optional[bool] = None, dtype: str = DEFAULT_DTYPE,
+                subtype: Optional[str] = None, fast_path: bool = False, poll_seconds: float = SERVICE_POLL_SECONDS,
+                settle_seconds: float = SERVICE_SETTLE_SECONDS, status_port: Optional[int] = None,
+                control: Optional[BatchControl] = None) -> Dict[str, Any]:
     """
-    Áp dụng limiter cho một dải tần số
+    Chạy IngestService đến khi bị dừng; status_port bật endpoint HTTP trạng thái trên 127.0.0.1.
+    Trả về trạng thái cuối cùng, 'error' khác None khi không khởi động được (lỗi cấu hình...).
     """
-    # Chuyển đổi thời gian attack/release thành số mẫu
-    attack_samples = int(attack * sr)
-    release_samples = int(release * sr)
-    
-    # Chuyển đổi threshold từ dB sang linear
-    threshold_linear = 10 ** (threshold / 20.0)
-    
-    if data.ndim > 1:
-        # Stereo
-        result = np.zeros_like(data)
-        for ch in range(data.shape[0]):
-            result[ch] = apply_limiter_mono(data[ch], threshold_linear, ratio, attack_samples, release_samples)
-        return result
-    else:
-        # Mono
-        return apply_limiter_mono(data, threshold_linear, ratio, attack_samples, release_samples)
+    if log_func is None:
+        log_func = lambda msg: None
+    error = _check_run_options(algorithm, dtype, subtype)
+    missing = [folder for folder in input_folders if not os.path.isdir(folder)]
+    if error is None and missing:
+        error = f"Không tìm thấy folder: {', '.join(missing)}"
+    if error is not None:
+        log_func(f"❌ Lỗi: {error}")
+        return {'error': error}
+    service = IngestService(input_folders, output_dir, csv_path, log_func, algorithm, workers, streaming, dtype, subtype,
+                            fast_path, poll_seconds, settle_seconds, control)
+    server = None
+    try:
+        if status_port is not None:
+            server = serve_service_status(service, status_port)
+            log_func(f"📡 Trạng thái: http://127.0.0.1:{server.server_address[1]}/status")
+        status = service.run()
+    except Exception as e:
+        log_func(f"❌ Lỗi: Không thể chạy dịch vụ.\n{e}")
+        return {'error': f"Không thể chạy dịch vụ: {e}"}
+    finally:
+        if server is not None:
+            server.shutdown()
+    return dict(status, error=None)
 
-def apply_limiter_mono(data: NDArray, threshold: float, ratio: float, attack_samples: int, release_samples: int) -> NDArray:
+# ==============================================================================
+# RENDER NHIỀU BIẾN THỂ TỪ MỘT LẦN GIẢI MÃ (SO SÁNH A/B)
+# ==============================================================================
+VARIANT_REPORT_NAME = 'soundfix_variants.csv'
+VARIANT_REPORT_FIELDS = ['file', 'variant', 'algorithm', 'category', 'status', 'output', 'rms_db', 'peak_db',
+                         'rms_delta_db', 'peak_delta_db', 'rms_vs_base_db', 'peak_vs_base_db', 'lufs', 'true_peak_db',
+                         'loudness_gain_db', 'message']
+
+def build_variants(algorithms: List[str], csv_paths: List[str]) -> List[Dict[str, Any]]:
     """
-    Áp dụng limiter cho mono channel
+    Mọi tổ hợp thuật toán × file preset CSV: [{'name', 'algorithm', 'csv', 'presets', 'bank'}].
+    'name' là tên thư mục con của biến thể: tên thuật toán và / hoặc tên file CSV
+    (chỉ phần thay đổi giữa các biến thể). Lỗi thuật toán / CSV ném ValueError.
     """
-    # Đảm bảo data là numpy array
-    data = np.asarray(data)
-    
-    # Tính RMS của tín hiệu
-    frame_size = 512
-    hop_size = 256
-    rms = librosa.feature.rms(y=data, frame_length=frame_size, hop_length=hop_size)[0]
-    
-    # Tính gain reduction
-    gain_reduction = np.ones_like(rms)
-    for i, rms_val in enumerate(rms):
-        if rms_val > threshold:
-            # Tính gain reduction dựa trên ratio
-            excess = rms_val - threshold
-            reduction = excess * (1 - 1/ratio)
-            gain_reduction[i] = (rms_val - reduction) / rms_val
-    
-    # Smooth gain reduction với attack/release
-    smoothed_gain = np.ones_like(gain_reduction)
-    for i in range(1, len(gain_reduction)):
-        if gain_reduction[i] < smoothed_gain[i-1]:
-            # Attack phase
-            alpha = 1.0 / attack_samples
-        else:
-            # Release phase
-            alpha = 1.0 / release_samples
-        
-        smoothed_gain[i] = smoothed_gain[i-1] + alpha * (gain_reduction[i] - smoothed_gain[i-1])
-    
-    # Áp dụng gain reduction
-    gain_signal = np.repeat(smoothed_gain, hop_size)
-    proc_len = min(len(data), len(gain_signal))
-    
-    # Đảm bảo kết quả có cùng độ dài với input
-    result = np.zeros_like(data)
-    result[:proc_len] = data[:proc_len] * gain_signal[:proc_len]
-    
-    return result
+    for algorithm in algorithms:
+        if algorithm not in engine_functions:
+            raise ValueError(f"Không tìm thấy engine: {algorithm}")
+    preset_files = []
+    for csv_path in csv_paths:
+        try:
+            bank = compile_preset_bank(csv_path)
+            for algorithm in algorithms:
+                bank.ensure_designs(algorithm)
+        except Exception as e:
+            raise ValueError(f"Không thể tải file cấu hình {csv_path}: {e}") from e
+        preset_files.append((csv_path, bank))
+    variants, names = [], set()
+    for algorithm in algorithms:
+        for csv_path, bank in preset_files:
+            parts = []
+            if len(algorithms) > 1 or len(csv_paths) == 1:
+                parts.append(algorithm.replace(' ', '_'))
+            if len(csv_paths) > 1:
+                parts.append(Path(csv_path).stem)
+            name = base = '__'.join(parts)
+            k = 2
+            while name in names:
+                name, k = f"{base}_{k}", k + 1
+            names.add(name)
+            variants.append({'name': name, 'algorithm': algorithm, 'csv': csv_path, 'presets': bank.presets, 'bank': bank})
+    return variants
 
-def hybrid_brickwall_filter(data: NDArray, sr: int, **preset) -> NDArray:
-    y_pass = butter_filter(data.copy(), preset['lowcut'], preset['highcut'], sr, order=24, btype='band')
-    y_stop = data - y_pass
-    reduction_gain = 10 ** (preset['attenuation_db'] / 20.0)
-    return y_pass + (y_stop * reduction_gain)
+def _measure_levels(y: NDArray) -> Dict[str, float]:
+    meter = _LevelMeter()
+    meter.update(y)
+    return meter.levels()
 
-def dynamic_hybrid_filter(data: NDArray, sr: int, **preset) -> NDArray:
-    y_pass = butter_filter(data.copy(), preset['lowcut'], preset['highcut'], sr, order=32, btype='band')
-    y_stop = data - y_pass
-    threshold = 10 ** (preset['gate_threshold_db'] / 20.0)
-    frame_size, hop_size = 512, 256
-    
-    y_stop_gated = np.zeros_like(y_stop)
-    if data.ndim > 1:
-        for ch in range(data.shape[0]):
-            rms = librosa.feature.rms(y=y_stop[ch], frame_length=frame_size, hop_length=hop_size)[0]
-            gain = np.where(rms < threshold, preset['expansion_ratio'], 1.0)
-            smooth_gain = np.repeat(gain, hop_size)
-            proc_len = min(y_stop.shape[1], len(smooth_gain))
-            y_stop_gated[ch, :proc_len] = y_stop[ch, :proc_len] * smooth_gain[:proc_len]
-    else:
-        # Code cho mono
-        rms = librosa.feature.rms(y=y_stop, frame_length=frame_size, hop_length=hop_size)[0]
-        gain = np.where(rms < threshold, preset['expansion_ratio'], 1.0)
-        smooth_gain = np.repeat(gain, hop_size)
-        proc_len = min(len(y_stop), len(smooth_gain))
-        y_stop_gated[:proc_len] = y_stop[:proc_len] * smooth_gain[:proc_len]
-        
-    reduction_gain = 10 ** (preset['attenuation_db'] / 20.0)
-    y_stop_final = y_stop_gated * reduction_gain
-    
-    # Xử lý kết quả cuối cùng một cách an toàn
-    if data.ndim > 1:
-        final_len = min(y_pass.shape[1], y_stop_final.shape[1])
-        result = np.zeros_like(y_pass)
-        result[:, :final_len] = y_pass[:, :final_len] + y_stop_final[:, :final_len]
+def render_file_variants(audio_path: str, output_dir: str, variants: List[Dict[str, Any]], streaming: Optional[bool] = None,
+                         dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None, threads: int = 1,
+                         source_roots: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Giải mã file một lần rồi render mọi biến thể (mỗi biến thể cần 'matcher' đã dựng từ 'presets')
+    vào output_dir/<tên biến thể>/ (giữ thư mục con của file trong source_roots). Với file trong bộ nhớ các biến thể chạy song song trên
+    threads thread cùng đọc một buffer; file streaming đưa mỗi block qua engine của mọi biến thể.
+    Trả về {'file', 'status', 'message', 'source' (RMS / peak nguồn), 'variants'}, 'variants' là
+    một dòng cho mỗi biến thể theo VARIANT_REPORT_FIELDS; thêm 'duration' khi có biến thể thành công.
+    """
+    import soundfile as sf
+    file_name = os.path.basename(audio_path)
+    output_name = output_name_for(audio_path, source_roots)
+    rows, targets = [], []
+    for variant in variants:
+        preset = variant['matcher'](file_name)
+        row = {'file': audio_path, 'variant': variant['name'], 'algorithm': variant['algorithm'],
+               'category': preset['category_name'] if preset is not None else None,
+               'status': 'skipped' if preset is None else 'error', 'output': None, 'message': None}
+        rows.append(row)
+        if preset is not None:
+            targets.append((row, output_path_for(Path(output_dir) / variant['name'], output_name), variant['algorithm'], preset))
+    result: Dict[str, Any] = {'file': audio_path, 'status': 'skipped', 'source': None, 'variants': rows,
+                              'message': f"🟡 Bỏ qua: {file_name} (Không khớp quy tắc)"}
+    if not targets:
         return result
+    outcomes: List[Tuple[Optional[Exception], Optional[Dict[str, float]], Optional[Dict[str, Any]]]]
+    try:
+        if should_stream(audio_path) if streaming is None else streaming:
+            run = process_audio_stream_targets(audio_path, [target[1:] for target in targets], dtype=dtype, subtype=subtype, levels=True)
+            outcomes = list(zip(run['errors'], run['levels'], run['loudness']))
+            frames, sr, result['source'] = run['frames'], run['sr'], run['source_levels']
+        else:
+            y, sr, source_subtype = read_audio(audio_path, dtype)
+            frames = y.shape[-1]
+            result['source'] = _measure_levels(y)
+
+            def render(target) -> Tuple[Optional[Exception], Optional[Dict[str, float]], Optional[Dict[str, Any]]]:
+                _, output_path, algorithm, preset = target
+                try:
+                    y_eq = engine_functions[algorithm](y, sr=sr, **preset)
+                    gain_db, loudness = preset['volume'], None
+                    if normalizes_loudness(preset):
+                        gain_db, loudness = loudness_normalization(preset, measure_loudness(y_eq, sr, 'true_peak_db' in preset))
+                    y_processed = to_output_layout(y_eq, 10 ** (gain_db / 20.0))
+                    if np.any(np.isnan(y_processed)):
+                        raise ValueError("Dữ liệu lỗi (NaN)")
+                    sf.write(output_path, y_processed, sr, subtype=subtype or source_subtype)
+                    return None, _measure_levels(y_processed), loudness
+                except Exception as e:
+                    Path(output_path).unlink(missing_ok=True)
+                    return e, None, None
+
+            if threads > 1 and len(targets) > 1:
+                # Các engine không sửa tín hiệu vào nên mọi thread dùng chung y
+                with ThreadPoolExecutor(max_workers=min(threads, len(targets))) as pool:
+                    outcomes = list(pool.map(render, targets))
+            else:
+                outcomes = [render(target) for target in targets]
+    except Exception as e:
+        outcomes = [(e, None, None)] * len(targets)
+        frames, sr = 0, 1
+    source, base = result['source'], None
+    failures = []
+    for (row, output_path, _, _), (error, levels, loudness) in zip(targets, outcomes):
+        if error is not None:
+            row['message'] = str(error)
+            failures.append(f"{row['variant']}: {error}")
+            continue
+        row.update(status='success', output=Path(row['variant'], output_name).as_posix(), **levels)
+        if loudness is not None:
+            row.update(lufs=loudness['lufs'], true_peak_db=loudness['true_peak_db'], loudness_gain_db=loudness['gain_db'])
+        row.update(rms_delta_db=levels['rms_db'] - source['rms_db'], peak_delta_db=levels['peak_db'] - source['peak_db'])
+    # Biến thể đầu tiên là mốc so sánh của các biến thể khác
+    if rows[0]['status'] == 'success':
+        base = rows[0]
+        for row in rows:
+            if row['status'] == 'success':
+                row.update(rms_vs_base_db=row['rms_db'] - base['rms_db'], peak_vs_base_db=row['peak_db'] - base['peak_db'])
+    succeeded = len(targets) - len(failures)
+    categories = ', '.join(sorted({row['category'] for row in rows if row['category']}))
+    if succeeded:
+        result['duration'] = frames / sr
+    if failures:
+        result.update(status='error', message=f"❌ Lỗi xử lý '{file_name}' ({succeeded}/{len(targets)} biến thể): {'; '.join(failures)}")
     else:
-        final_len = min(len(y_pass), len(y_stop_final))
-        result = np.zeros_like(y_pass)
-        result[:final_len] = y_pass[:final_len] + y_stop_final[:final_len]
-        return result
+        result.update(status='success', message=f"✅ {file_name} → {succeeded} biến thể ({categories})")
+    return result
 
-def process_audio_file(audio_path: str, output_dir: str, algorithm: str, preset: Optional[Dict[str, Any]]) -> str:
-    file_name = os.path.basename(audio_path)
-    if preset is None: 
-        return f"🟡 Bỏ qua: {file_name} (Không khớp quy tắc)"
+def _init_variant_worker(variants: List[Dict[str, Any]], output_dir: str, streaming: Optional[bool] = None,
+                         dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None, threads: int = 1,
+                         source_roots: Sequence[str] = ()) -> None:
+    for variant in variants:
+        variant['bank'].install()
+    _WORKER_CONTEXT.update(variants=[dict(variant, presets=variant['bank'].presets, matcher=variant['bank'].matcher) for variant in variants],
+                           output_dir=output_dir, streaming=streaming, dtype=dtype, subtype=subtype, threads=threads,
+                           source_roots=source_roots)
+    for variant in variants:
+        warm_filter_cache(variant['presets'], variant['algorithm'])
+    if any(variant['algorithm'] == 'Multiband Limiting' for variant in variants):
+        warm_gain_smoother()
+
+def _render_variant_chunk(file_paths: List[str]) -> List[Dict[str, Any]]:
+    ctx = _WORKER_CONTEXT
+    results = []
+    for file_path in file_paths:
+        result = render_file_variants(file_path, ctx['output_dir'], ctx['variants'], ctx['streaming'], ctx['dtype'], ctx['subtype'], ctx['threads'],
+                                      ctx['source_roots'])
+        result.update(pid=os.getpid(), filter_cache=filter_cache_info())
+        results.append(result)
+    return results
+
+def _round_db(value: Any) -> Any:
+    return round(value, 2) + 0.0 if isinstance(value, float) else value
+
+def write_variant_report(output_dir: Union[str, Path], files: List[Dict[str, Any]]) -> Path:
+    """Ghi soundfix_variants.csv: mỗi dòng một file × biến thể, mức dB so với nguồn và với biến thể đầu."""
+    report_path = Path(output_dir) / VARIANT_REPORT_NAME
+    with open(report_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=VARIANT_REPORT_FIELDS)
+        writer.writeheader()
+        for result in files:
+            for row in result['variants']:
+                writer.writerow({key: _round_db(row.get(key)) for key in VARIANT_REPORT_FIELDS})
+    return report_path
+
+def summarize_variants(variants: List[Dict[str, Any]], files: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """{tên biến thể: {'algorithm', 'csv', số file theo status, trung bình các cột delta (dB)}}."""
+    summary = {}
+    for variant in variants:
+        rows = [row for result in files for row in result['variants'] if row['variant'] == variant['name']]
+        agg: Dict[str, Any] = {'algorithm': variant['algorithm'], 'csv': variant['csv']}
+        for status in ('success', 'skipped', 'error'):
+            agg[status] = sum(row['status'] == status for row in rows)
+        for key in ('rms_delta_db', 'peak_delta_db', 'rms_vs_base_db', 'peak_vs_base_db'):
+            values = [row[key] for row in rows if row.get(key) is not None]
+            agg[key] = sum(values) / len(values) if values else None
+        summary[variant['name']] = agg
+    return summary
+
+def render_variants(folder_path: str, dest_folder: str, algorithms: List[str], csv_paths: List[str],
+                    log_func: Optional[Callable[[str], None]], workers: Optional[int] = None, streaming: Optional[bool] = None,
+                    shard: Optional[Tuple[int, int]] = None, dtype: str = DEFAULT_DTYPE, subtype: Optional[str] = None,
+                    control: Optional[BatchControl] = None) -> Dict[str, Any]:
+    """
+    Render mọi tổ hợp thuật toán × file preset CSV (xem build_variants) cho cả folder, mỗi file
+    chỉ giải mã một lần. Output của mỗi biến thể nằm trong một thư mục con của cùng một thư mục
+    output, kèm báo cáo soundfix_variants.csv (RMS / peak từng biến thể, chênh lệch so với nguồn
+    và với biến thể đầu tiên).
+    workers, streaming, shard, dtype, subtype, control như batch_process: file được gửi cho worker
+    ngay khi quét thấy, khi hủy các file chưa bắt đầu bị bỏ và báo cáo chỉ có các file đã render.
+    Khi số file ít hơn số nhân CPU, các biến thể của một file chạy song song trên nhiều thread.
+
+    Trả về {'output_dir', 'counts', 'files', 'variants', 'report', 'filter_cache', 'cancelled', 'error'}: 'files' là
+    kết quả từng file (xem render_file_variants), 'variants' là tổng hợp theo biến thể (xem summarize_variants),
+    'cancelled' là số file đã tìm thấy nhưng bị bỏ do hủy (None nếu không hủy).
+    """
+    if log_func is None:
+        log_func = lambda msg: None
+    counts = {'success': 0, 'skipped': 0, 'error': 0}
+    summary: Dict[str, Any] = {'output_dir': None, 'counts': counts, 'files': [], 'variants': None, 'report': None,
+                               'filter_cache': None, 'cancelled': None, 'error': None}
     try:
-        print(f"🎵 Xử lý {file_name} với '{preset['category_name']}' bằng '{algorithm}'")
-        y, sr = librosa.load(audio_path, sr=None, mono=False)
-        if y.ndim == 1: 
-            y = y[np.newaxis, :]
-        
-        # Định nghĩa engine functions
-        engine_functions = {
-            'Butterworth Filter': lambda d, s, p: butter_filter(d, p['lowcut'], p['highcut'], s),
-            'Hybrid Brickwall': hybrid_brickwall_filter,
-            'Dynamic Hybrid Brickwall': dynamic_hybrid_filter,
-            'Multiband Limiting': multiband_limiting_filter
-        }
-        
-        engine = engine_functions.get(algorithm)
-        if engine is None:
-            return f"❌ Không tìm thấy engine: {algorithm}"
-            
-        y_eq = engine(y, sr=sr, **preset)
-        y_processed = y_eq * (10 ** (preset['volume'] / 20.0))
-        if np.any(np.isnan(y_processed)): 
-            return f"❌ Dữ liệu lỗi cho file: {file_name}"
-        output_name = f"processed_{os.path.splitext(file_name)[0]}{os.path.splitext(audio_path)[1]}"
-        sf.write(Path(output_dir) / output_name, y_processed.T.astype(np.float32), sr)
-        return f"✅ {file_name} → {output_name} ({preset['category_name']})"
-    except Exception as e: 
-        return f"❌ Lỗi xử lý '{file_name}': {e}"
+        if dtype not in PROCESSING_DTYPES:
+            raise ValueError(f"Kiểu dữ liệu không hợp lệ: {dtype} (chọn {', '.join(PROCESSING_DTYPES)})")
+        if subtype is not None:
+            import soundfile as sf
+            if subtype not in sf.available_subtypes():
+                raise ValueError(f"Subtype không hợp lệ: {subtype}")
+        if not os.path.isdir(folder_path):
+            raise ValueError(f"Không tìm thấy folder: {folder_path}")
+        variants = build_variants(algorithms, csv_paths)
+        if not variants:
+            raise ValueError("Cần ít nhất một thuật toán và một file cấu hình")
+    except ValueError as e:
+        summary['error'] = str(e)
+        log_func(f"❌ Lỗi: {summary['error']}")
+        return summary
+    log_func(f"🔀 {len(variants)} biến thể: {', '.join(variant['name'] for variant in variants)}")
+
+    def stopped() -> bool:
+        return control is not None and control.cancelled
 
-def batch_process(folder_path: str, dest_folder: str, csv_path: str, log_func, algorithm: str) -> None:
+    scanner = scan_audio_files(folder_path, control)
+    audio_files: Iterator[str] = scanner
+    suffix = ''
+    if shard is not None:
+        index, count = shard
+        audio_files = (f for i, f in enumerate(scanner) if i % count == index)
+        suffix = f"_shard{index + 1}of{count}"
+    requested = workers or default_worker_count()
+    executor = None
     try:
-        presets = load_presets_from_csv(csv_path)
-        log_func(f"Tải thành công {len(presets)} quy tắc từ {os.path.basename(csv_path)}")
-    except Exception as e:
-        log_func(f"❌ Lỗi: Không thể tải file cấu hình.\n{e}")
-        return
-    audio_files = [os.path.join(r, f) for r, _, fs in os.walk(folder_path) for f in fs if f.lower().endswith(('.wav', '.mp3', '.flac', '.ogg'))]
-    if not audio_files: 
-        log_func("Không tìm thấy file âm thanh.")
-        return
-    output_dir = Path(dest_folder) / f"SoundFix_{Path(folder_path).name}_{datetime.datetime.now():%Y%m%d_%H%M%S}"
-    output_dir.mkdir(parents=True, exist_ok=True)
-    log_func(f"Bắt đầu xử lý {len(audio_files)} file...\nThư mục output: {output_dir}")
-    counts = {'success': 0, 'skipped': 0, 'error': 0}
-    for i, file_path in enumerate(audio_files):
-        preset = get_preset_for_file(os.path.basename(file_path), presets)
-        msg = process_audio_file(file_path, output_dir, algorithm, preset)
-        log_func(f"[{i+1}/{len(audio_files)}] {msg}")
-        if "✅" in msg: 
-            counts['success'] += 1
-        elif "🟡" in msg: 
-            counts['skipped'] += 1
-        else: 
-            counts['error'] += 1
+        # Quét trước tối đa requested file: thư viện nhỏ hơn số worker thì dùng ít worker hơn
+        head = list(itertools.islice(audio_files, requested))
+        if not head:
+            log_func("⛔ Đã hủy." if stopped() else "Không tìm thấy file âm thanh.")
+            return summary
+        output_dir = Path(dest_folder) / f"SoundFix_{Path(folder_path).name}_{datetime.datetime.now():%Y%m%d_%H%M%S}_variants{suffix}"
+        for variant in variants:
+            (output_dir / variant['name']).mkdir(parents=True, exist_ok=True)
+        summary['output_dir'] = str(output_dir)
+
+        workers = max(1, min(requested, len(head)))
+        # Nhân CPU còn dư khi có ít file hơn worker được dùng cho các biến thể của từng file
+        threads = max(1, min(len(variants), requested // workers))
+        log_func(f"Bắt đầu render {len(variants)} biến thể với {workers} worker, {threads} thread mỗi file...\nThư mục output: {output_dir}")
+        worker_args = (variants, str(output_dir), streaming, dtype, subtype, threads, (folder_path,))
+        dispatcher = None
+        if workers == 1:
+            _init_variant_worker(*worker_args)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=_init_variant_worker, initargs=worker_args)
+            dispatcher = _PoolDispatcher(executor, workers, _render_variant_chunk)
+        cache_stats: Dict[int, Dict[str, int]] = {}
+        found = done = 0
+        scanning = True
+
+        def record(result: Dict[str, Any]) -> None:
+            nonlocal done
+            done += 1
+            cache_stats[result.pop('pid')] = result.pop('filter_cache')
+            log_func(f"[{done}/{found}{'+' if scanning else ''}] {result['message']}")
+            counts[result['status']] += 1
+            summary['files'].append(result)
+
+        def emit(timeout: Optional[float]) -> None:
+            if dispatcher is not None:
+                dispatcher.collect(timeout)
+                while dispatcher.ready:
+                    record(dispatcher.ready.popleft())
+
+        def hold() -> None:
+            # Tạm dừng: không gửi thêm file, các file worker đã nhận vẫn chạy xong và được log
+            _hold(control, log_func, lambda: emit(0))
+
+        for file_path in itertools.chain(head, audio_files):
+            hold()
+            if stopped():
+                break
+            found += 1
+            if dispatcher is None:
+                record(_render_variant_chunk([file_path])[0])
+                continue
+            dispatcher.submit({'file': file_path})
+            while dispatcher.busy() and not stopped():
+                hold()
+                emit(0.2)
+            emit(0)
+        scanning = False
+        if shard is not None and not stopped():
+            log_func(f"🧩 Shard {shard[0] + 1}/{shard[1]}: {found} file")
+        if dispatcher is not None:
+            if not stopped():
+                dispatcher.flush()
+            while dispatcher.in_flight and not stopped():
+                hold()
+                emit(0.2)
+        if stopped():
+            # Hủy: bỏ các file chưa bắt đầu, các file đang chạy được làm xong và vẫn có trong kết quả
+            summary['cancelled'] = len(dispatcher.cancel()) if dispatcher is not None else 0
+            log_func(f"⛔ Đã hủy: ngừng sau {found} file, {summary['cancelled']} file chưa xử lý bị bỏ qua")
+            while dispatcher is not None and dispatcher.in_flight:
+                emit(None)
+    finally:
+        scanner.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    summary['filter_cache'] = {'hits': sum(c['hits'] for c in cache_stats.values()),
+                               'misses': sum(c['misses'] for c in cache_stats.values()), 'processes': len(cache_stats)}
+    summary['variants'] = summarize_variants(variants, summary['files'])
+    summary['report'] = str(write_variant_report(output_dir, summary['files']))
     log_func(f"\n📊 Thống kê:\n✅ Thành công: {counts['success']} file\n🟡 Bỏ qua: {counts['skipped']} file\n❌ Lỗi: {counts['error']} file")
-    messagebox.showinfo("Xong!", f"Đã xử lý xong!\n✅ Thành công: {counts['success']}\n🟡 Bỏ qua: {counts['skipped']}\n❌ Lỗi: {counts['error']}\n📁 Output: {output_dir}")
+    log_func(f"🎚️ So sánh (trung bình, dB so với nguồn | so với {variants[0]['name']}):")
+    for name, agg in summary['variants'].items():
+        deltas = " | ".join(
+            f"RMS {agg[rms]:+.2f}, peak {agg[peak]:+.2f}" if agg[rms] is not None else "-"
+            for rms, peak in (('rms_delta_db', 'peak_delta_db'), ('rms_vs_base_db', 'peak_vs_base_db')))
+        log_func(f"   {name}: {agg['success']} file, {deltas}")
+    log_func(f"📄 Báo cáo so sánh: {summary['report']}")
+    return summary
+
+# ==============================================================================
+# NGHE THỬ (PREVIEW)
+# ==============================================================================
+# Số file đã giải mã / phân tích và số bản render giữ trong cache nghe thử
+PREVIEW_CACHE_SIZE = 8
+PREVIEW_RENDER_CACHE_SIZE = 32
+# Block render của bản nghe thử: phát được ngay khi block đầu tiên xong
+PREVIEW_BLOCK_SIZE = 4096
+# Số cột min/max của dạng sóng và kích thước khung STFT của phân tích
+PREVIEW_WAVEFORM_POINTS = 1024
+PREVIEW_FFT_SIZE = 2048
+# Giao diện: chờ thanh trượt đứng yên chừng này ms rồi mới render, khoảng dB của đồ thị phổ
+PREVIEW_DEBOUNCE_MS = 30
+PREVIEW_SPECTRUM_RANGE_DB = 100.0
+# Mục chọn preset theo tên file trong giao diện nghe thử
+PREVIEW_AUTO = "(Theo tên file)"
+# Tham số không ảnh hưởng output của engine (volume / gain chuẩn hóa được nhân sau engine)
+_PREVIEW_NON_ENGINE_KEYS = ('priority', 'keywords', 'category_name', 'volume') + LOUDNESS_COLUMNS
+
+def _preview_file_key(audio_path: str) -> Tuple[str, int, int]:
+    # File bị sửa (mtime / kích thước khác) thì được đọc lại
+    stat = os.stat(audio_path)
+    return os.path.abspath(audio_path), stat.st_mtime_ns, stat.st_size
+
+@lru_cache(maxsize=PREVIEW_CACHE_SIZE)
+def _preview_source(key: Tuple[str, int, int], dtype: str) -> Tuple[NDArray, int]:
+    data, sr, _ = read_audio(key[0], dtype)
+    data = np.atleast_2d(data)
+    data.setflags(write=False)
+    return data, sr
+
+def load_preview_source(audio_path: str, dtype: str = DEFAULT_DTYPE) -> Tuple[NDArray, int]:
+    """Audio đã giải mã dạng (C, n) và sample rate, có cache; mảng chỉ đọc, dùng chung giữa các lần gọi."""
+    return _preview_source(_preview_file_key(audio_path), dtype)
+
+def analyze_preview(data: NDArray, sr: int, points: int = PREVIEW_WAVEFORM_POINTS, fft_size: int = PREVIEW_FFT_SIZE) -> Dict[str, Any]:
+    """
+    Phân tích để vẽ tín hiệu (C, n), gộp mọi kênh: 'waveform' (2, m) là min / max của m <= points
+    cột, 'rms_db' là RMS của từng khung fft_size / 2 mẫu, 'freqs' và 'spectrum_db' là phổ công suất
+    trung bình (STFT cửa sổ Hann, chồng 50%, dBFS), 'rms_db_total' và 'peak_db' của cả tín hiệu.
+    """
+    from scipy.fft import rfft
+    n, hop = data.shape[-1], fft_size // 2
+    meter = _LevelMeter()
+    meter.update(data)
+    levels = meter.levels()
+    if n == 0:
+        return {'waveform': np.zeros((2, 0)), 'rms_db': np.zeros(0), 'freqs': np.fft.rfftfreq(fft_size, 1.0 / sr),
+                'spectrum_db': np.full(fft_size // 2 + 1, -200.0), 'rms_db_total': levels['rms_db'], 'peak_db': levels['peak_db']}
+    edges = np.linspace(0, n, min(points, n) + 1).astype(np.intp)[:-1]
+    waveform = np.stack([np.minimum.reduceat(data.min(axis=0), edges), np.maximum.reduceat(data.max(axis=0), edges)])
+    n_frames = 1 if n <= fft_size else -(-(n - fft_size) // hop) + 1
+    padded = np.zeros((data.shape[0], (n_frames - 1) * hop + fft_size), dtype=data.dtype)
+    padded[:, :n] = data
+    squares = np.square(padded[:, :n_frames * hop], dtype=np.float64).reshape(data.shape[0], n_frames, hop)
+    rms_db = 10 * np.log10(np.maximum(squares.mean(axis=(0, 2)), 1e-20))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, fft_size, axis=-1)[:, ::hop]
+    window = np.hanning(fft_size).astype(data.dtype)
+    power = np.zeros(fft_size // 2 + 1)
+    for start in range(0, n_frames, FAST_PATH_BATCH):
+        spectrum = rfft(frames[:, start:start + FAST_PATH_BATCH] * window, axis=-1)
+        power += (np.square(spectrum.real, dtype=np.float64) + np.square(spectrum.imag, dtype=np.float64)).sum(axis=(0, 1))
+    # Chuẩn hóa để sine biên độ 1 cho đỉnh phổ ~0 dB
+    power /= data.shape[0] * n_frames * (window.sum(dtype=np.float64) / 2) ** 2
+    return {'waveform': waveform, 'rms_db': rms_db, 'freqs': np.fft.rfftfreq(fft_size, 1.0 / sr),
+            'spectrum_db': 10 * np.log10(np.maximum(power, 1e-20)), 'rms_db_total': levels['rms_db'], 'peak_db': levels['peak_db']}
+
+@lru_cache(maxsize=PREVIEW_CACHE_SIZE)
+def _preview_source_analysis(key: Tuple[str, int, int], dtype: str) -> Dict[str, Any]:
+    return analyze_preview(*_preview_source(key, dtype))
+
+def _scale_analysis(analysis: Dict[str, Any], volume_db: float) -> Dict[str, Any]:
+    """Phân tích của tín hiệu sau khi nhân volume: các mức dB chỉ dịch đi volume_db."""
+    scaled = dict(analysis, waveform=analysis['waveform'] * 10 ** (volume_db / 20.0))
+    for name in ('rms_db', 'spectrum_db', 'rms_db_total', 'peak_db'):
+        scaled[name] = analysis[name] + volume_db
+    return scaled
+
+class _PreviewRenderCache:
+    """LRU (thread-safe) của output engine (trước volume) và phân tích của nó."""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.items: Dict[Tuple, Tuple[NDArray, Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[Tuple[NDArray, Dict[str, Any]]]:
+        with self.lock:
+            item = self.items.pop(key, None)
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.items[key] = item
+            return item
+
+    def put(self, key: Tuple, item: Tuple[NDArray, Dict[str, Any]]) -> None:
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = item
+            while len(self.items) > self.maxsize:
+                del self.items[next(iter(self.items))]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+            self.hits = self.misses = 0
+
+_PREVIEW_RENDERS = _PreviewRenderCache(PREVIEW_RENDER_CACHE_SIZE)
+
+def preview_cache_info() -> Dict[str, Dict[str, int]]:
+    """Thống kê cache nghe thử: giải mã, phân tích file nguồn và bản render của engine."""
+    infos = {'decode': _preview_source.cache_info(), 'analysis': _preview_source_analysis.cache_info()}
+    stats = {name: {'hits': i.hits, 'misses': i.misses, 'size': i.currsize} for name, i in infos.items()}
+    stats['render'] = {'hits': _PREVIEW_RENDERS.hits, 'misses': _PREVIEW_RENDERS.misses, 'size': len(_PREVIEW_RENDERS.items)}
+    return stats
+
+def clear_preview_cache() -> None:
+    _preview_source.cache_clear()
+    _preview_source_analysis.cache_clear()
+    _PREVIEW_RENDERS.clear()
+
+def render_preview(audio_path: str, algorithm: str, preset: Dict[str, Any], dtype: str = DEFAULT_DTYPE,
+                   on_block: Optional[Callable[[NDArray], None]] = None, block_size: int = PREVIEW_BLOCK_SIZE) -> Dict[str, Any]:
+    """
+    Bản nghe thử của một file: output giống process_file (engine streaming theo block, rồi volume
+    hoặc gain chuẩn hóa loudness).
+    Mỗi bước có cache riêng nên đổi một tham số chỉ làm lại phần phụ thuộc vào nó: giải mã và
+    phân tích nguồn theo file (mtime, kích thước); output engine, phân tích và số đo loudness
+    của nó theo (file, algorithm, tham số engine của preset), đổi volume / target_lufs /
+    true_peak_db chỉ nhân lại gain; thiết kế bộ lọc theo cache bộ lọc của process.
+    on_block(block (n, C)) được gọi lần lượt với từng block vừa render để phát ngay (cả bản
+    khi lấy từ cache); với preset chuẩn hóa, gain chỉ biết khi render xong nên cả bản được
+    đưa vào on_block một lần ở cuối.
+    Trả về {'output' (n, C), 'sr', 'source' (C, n), 'analysis', 'source_analysis', 'loudness'
+    (như loudness_normalization, cả khi preset không chuẩn hóa), 'cached' (các bước lấy từ
+    cache: 'decode', 'analysis', 'render'), 'seconds'}.
+    """
+    t0 = time.perf_counter()
+    key = _preview_file_key(audio_path)
+    cached = []
+    hits = _preview_source.cache_info().hits
+    data, sr = _preview_source(key, dtype)
+    if _preview_source.cache_info().hits > hits:
+        cached.append('decode')
+    hits = _preview_source_analysis.cache_info().hits
+    source_analysis = _preview_source_analysis(key, dtype)
+    if _preview_source_analysis.cache_info().hits > hits:
+        cached.append('analysis')
+    params = {k: v for k, v in preset.items() if k not in _PREVIEW_NON_ENGINE_KEYS}
+    render_key = (key, dtype, algorithm, json.dumps(params, sort_keys=True))
+    volume_gain = 10 ** (preset['volume'] / 20.0)
+    deferred = normalizes_loudness(preset)
+    item = _PREVIEW_RENDERS.get(render_key)
+    if item is None:
+        engine = stream_engine_classes[algorithm](data.shape[0], sr, preset, dtype)
+        meter = LoudnessMeter(data.shape[0], sr)
+        pieces = []
+        blocks = (data[:, start:start + block_size] for start in range(0, data.shape[-1], block_size))
+        for block in itertools.chain(blocks, [None]):
+            piece = engine.process(block) if block is not None else engine.flush()
+            if np.any(np.isnan(piece)):
+                raise ValueError("Dữ liệu lỗi (NaN)")
+            pieces.append(piece)
+            meter.update(piece)
+            if on_block is not None and piece.shape[-1] and not deferred:
+                on_block(to_output_layout(piece, volume_gain))
+        engine_output = np.concatenate(pieces, axis=-1) if len(pieces) > 1 else pieces[0].copy()
+        engine_output.setflags(write=False)
+        item = (engine_output, analyze_preview(engine_output, sr), meter.measurement())
+        _PREVIEW_RENDERS.put(render_key, item)
+    else:
+        cached.append('render')
+    engine_output, analysis, measured = item
+    gain_db, loudness = loudness_normalization(preset, measured)
+    output = to_output_layout(engine_output, 10 ** (gain_db / 20.0))
+    if ('render' in cached or deferred) and on_block is not None:
+        on_block(output)
+    return {'output': output, 'sr': sr, 'source': data, 'analysis': _scale_analysis(analysis, gain_db),
+            'source_analysis': source_analysis, 'loudness': loudness, 'cached': cached, 'seconds': time.perf_counter() - t0}
+
+def _load_sounddevice() -> Any:
+    """sounddevice là tùy chọn (chỉ để nghe thử): trả về module hoặc None nếu không có."""
+    try:
+        import sounddevice
+    except Exception:
+        return None
+    return sounddevice
+
+class PreviewPlayer:
+    """
+    Phát audio (n, C) qua sounddevice theo từng block được đưa vào bằng feed(), nên bản
+    nghe thử bắt đầu phát trước khi render xong. end() báo hết dữ liệu, stop() dừng ngay.
+    """
+    def __init__(self, sd, sr: int, channels: int):
+        self.sd = sd
+        self.blocks: queue.Queue = queue.Queue()
+        self.current: Optional[NDArray] = None
+        self.position = 0
+        self.stream = sd.OutputStream(samplerate=sr, channels=channels, dtype='float32', callback=self._callback)
+        self.stream.start()
+
+    def feed(self, block: NDArray) -> None:
+        self.blocks.put(np.asarray(block, dtype=np.float32))
+
+    def end(self) -> None:
+        self.blocks.put(None)
+
+    def _callback(self, outdata: NDArray, frames: int, time_info: Any, status: Any) -> None:
+        filled = 0
+        while filled < frames:
+            if self.current is None or self.position >= self.current.shape[0]:
+                try:
+                    block = self.blocks.get_nowait()
+                except queue.Empty:
+                    # Render chưa kịp: phát im lặng rồi chờ block kế tiếp
+                    outdata[filled:] = 0
+                    return
+                if block is None:
+                    outdata[filled:] = 0
+                    raise self.sd.CallbackStop
+                self.current, self.position = block, 0
+            count = min(frames - filled, self.current.shape[0] - self.position)
+            outdata[filled:filled + count] = self.current[self.position:self.position + count]
+            filled += count
+            self.position += count
+
+    def stop(self) -> None:
+        self.stream.abort()
+        self.stream.close()
 
 # ==============================================================================
 # GIAO DIỆN NGƯỜI DÙNG
 # ==============================================================================
+def _load_dnd() -> Tuple[Any, Any]:
+    """tkinterdnd2 là tùy chọn: trả về (DND_FILES, TkinterDnD) hoặc (None, None) nếu không có."""
+    try:
+        from tkinterdnd2 import DND_FILES, TkinterDnD
+    except Exception:
+        return None, None
+    return DND_FILES, TkinterDnD
+
 def run_app() -> None:
+    # Import giao diện tại đây để dùng thư viện / CLI không cần tkinter
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox, scrolledtext
+    DND_FILES, TkinterDnD = _load_dnd()
+    DND_SUPPORT = TkinterDnD is not None
     root = TkinterDnD.Tk() if DND_SUPPORT else tk.Tk()
     root.title("SoundFix Pro - Giao diện Tích hợp")
     root.geometry("850x700")
@@ -313,6 +4061,20 @@ def run_app() -> None:
     dest_var = tk.StringVar()
     csv_path_var = tk.StringVar()
     algorithm_var = tk.StringVar()
+    workers_var = tk.IntVar(value=default_worker_count())
+    streaming_var = tk.BooleanVar(value=False)
+    incremental_var = tk.BooleanVar(value=False)
+    profile_var = tk.BooleanVar(value=False)
+    float64_var = tk.BooleanVar(value=False)
+    split_var = tk.BooleanVar(value=False)
+    fast_path_var = tk.BooleanVar(value=False)
+    preview_file_var = tk.StringVar()
+    preview_category_var = tk.StringVar(value=PREVIEW_AUTO)
+    lowcut_var = tk.DoubleVar(value=200.0)
+    highcut_var = tk.DoubleVar(value=6000.0)
+    gate_var = tk.DoubleVar(value=-50.0)
+    volume_var = tk.DoubleVar(value=0.0)
+    preview_status_var = tk.StringVar()
 
     # --- Bố cục chính với PanedWindow ---
     main_paned_window = ttk.PanedWindow(root, orient=tk.VERTICAL)
@@ -345,14 +4107,35 @@ def run_app() -> None:
     entry3.grid(row=6, column=0, columnspan=2, sticky='ew')
     ttk.Button(controls_frame, text="Chọn...", command=lambda: select_csv_and_show(preview_container)).grid(row=6, column=2, padx=(5,0))
     
-    ttk.Button(controls_frame, text="Tạo file mẫu...", command=lambda: create_template_csv(preview_container)).grid(row=7, column=0, columnspan=3, sticky='e', pady=(2, 10))
+    ttk.Button(controls_frame, text="Xem phân loại (dry-run)", command=lambda: start_dry_run()).grid(row=7, column=0, columnspan=2, sticky='e', pady=(2, 10), padx=(0, 5))
+    ttk.Button(controls_frame, text="Tạo file mẫu...", command=lambda: create_template_csv(preview_container)).grid(row=7, column=2, sticky='e', pady=(2, 10))
     
     ttk.Label(controls_frame, text="4. Engine xử lý:", font=('Arial', 10, 'bold')).grid(row=8, column=0, sticky='w')
-    combo = ttk.Combobox(controls_frame, textvariable=algorithm_var, values=["Dynamic Hybrid Brickwall", "Hybrid Brickwall", "Butterworth Filter", "Multiband Limiting"], state="readonly")
+    combo = ttk.Combobox(controls_frame, textvariable=algorithm_var, values=["Dynamic Hybrid Brickwall", "Hybrid Brickwall", "Linear-Phase Brickwall", "Butterworth Filter", "Multiband Limiting"], state="readonly")
     combo.grid(row=9, column=0, columnspan=3, sticky='ew', pady=(2, 10))
+    combo.bind('<<ComboboxSelected>>', lambda e: schedule_preview())
     algorithm_var.set("Dynamic Hybrid Brickwall")
+
+    workers_frame = ttk.Frame(controls_frame)
+    workers_frame.grid(row=10, column=0, columnspan=3, sticky='w', pady=(0, 10))
+    ttk.Label(workers_frame, text="Số worker song song:").pack(side='left')
+    ttk.Spinbox(workers_frame, from_=1, to=max(64, default_worker_count()), textvariable=workers_var, width=5).pack(side='left', padx=(5, 0))
+    ttk.Checkbutton(workers_frame, text="Luôn xử lý streaming (file dài tự bật)", variable=streaming_var).pack(side='left', padx=(15, 0))
+    ttk.Checkbutton(workers_frame, text="Chỉ xử lý file thay đổi", variable=incremental_var).pack(side='left', padx=(15, 0))
+    ttk.Checkbutton(workers_frame, text="Đo thời gian từng bước", variable=profile_var).pack(side='left', padx=(15, 0))
+    ttk.Checkbutton(workers_frame, text="Xử lý float64", variable=float64_var).pack(side='left', padx=(15, 0))
+    ttk.Checkbutton(workers_frame, text="Chia kênh file lớn", variable=split_var).pack(side='left', padx=(15, 0))
+    ttk.Checkbutton(workers_frame, text="Bỏ qua file im lặng / đã sạch", variable=fast_path_var).pack(side='left', padx=(15, 0))
     
-    ttk.Button(controls_frame, text="5. BẮT ĐẦU XỬ LÝ", command=lambda: start_process(), padding=10).grid(row=10, column=0, columnspan=3, sticky='ew')
+    run_frame = ttk.Frame(controls_frame)
+    run_frame.grid(row=11, column=0, columnspan=3, sticky='ew')
+    run_frame.columnconfigure(0, weight=1)
+    start_button = ttk.Button(run_frame, text="5. BẮT ĐẦU XỬ LÝ", command=lambda: start_process(), padding=10)
+    start_button.grid(row=0, column=0, sticky='ew')
+    pause_button = ttk.Button(run_frame, text="Tạm dừng", command=lambda: toggle_pause(), padding=10, state='disabled')
+    pause_button.grid(row=0, column=1, padx=(5, 0))
+    stop_button = ttk.Button(run_frame, text="Dừng", command=lambda: stop_process(), padding=10, state='disabled')
+    stop_button.grid(row=0, column=2, padx=(5, 0))
     controls_frame.columnconfigure(0, weight=1)
 
     # --- TẠO NỘI DUNG CHO PANE DỮ LIỆU ---
@@ -362,6 +4145,46 @@ def run_app() -> None:
     preview_container = ttk.Frame(data_paned_window, padding=5)
     data_paned_window.add(preview_container, weight=1)
     
+    # --- Nghe thử: render một file với engine / tham số đang chọn, vẽ dạng sóng và phổ ---
+    listen_container = ttk.LabelFrame(data_paned_window, text="Nghe thử", padding=5)
+    data_paned_window.add(listen_container, weight=1)
+    listen_top = ttk.Frame(listen_container)
+    listen_top.pack(fill='x')
+    ttk.Label(listen_top, text="File:").pack(side='left')
+    preview_entry = ttk.Entry(listen_top, textvariable=preview_file_var)
+    preview_entry.pack(side='left', fill='x', expand=True, padx=(5, 0))
+    ttk.Button(listen_top, text="Chọn...", command=lambda: select_preview_file()).pack(side='left', padx=(5, 0))
+    preview_combo = ttk.Combobox(listen_top, textvariable=preview_category_var, state='readonly', width=24,
+                                 postcommand=lambda: refresh_preview_presets())
+    preview_combo.pack(side='left', padx=(5, 0))
+    preview_combo.bind('<<ComboboxSelected>>', lambda e: reset_preview_sliders())
+
+    sliders_frame = ttk.Frame(listen_container)
+    sliders_frame.pack(fill='x')
+    for column, (text, var, low, high, step) in enumerate((("Lowcut (Hz)", lowcut_var, 20, 2000, 10),
+                                                            ("Highcut (Hz)", highcut_var, 1000, 20000, 100),
+                                                            ("Ngưỡng gate (dB)", gate_var, -100, -10, 1),
+                                                            ("Volume (dB)", volume_var, -24, 12, 0.5))):
+        tk.Scale(sliders_frame, label=text, variable=var, from_=low, to=high, resolution=step, orient='horizontal',
+                 command=lambda value: schedule_preview()).grid(row=0, column=column, sticky='ew', padx=2)
+        sliders_frame.columnconfigure(column, weight=1)
+
+    playback_frame = ttk.Frame(listen_container)
+    playback_frame.pack(fill='x', pady=2)
+    play_buttons = [ttk.Button(playback_frame, text="▶ Bản gốc", command=lambda: play_preview(False)),
+                    ttk.Button(playback_frame, text="▶ Đã xử lý", command=lambda: play_preview(True)),
+                    ttk.Button(playback_frame, text="■ Dừng", command=lambda: stop_playback())]
+    for button in play_buttons:
+        button.pack(side='left', padx=(0, 5))
+    ttk.Label(playback_frame, textvariable=preview_status_var).pack(side='left', padx=(5, 0))
+
+    canvas_frame = ttk.Frame(listen_container)
+    canvas_frame.pack(fill='both', expand=True)
+    waveform_canvas = tk.Canvas(canvas_frame, height=90, bg="#1e1e1e", highlightthickness=0)
+    waveform_canvas.pack(side='left', fill='both', expand=True)
+    spectrum_canvas = tk.Canvas(canvas_frame, width=260, height=90, bg="#1e1e1e", highlightthickness=0)
+    spectrum_canvas.pack(side='left', fill='y', padx=(5, 0))
+
     log_container = ttk.Frame(data_paned_window, padding=(5,0,5,5))
     data_paned_log_label = ttk.Label(log_container, text="Log tiến trình:", font=('Arial', 10, 'bold'))
     data_paned_log_label.pack(anchor='w')
@@ -385,6 +4208,7 @@ def run_app() -> None:
     setup_dnd(entry1, folder_var)
     setup_dnd(entry2, dest_var)
     setup_dnd(entry3, csv_path_var, is_csv=True, preview_frame=preview_container)
+    setup_dnd(preview_entry, preview_file_var)
     
     def show_config_preview(csv_path: str, parent_frame) -> None:
         for widget in parent_frame.winfo_children(): 
@@ -393,16 +4217,22 @@ def run_app() -> None:
             ttk.Label(parent_frame, text="Không thể tải file cấu hình.").pack()
             return
         try:
-            presets = load_presets_from_csv(csv_path)
+            # Cùng preset bank có cache với lần chạy batch, nên CSV chỉ được đọc lại khi đã sửa
+            bank = compile_preset_bank(csv_path)
+            presets = bank.presets
             ttk.Label(parent_frame, text=f"Cấu hình từ: {os.path.basename(csv_path)}", font=('Arial', 10, 'bold')).pack(anchor='w')
-            cols = list(presets[0].keys())
+            problems = bank.sample_rate_problems()
+            if problems:
+                ttk.Label(parent_frame, text='\n'.join(f"🟡 {problem}" for problem in problems), foreground="orange").pack(anchor='w')
+            # Cột target_lufs / true_peak_db chỉ có ở preset có giá trị
+            cols = list(dict.fromkeys(k for p in presets for k in p))
             tree = ttk.Treeview(parent_frame, columns=cols, show='headings')
             for col in cols:
                 tree.heading(col, text=col.replace('_', ' ').title())
                 tree.column(col, width=80, anchor='w')
             for p in presets:
                 p_display = {k: ', '.join(v) if isinstance(v, list) else v for k, v in p.items()}
-                tree.insert("", "end", values=list(p_display.values()))
+                tree.insert("", "end", values=[p_display.get(col, '') for col in cols])
             vsb = ttk.Scrollbar(parent_frame, orient="vertical", command=tree.yview)
             tree.configure(yscrollcommand=vsb.set)
             vsb.pack(side='right', fill='y')
@@ -420,16 +4250,16 @@ def run_app() -> None:
         path = filedialog.asksaveasfilename(defaultextension=".csv", initialfile="sound_presets.csv")
         if not path: 
             return
-        header = "priority,category_name,keywords,lowcut,highcut,volume,attenuation_db,gate_threshold_db,expansion_ratio,mb_low_thresh,mb_low_ratio,mb_mid_thresh,mb_mid_ratio,mb_high_thresh,mb_high_ratio"
+        header = "priority,category_name,keywords,lowcut,highcut,volume,attenuation_db,gate_threshold_db,expansion_ratio,mb_low_thresh,mb_low_ratio,mb_mid_thresh,mb_mid_ratio,mb_high_thresh,mb_high_ratio,mb_xover_low,mb_xover_high,mb_low_attack_ms,mb_low_release_ms,mb_mid_attack_ms,mb_mid_release_ms,mb_high_attack_ms,mb_high_release_ms,target_lufs,true_peak_db"
         data = [
-            "10,UI SFX,\"ui_click,ui_sfx,ui,click\",200,6000,0,-80,-50,0.1,-6,4,-4,3,-2,2",
-            "20,Footstep,\"footstep,step\",100,5000,-2,-80,-50,0.1,-8,4,-6,3,-4,2",
-            "30,Attack/Impact,\"impact,attack,hit,metal,wood,glass\",150,7000,-2,-80,-50,0.1,-4,4,-3,3,-2,2",
-            "35,Weapon,\"weapon,gun,rifle,shot,fire\",150,7000,-2,-80,-50,0.1,-4,4,-2,4,-1,3",
-            "40,Voice/Dialog,\"voice,dialog,speech\",150,8000,0,-80,-60,0.05,-6,3,-4,3,-3,2",
-            "50,Ambient,\"ambient,rain,water,drip,wind,air\",80,8000,-8,-70,-50,0.1,-10,2,-8,2,-6,2",
-            "60,Environment Tone,\"env,environment,rattle,window,door,creak\",60,6000,-14,-70,-50,0.1,-12,2,-10,2,-8,2",
-            "70,Music Background,music,100,12000,-8,-80,-50,0.1,-8,3,-4,3,-2,2"
+            "10,UI SFX,\"ui_click,ui_sfx,ui,click\",200,6000,0,-80,-50,0.1,-6,4,-4,3,-2,2,250,4000,1,100,5,50,10,20,,",
+            "20,Footstep,\"footstep,step\",100,5000,-2,-80,-50,0.1,-8,4,-6,3,-4,2,250,4000,1,100,5,50,10,20,,",
+            "30,Attack/Impact,\"impact,attack,hit,metal,wood,glass\",150,7000,-2,-80,-50,0.1,-4,4,-3,3,-2,2,250,4000,1,100,5,50,10,20,,",
+            "35,Weapon,\"weapon,gun,rifle,shot,fire\",150,7000,-2,-80,-50,0.1,-4,4,-2,4,-1,3,250,4000,1,100,5,50,10,20,,",
+            "40,Voice/Dialog,\"voice,dialog,speech\",150,8000,0,-80,-60,0.05,-6,3,-4,3,-3,2,250,4000,1,100,5,50,10,20,,",
+            "50,Ambient,\"ambient,rain,water,drip,wind,air\",80,8000,-8,-70,-50,0.1,-10,2,-8,2,-6,2,250,4000,1,100,5,50,10,20,,",
+            "60,Environment Tone,\"env,environment,rattle,window,door,creak\",60,6000,-14,-70,-50,0.1,-12,2,-10,2,-8,2,250,4000,1,100,5,50,10,20,,",
+            "70,Music Background,music,100,12000,-8,-80,-50,0.1,-8,3,-4,3,-2,2,250,4000,1,100,5,50,10,20,,"
         ]
         with open(path, 'w', newline='', encoding='utf-8') as f: 
             f.write(header + '\n' + '\n'.join(data))
@@ -437,19 +4267,384 @@ def run_app() -> None:
         csv_path_var.set(path)
         show_config_preview(path, preview_frame)
 
+    # Log được gọi từ thread xử lý, nên chỉ đẩy vào queue và để main loop ghi ra widget.
+    # Ngoài dòng log, queue còn nhận callable để chạy trên main thread (vd. messagebox).
+    log_queue: "queue.Queue[Union[str, Callable[[], None]]]" = queue.Queue()
+
     def log(msg: str) -> None:
-        if root.winfo_exists(): 
-            log_box.insert(tk.END, msg + "\n")
+        log_queue.put(msg)
+
+    def flush_log() -> None:
+        if not root.winfo_exists():
+            return
+        lines, callbacks = [], []
+        try:
+            while True:
+                item = log_queue.get_nowait()
+                (callbacks if callable(item) else lines).append(item)
+        except queue.Empty:
+            pass
+        if lines:
+            log_box.insert(tk.END, "\n".join(lines) + "\n")
             log_box.see(tk.END)
+        for callback in callbacks:
+            callback()
+        root.after(100, flush_log)
+
+    def start_dry_run() -> None:
+        if not all([folder_var.get(), dest_var.get(), csv_path_var.get()]):
+            messagebox.showerror("Lỗi", "Vui lòng chọn folder âm thanh, thư mục đích và file cấu hình!")
+            return
+        if current_run['control'] is not None:
+            messagebox.showerror("Lỗi", "Đang có một lần chạy chưa xong!")
+            return
+        log_box.delete(1.0, tk.END)
+        control = BatchControl()
+        args = (folder_var.get(), dest_var.get(), csv_path_var.get(), log, control)
+        current_run['control'] = control
+        start_button.config(state='disabled')
+        pause_button.config(state='normal')
+        stop_button.config(state='normal')
+
+        def run() -> None:
+            try:
+                dry_run_report(*args)
+            finally:
+                log_queue.put(finish_process)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    # Điều khiển của lần chạy hiện tại (None khi không chạy)
+    current_run: Dict[str, Optional[BatchControl]] = {'control': None}
+
+    def toggle_pause() -> None:
+        control = current_run['control']
+        if control is None:
+            return
+        if control.paused:
+            control.resume()
+            pause_button.config(text="Tạm dừng")
+        else:
+            control.pause()
+            pause_button.config(text="Tiếp tục")
+
+    def stop_process() -> None:
+        control = current_run['control']
+        if control is not None:
+            control.cancel()
+            pause_button.config(state='disabled', text="Tạm dừng")
+            stop_button.config(state='disabled')
+            log("⛔ Đang dừng: chờ các file đang xử lý xong...")
+
+    def finish_process() -> None:
+        current_run['control'] = None
+        start_button.config(state='normal')
+        pause_button.config(state='disabled', text="Tạm dừng")
+        stop_button.config(state='disabled')
 
     def start_process() -> None:
         if not all([folder_var.get(), dest_var.get(), csv_path_var.get(), algorithm_var.get()]):
             messagebox.showerror("Lỗi", "Vui lòng điền đầy đủ tất cả các mục!")
             return
+        try:
+            workers = int(workers_var.get())
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Lỗi", "Số worker không hợp lệ!")
+            return
         log_box.delete(1.0, tk.END)
-        threading.Thread(target=batch_process, args=(folder_var.get(), dest_var.get(), csv_path_var.get(), log, algorithm_var.get()), daemon=True).start()
-    
+        control = BatchControl()
+        args = (folder_var.get(), dest_var.get(), csv_path_var.get(), log, algorithm_var.get(), workers, streaming_var.get() or None, incremental_var.get(), None, profile_var.get(),
+                PIPELINE_MEMORY_MB, 'float64' if float64_var.get() else 'float32', None, split_var.get(), fast_path_var.get(), control)
+        current_run['control'] = control
+        start_button.config(state='disabled')
+        pause_button.config(state='normal')
+        stop_button.config(state='normal')
+
+        def run() -> None:
+            try:
+                summary = batch_process(*args)
+            finally:
+                log_queue.put(finish_process)
+            if summary['output_dir'] is not None:
+                counts = summary['counts']
+                title, status = ("Đã dừng", f"Đã dừng giữa chừng ({summary['cancelled']} file chưa xử lý)") if summary['cancelled'] is not None else ("Xong!", "Đã xử lý xong!")
+                log_queue.put(lambda: messagebox.showinfo(title, f"{status}\n✅ Thành công: {counts['success']}\n♻️ Không đổi: {counts['reused']}\n🟡 Bỏ qua: {counts['skipped']}\n❌ Lỗi: {counts['error']}\n📁 Output: {summary['output_dir']}"))
+
+        threading.Thread(target=run, daemon=True).start()
+
+    # --- Nghe thử: render trên một thread riêng, chỉ kết quả của yêu cầu mới nhất được vẽ ---
+    sd = _load_sounddevice()
+    if sd is None:
+        for button in play_buttons:
+            button.config(state='disabled')
+        preview_status_var.set("Cài 'sounddevice' để nghe; vẫn xem được dạng sóng và phổ.")
+    preview_executor = ThreadPoolExecutor(1, thread_name_prefix='soundfix-preview')
+    preview_state: Dict[str, Any] = {'csv': None, 'bank': None, 'generation': 0, 'after': None, 'player': None, 'shown': None}
+
+    def preview_bank() -> Optional[PresetBank]:
+        # Nạp lại bank khi đổi file cấu hình hoặc file bị sửa (cùng cache với lần chạy batch)
+        csv_path = csv_path_var.get()
+        try:
+            csv_key = (csv_path, os.stat(csv_path).st_mtime_ns)
+        except OSError:
+            return None
+        if preview_state['csv'] != csv_key:
+            try:
+                preview_state['bank'] = compile_preset_bank(csv_path)
+            except Exception:
+                preview_state['bank'] = None
+            preview_state['csv'] = csv_key
+        return preview_state['bank']
+
+    def refresh_preview_presets() -> None:
+        bank = preview_bank()
+        preview_combo['values'] = [PREVIEW_AUTO] + [p['category_name'] for p in (bank.presets if bank is not None else [])]
+
+    def base_preset() -> Optional[Dict[str, Any]]:
+        bank = preview_bank()
+        if bank is None:
+            return None
+        if preview_category_var.get() == PREVIEW_AUTO:
+            return bank.matcher(os.path.basename(preview_file_var.get()))
+        return next((p for p in bank.presets if p['category_name'] == preview_category_var.get()), None)
+
+    def current_preview_preset() -> Optional[Dict[str, Any]]:
+        preset = base_preset()
+        if preset is None:
+            return None
+        return dict(preset, lowcut=int(round(lowcut_var.get())), highcut=int(round(highcut_var.get())),
+                    gate_threshold_db=float(round(gate_var.get())), volume=round(volume_var.get(), 1))
+
+    def reset_preview_sliders() -> None:
+        # File / preset mới: đưa các thanh trượt về giá trị của preset
+        preset = base_preset()
+        if preset is not None:
+            lowcut_var.set(preset['lowcut'])
+            highcut_var.set(preset['highcut'])
+            gate_var.set(preset['gate_threshold_db'])
+            volume_var.set(preset['volume'])
+        schedule_preview()
+
+    def select_preview_file() -> None:
+        path = filedialog.askopenfilename(filetypes=[("Audio", " ".join(f"*{ext}" for ext in AUDIO_EXTENSIONS))])
+        if path:
+            preview_file_var.set(path)
+
+    def schedule_preview() -> None:
+        # Gom các lần kéo thanh trượt liên tiếp thành một lần render
+        if preview_state['after'] is not None:
+            root.after_cancel(preview_state['after'])
+        preview_state['after'] = root.after(PREVIEW_DEBOUNCE_MS, lambda: start_preview(False))
+
+    def start_player(sr: int, channels: int) -> PreviewPlayer:
+        stop_playback()
+        player = PreviewPlayer(sd, sr, channels)
+        preview_state['player'] = player
+        return player
+
+    def stop_playback() -> None:
+        player, preview_state['player'] = preview_state['player'], None
+        if player is not None:
+            player.stop()
+
+    def start_preview(play: bool) -> None:
+        preview_state['after'] = None
+        path, algorithm, preset = preview_file_var.get(), algorithm_var.get(), current_preview_preset()
+        if not os.path.isfile(path):
+            return
+        if preset is None:
+            preview_status_var.set("🟡 Không nhận diện được loại âm thanh: chọn preset để nghe thử.")
+            return
+        preview_state['generation'] += 1
+        generation = preview_state['generation']
+
+        def task() -> None:
+            if generation != preview_state['generation']:
+                return
+            try:
+                player = None
+                if play:
+                    data, sr = load_preview_source(path)
+                    player = start_player(sr, data.shape[0])
+                result = render_preview(path, algorithm, preset, on_block=player.feed if player is not None else None)
+                if player is not None:
+                    player.end()
+            except Exception as e:
+                message = f"❌ Không nghe thử được: {e}"
+                log_queue.put(lambda: preview_status_var.set(message))
+                return
+            log_queue.put(lambda: show_preview(generation, preset, result))
+
+        preview_executor.submit(task)
+
+    def play_preview(processed: bool) -> None:
+        if processed:
+            start_preview(True)
+            return
+        path = preview_file_var.get()
+
+        def task() -> None:
+            try:
+                data, sr = load_preview_source(path)
+                player = start_player(sr, data.shape[0])
+                player.feed(data.T)
+                player.end()
+            except Exception as e:
+                message = f"❌ Không phát được: {e}"
+                log_queue.put(lambda: preview_status_var.set(message))
+
+        if os.path.isfile(path):
+            preview_executor.submit(task)
+
+    def show_preview(generation: int, preset: Dict[str, Any], result: Dict[str, Any]) -> None:
+        if generation != preview_state['generation']:
+            return
+        preview_state['shown'] = (preset, result)
+        draw_preview()
+        source, output = result['source_analysis'], result['analysis']
+        cached = ", ".join(result['cached']) or "không"
+        preview_status_var.set(f"⏱️ {result['seconds'] * 1000:.0f} ms (cache: {cached}) · "
+                               f"RMS {source['rms_db_total']:.1f} → {output['rms_db_total']:.1f} dB · "
+                               f"peak {source['peak_db']:.1f} → {output['peak_db']:.1f} dB · "
+                               f"{loudness_note(result['loudness'])}")
+
+    def draw_preview() -> None:
+        waveform_canvas.delete('all')
+        spectrum_canvas.delete('all')
+        if preview_state['shown'] is None:
+            return
+        preset, result = preview_state['shown']
+        source, output, sr = result['source_analysis'], result['analysis'], result['sr']
+        # Dạng sóng: min / max từng cột, bản gốc tô xám, bản xử lý viền xanh
+        width, height = max(waveform_canvas.winfo_width(), 2), max(waveform_canvas.winfo_height(), 2)
+        mid = height / 2
+        for analysis, outline, fill in ((source, "#707070", "#4a4a4a"), (output, "#4ec9b0", "")):
+            low, high = analysis['waveform']
+            if high.size < 2:
+                continue
+            x = np.linspace(0, width, high.size)
+            top, bottom = mid - np.clip(high, -1, 1) * mid, mid - np.clip(low, -1, 1) * mid
+            points = np.concatenate([np.column_stack([x, top]), np.column_stack([x[::-1], bottom[::-1]])])
+            waveform_canvas.create_polygon(points.ravel().tolist(), outline=outline, fill=fill)
+        # Phổ trung bình theo trục tần số log, vạch cam là lowcut / highcut
+        width, height = max(spectrum_canvas.winfo_width(), 2), max(spectrum_canvas.winfo_height(), 2)
+        keep = source['freqs'] >= 20
+        log_low, log_high = np.log10(20), np.log10(sr / 2)
+        x = (np.log10(source['freqs'][keep]) - log_low) / (log_high - log_low) * width
+        top_db = max(source['spectrum_db'].max(), output['spectrum_db'].max())
+        for analysis, color in ((source, "#707070"), (output, "#4ec9b0")):
+            y = np.clip((top_db - analysis['spectrum_db'][keep]) / PREVIEW_SPECTRUM_RANGE_DB, 0, 1) * height
+            spectrum_canvas.create_line(np.column_stack([x, y]).ravel().tolist(), fill=color)
+        for freq in (preset['lowcut'], preset['highcut']):
+            if 20 < freq < sr / 2:
+                fx = (np.log10(freq) - log_low) / (log_high - log_low) * width
+                spectrum_canvas.create_line(fx, 0, fx, height, fill="#ce9178", dash=(2, 2))
+
+    preview_file_var.trace_add('write', lambda *args: reset_preview_sliders())
+    waveform_canvas.bind('<Configure>', lambda e: draw_preview())
+    spectrum_canvas.bind('<Configure>', lambda e: draw_preview())
+
+    flush_log()
     root.mainloop()
+    stop_playback()
+    preview_executor.shutdown(wait=False, cancel_futures=True)
+
+# ==============================================================================
+# DÒNG LỆNH (HEADLESS)
+# ==============================================================================
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Không có tham số: mở giao diện. 'process' / 'compare' / 'watch' / 'classify' chạy không cần tkinter.
+    Mã thoát: 0 thành công, 1 có file lỗi, 2 lỗi tham số / cấu hình.
+    """
+    parser = argparse.ArgumentParser(prog='soundfix', description="SoundFix - xử lý âm thanh hàng loạt theo cấu hình CSV")
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('gui', help="Mở giao diện (mặc định)")
+
+    p = sub.add_parser('process', help="Xử lý cả folder không cần giao diện")
+    p.add_argument('input', help="Folder âm thanh")
+    p.add_argument('output', help="Thư mục đích")
+    p.add_argument('--csv', required=True, help="File cấu hình preset")
+    p.add_argument('--algorithm', default="Dynamic Hybrid Brickwall", choices=list(engine_functions))
+    p.add_argument('--workers', type=int, default=None, help="Số worker song song (mặc định: số nhân CPU)")
+    p.add_argument('--streaming', choices=['auto', 'on', 'off'], default='auto', help="auto: chỉ file dài hơn %g s" % STREAMING_MIN_SECONDS)
+    p.add_argument('--incremental', action='store_true', help="Dùng lại output của lần chạy trước cho file không đổi")
+    p.add_argument('--profile', action='store_true', help="Đo thời gian từng bước, ghi soundfix_profile.csv/.json vào thư mục output")
+    p.add_argument('--pipeline-memory', type=float, default=PIPELINE_MEMORY_MB, metavar='MB',
+                   help="Tổng audio đọc trước / chờ ghi của mọi worker (mặc định %g MB)" % PIPELINE_MEMORY_MB)
+    p.add_argument('--no-pipeline', action='store_true', help="Đọc, xử lý, ghi tuần tự từng file")
+    p.add_argument('--split-channels', action='store_true', help="File nhiều kênh dài từ %g s: mỗi kênh một worker (shared memory)" % SPLIT_MIN_SECONDS)
+    p.add_argument('--dtype', choices=list(PROCESSING_DTYPES), default=DEFAULT_DTYPE, help="Kiểu dữ liệu xử lý: float32 nhanh, float64 chính xác hơn")
+    p.add_argument('--subtype', type=str.upper, default=None, help="Subtype của output (PCM_16, PCM_24, FLOAT...); mặc định giữ như file nguồn")
+    p.add_argument('--fast-path', action='store_true', help="Bỏ qua engine cho file im lặng hoặc đã sạch ngoài dải (chép nguyên / chỉ gain)")
+    p.add_argument('--shard', type=parse_shard, default=None, metavar='K/N', help="Chỉ xử lý phần K trong N phần của thư viện")
+    p.add_argument('--json', metavar='PATH', help="Ghi kết quả từng file ra file JSON")
+    p.add_argument('--quiet', action='store_true', help="Không in log tiến trình")
+
+    p = sub.add_parser('compare', help="Render nhiều thuật toán / file preset từ một lần giải mã, so sánh RMS / peak")
+    p.add_argument('input', help="Folder âm thanh")
+    p.add_argument('output', help="Thư mục đích")
+    p.add_argument('--csv', action='append', required=True, help="File cấu hình preset (lặp lại để so sánh nhiều file)")
+    p.add_argument('--algorithm', action='append', choices=list(engine_functions), help="Thuật toán (lặp lại; mặc định: mọi thuật toán)")
+    p.add_argument('--workers', type=int, default=None, help="Số worker song song (mặc định: số nhân CPU)")
+    p.add_argument('--streaming', choices=['auto', 'on', 'off'], default='auto', help="auto: chỉ file dài hơn %g s" % STREAMING_MIN_SECONDS)
+    p.add_argument('--dtype', choices=list(PROCESSING_DTYPES), default=DEFAULT_DTYPE, help="Kiểu dữ liệu xử lý")
+    p.add_argument('--subtype', type=str.upper, default=None, help="Subtype của output; mặc định giữ như file nguồn")
+    p.add_argument('--shard', type=parse_shard, default=None, metavar='K/N', help="Chỉ xử lý phần K trong N phần của thư viện")
+    p.add_argument('--json', metavar='PATH', help="Ghi kết quả ra file JSON")
+    p.add_argument('--quiet', action='store_true', help="Không in log tiến trình")
+
+    p = sub.add_parser('watch', help="Chạy như dịch vụ: theo dõi folder và tự xử lý file mới được thả vào")
+    p.add_argument('input', nargs='+', help="Folder theo dõi (một hoặc nhiều)")
+    p.add_argument('output', help="Thư mục output (chứa manifest và %s)" % SERVICE_STATUS_NAME)
+    p.add_argument('--csv', required=True, help="File cấu hình preset (tự nạp lại khi thay đổi)")
+    p.add_argument('--algorithm', default="Dynamic Hybrid Brickwall", choices=list(engine_functions))
+    p.add_argument('--workers', type=int, default=None, help="Số worker song song (mặc định: số nhân CPU)")
+    p.add_argument('--streaming', choices=['auto', 'on', 'off'], default='auto', help="auto: chỉ file dài hơn %g s" % STREAMING_MIN_SECONDS)
+    p.add_argument('--dtype', choices=list(PROCESSING_DTYPES), default=DEFAULT_DTYPE, help="Kiểu dữ liệu xử lý")
+    p.add_argument('--subtype', type=str.upper, default=None, help="Subtype của output; mặc định giữ như file nguồn")
+    p.add_argument('--fast-path', action='store_true', help="Bỏ qua engine cho file im lặng hoặc đã sạch ngoài dải")
+    p.add_argument('--poll', type=float, default=SERVICE_POLL_SECONDS, metavar='GIÂY', help="Chu kỳ quét folder (mặc định %g s)" % SERVICE_POLL_SECONDS)
+    p.add_argument('--settle', type=float, default=SERVICE_SETTLE_SECONDS, metavar='GIÂY',
+                   help="Chờ file đứng yên chừng này giây rồi mới xử lý (mặc định %g s)" % SERVICE_SETTLE_SECONDS)
+    p.add_argument('--status-port', type=int, default=None, metavar='PORT', help="Mở endpoint HTTP trạng thái trên 127.0.0.1:PORT")
+    p.add_argument('--quiet', action='store_true', help="Không in log tiến trình")
+
+    p = sub.add_parser('classify', help="Chỉ phân loại file (dry-run), ghi báo cáo CSV")
+    p.add_argument('input', help="Folder âm thanh")
+    p.add_argument('output', help="Thư mục ghi báo cáo")
+    p.add_argument('--csv', required=True, help="File cấu hình preset")
+
+    args = parser.parse_args(argv)
+    if args.command in (None, 'gui'):
+        run_app()
+        return 0
+    if args.command == 'classify':
+        return 0 if dry_run_report(args.input, args.output, args.csv, print) is not None else 2
+
+    streaming = {'auto': None, 'on': True, 'off': False}[args.streaming]
+    if args.command == 'watch':
+        control = BatchControl()
+        # Dừng êm khi bị kill (SIGTERM): file đang xử lý được làm xong, manifest được lưu
+        import signal
+        signal.signal(signal.SIGTERM, lambda signum, frame: control.cancel())
+        status = run_service(args.input, args.output, args.csv, None if args.quiet else print, args.algorithm, args.workers,
+                             streaming, args.dtype, args.subtype, args.fast_path, args.poll, args.settle, args.status_port, control)
+        return 2 if status['error'] is not None else 0
+    if args.command == 'compare':
+        summary = render_variants(args.input, args.output, args.algorithm or list(engine_functions), args.csv,
+                                  None if args.quiet else print, args.workers, streaming, args.shard, args.dtype, args.subtype)
+    else:
+        summary = batch_process(args.input, args.output, args.csv, None if args.quiet else print, args.algorithm,
+                                args.workers, streaming, args.incremental, args.shard, args.profile,
+                                None if args.no_pipeline else args.pipeline_memory, args.dtype, args.subtype, args.split_channels,
+                                args.fast_path)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=1)
+    if summary['error'] is not None:
+        return 2
+    return 1 if summary['counts']['error'] else 0
 
 if __name__ == "__main__":
-    run_app() 
\ No newline at end of file
+    sys.exit(main())
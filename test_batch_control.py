@@ -0,0 +1,155 @@
+"""Quét thư mục theo thứ tự và tạm dừng / tiếp tục / hủy batch_process, render_variants, dry_run_report bằng BatchControl."""
+import os
+import threading
+
+import pytest
+
+import soundfix
+
+
+def _tree(root):
+    names = ["b.wav", "a/x.WAV", "a/sub/y.flac", "a.wav", "a_b.mp3", "a-c.ogg", "c/d/e/f.w64", "notes.txt", "c/readme.md"]
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+    (root / "empty").mkdir()
+
+
+def _walk(root):
+    return sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(root)
+                  for name in names if name.lower().endswith(soundfix.AUDIO_EXTENSIONS))
+
+
+@pytest.mark.parametrize('threads', [1, 4])
+def test_scan_order_matches_sorted_walk(tmp_path, threads):
+    _tree(tmp_path)
+    progress = []
+    files = list(soundfix.scan_audio_files(str(tmp_path), progress=lambda f, d: progress.append((f, d)), threads=threads))
+    assert files == _walk(str(tmp_path))
+    assert len(files) == 7
+    assert progress[-1] == (7, 7)
+    assert soundfix.find_audio_files(str(tmp_path)) == files
+
+
+def test_scan_stops_when_cancelled(tmp_path):
+    _tree(tmp_path)
+    control = soundfix.BatchControl()
+    scanner = soundfix.scan_audio_files(str(tmp_path), control)
+    first = next(scanner)
+    control.cancel()
+    assert list(scanner) == []
+    assert first == _walk(str(tmp_path))[0]
+
+
+def test_control_states():
+    control = soundfix.BatchControl()
+    assert not control.paused and not control.cancelled and control.wait(0)
+    control.pause()
+    assert control.paused and not control.wait(0.01)
+    control.resume()
+    assert not control.paused and control.wait(0)
+    control.pause()
+    control.cancel()
+    # Hủy khi đang tạm dừng phải đánh thức nơi đang chờ
+    assert control.cancelled and not control.paused and not control.wait(0)
+
+
+@pytest.fixture
+def library(make_wav, tmp_path):
+    return [make_wav(f"lib/board_{i:02d}.wav", seconds=0.3, seed=i) for i in range(8)]
+
+
+def _run(tmp_path, csv_path, control, on_log):
+    logs = []
+
+    def log(message):
+        logs.append(message)
+        on_log(message)
+    summary = soundfix.batch_process(str(tmp_path / "lib"), str(tmp_path / "out"), csv_path, log, "Hybrid Brickwall",
+                                     workers=1, control=control)
+    assert summary['error'] is None
+    return summary, logs
+
+
+def test_pause_and_resume(tmp_path, csv_path, library):
+    control = soundfix.BatchControl()
+
+    def on_log(message):
+        if message.startswith("[1/"):
+            control.pause()
+            threading.Timer(0.5, control.resume).start()
+    summary, logs = _run(tmp_path, csv_path, control, on_log)
+    assert "⏸️ Tạm dừng" in logs and "▶️ Tiếp tục" in logs
+    assert summary['counts']['success'] == 8
+    assert summary['cancelled'] is None
+    assert [result['file'] for result in summary['files']] == library
+
+
+def test_cancel(tmp_path, csv_path, library):
+    control = soundfix.BatchControl()
+
+    def on_log(message):
+        if message.startswith("[1/"):
+            control.cancel()
+    summary, logs = _run(tmp_path, csv_path, control, on_log)
+    assert any(message.startswith("⛔ Đã hủy") for message in logs)
+    processed = [result['file'] for result in summary['files']]
+    # Các file đã bắt đầu được làm xong, theo thứ tự quét; phần còn lại không được xử lý
+    assert processed == library[:len(processed)]
+    assert all(result['status'] == 'success' for result in summary['files'])
+    assert summary['counts']['success'] + summary['cancelled'] < len(library)
+    assert len(os.listdir(summary['output_dir'])) == len(processed)
+
+
+def test_cancel_while_paused(tmp_path, csv_path, library):
+    control = soundfix.BatchControl()
+
+    def on_log(message):
+        if message.startswith("[1/"):
+            control.pause()
+            threading.Timer(0.3, control.cancel).start()
+    summary, logs = _run(tmp_path, csv_path, control, on_log)
+    assert "⏸️ Tạm dừng" in logs and "▶️ Tiếp tục" not in logs
+    assert summary['cancelled'] is not None
+    assert summary['counts']['success'] < len(library)
+
+
+def test_render_variants_pause_and_cancel(tmp_path, csv_path, library):
+    control = soundfix.BatchControl()
+    logs = []
+
+    def log(message):
+        logs.append(message)
+        if message.startswith("[1/"):
+            control.pause()
+            threading.Timer(0.3, control.resume).start()
+        elif message.startswith("[3/"):
+            control.cancel()
+    summary = soundfix.render_variants(str(tmp_path / "lib"), str(tmp_path / "out"), ["Hybrid Brickwall"], [csv_path], log,
+                                       workers=1, control=control)
+    assert "⏸️ Tạm dừng" in logs and "▶️ Tiếp tục" in logs
+    assert any(message.startswith("⛔ Đã hủy") for message in logs)
+    # Tổng kết và báo cáo chỉ có các file đã render
+    assert [result['file'] for result in summary['files']] == library[:3]
+    assert summary['counts']['success'] == 3 and summary['cancelled'] == 0
+    with open(summary['report'], encoding='utf-8') as f:
+        assert len(f.readlines()) == 1 + 3
+
+
+def test_dry_run_report_cancel(tmp_path, csv_path, library, monkeypatch):
+    control = soundfix.BatchControl()
+    scan_audio_files = soundfix.scan_audio_files
+
+    def scan(folder_path, control=None, *args):
+        # Hủy khi quét thấy file thứ 5: báo cáo chỉ có 4 file đầu
+        for i, file_path in enumerate(scan_audio_files(folder_path, control, *args)):
+            if i == 4:
+                control.cancel()
+            yield file_path
+    monkeypatch.setattr(soundfix, 'scan_audio_files', scan)
+    logs = []
+    report = soundfix.dry_run_report(str(tmp_path / "lib"), str(tmp_path / "out"), csv_path, logs.append, control)
+    assert "⛔ Đã hủy: ngừng quét sau 4 file" in logs
+    with open(report, encoding='utf-8') as f:
+        assert [line.split(',')[0] for line in f.read().splitlines()[1:]] == library[:4]
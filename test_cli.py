@@ -0,0 +1,91 @@
+"""Dòng lệnh (main): mã thoát, --json, --shard K/N và import không cần tkinter."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import soundfix
+
+ROOT = Path(__file__).parent
+
+
+@pytest.fixture
+def library(make_wav):
+    return sorted(make_wav(f"lib/{sub}board_{i}.wav", seconds=0.1, seed=i) for i, sub in enumerate(["", "a/", "b/"] * 3))
+
+
+def _process(tmp_path, csv_path, *extra, output="out"):
+    return soundfix.main(['process', str(tmp_path / "lib"), str(tmp_path / output), '--csv', csv_path,
+                          '--algorithm', "Hybrid Brickwall", '--workers', '1', '--quiet', *extra])
+
+
+def test_success_and_json(tmp_path, csv_path, library):
+    report = tmp_path / "report.json"
+    assert _process(tmp_path, csv_path, '--json', str(report)) == 0
+    summary = json.loads(report.read_text(encoding='utf-8'))
+    assert summary['error'] is None
+    assert summary['counts'] == {'success': 9, 'skipped': 0, 'error': 0, 'reused': 0}
+    assert [f['file'] for f in summary['files']] == library
+    assert all((Path(summary['output_dir']) / f['output']).is_file() for f in summary['files'])
+
+
+def test_file_error_exits_1(tmp_path, csv_path, library):
+    (tmp_path / "lib" / "board_broken.wav").write_bytes(b"RIFF\x00\x00\x00\x00WAVEnot audio")
+    report = tmp_path / "report.json"
+    assert _process(tmp_path, csv_path, '--json', str(report)) == 1
+    summary = json.loads(report.read_text(encoding='utf-8'))
+    assert summary['counts']['error'] == 1 and summary['counts']['success'] == 9
+
+
+def test_config_errors_exit_2(tmp_path, csv_path, library):
+    report = tmp_path / "report.json"
+    assert _process(tmp_path, str(tmp_path / "missing.csv"), '--json', str(report)) == 2
+    assert json.loads(report.read_text(encoding='utf-8'))['error']
+    assert soundfix.main(['process', str(tmp_path / "nowhere"), str(tmp_path / "out"), '--csv', csv_path, '--quiet']) == 2
+    assert soundfix.main(['classify', str(tmp_path / "lib"), str(tmp_path / "out"), '--csv', str(tmp_path / "missing.csv")]) == 2
+    assert soundfix.main(['classify', str(tmp_path / "nowhere"), str(tmp_path / "out"), '--csv', csv_path]) == 2
+    assert soundfix.main(['compare', str(tmp_path / "nowhere"), str(tmp_path / "out"), '--csv', csv_path, '--quiet']) == 2
+
+
+@pytest.mark.parametrize('args', [['--shard', '0/3'], ['--shard', '4/3'], ['--shard', 'x'], ['--dtype', 'float16'],
+                                  ['--algorithm', 'Nope']])
+def test_bad_arguments_exit_2(tmp_path, csv_path, args):
+    with pytest.raises(SystemExit) as exit_info:
+        soundfix.main(['process', str(tmp_path), str(tmp_path / "out"), '--csv', csv_path, *args])
+    assert exit_info.value.code == 2
+
+
+def test_shards_are_complete_and_deterministic(tmp_path, csv_path, library):
+    shards = []
+    for k in (1, 2, 3):
+        report = tmp_path / f"shard{k}.json"
+        assert _process(tmp_path, csv_path, '--shard', f"{k}/3", '--json', str(report)) == 0
+        summary = json.loads(report.read_text(encoding='utf-8'))
+        assert summary['output_dir'].endswith(f"_shard{k}of3")
+        shards.append([f['file'] for f in summary['files']])
+    assert sorted(f for shard in shards for f in shard) == library
+    assert all(len(shard) == 3 for shard in shards)
+    # Cùng thư viện, cùng shard: cùng danh sách file
+    report = tmp_path / "again.json"
+    assert _process(tmp_path, csv_path, '--shard', "2/3", '--json', str(report), output="again") == 0
+    assert [f['file'] for f in json.loads(report.read_text(encoding='utf-8'))['files']] == shards[1]
+
+
+def test_classify(tmp_path, csv_path, library):
+    assert soundfix.main(['classify', str(tmp_path / "lib"), str(tmp_path / "report"), '--csv', csv_path]) == 0
+    assert list((tmp_path / "report").glob("*.csv"))
+
+
+def test_import_without_tkinter():
+    code = "import sys, soundfix; print('tkinter' in sys.modules)"
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == 'False'
+
+
+def test_script_exit_code(tmp_path, csv_path):
+    out = subprocess.run([sys.executable, str(ROOT / "soundfix.py"), 'process', str(tmp_path / "nowhere"), str(tmp_path / "out"),
+                          '--csv', csv_path], capture_output=True, text=True)
+    assert out.returncode == 2
+    assert "Lỗi" in out.stdout
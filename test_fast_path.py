@@ -0,0 +1,66 @@
+"""Phân tích nhanh (fast_path): chỉ bỏ qua engine khi output giống engine."""
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import soundfix
+
+SR = 48000
+
+
+def _tone(freq=1000.0, seconds=1.0, channels=2):
+    """Sine với fade vào / ra 0.25 s để hai đầu file không tạo năng lượng ngoài dải."""
+    t = np.arange(int(seconds * SR)) / SR
+    fade = np.sin(np.pi / 2 * np.minimum(1.0, np.minimum(t, t[::-1]) / 0.25)) ** 2
+    return np.tile(0.5 * fade * np.sin(2 * np.pi * freq * t), (channels, 1)).astype(np.float32)
+
+
+@pytest.mark.parametrize('algorithm', list(soundfix.engine_functions))
+def test_silence_for_every_engine(tmp_path, preset, algorithm):
+    path = tmp_path / "board_silent.wav"
+    sf.write(path, np.zeros((SR, 2)), SR, subtype='FLOAT')
+    result = soundfix.process_file(str(path), str(tmp_path), algorithm, preset, fast_path=True)
+    assert result['fast_path'] == 'silent'
+    engine_output = soundfix.engine_functions[algorithm](np.zeros((2, SR), dtype=np.float32), sr=SR, **preset)
+    np.testing.assert_array_equal(sf.read(tmp_path / result['output'], dtype='float32')[0], engine_output.T)
+
+
+@pytest.mark.parametrize('algorithm', list(soundfix.engine_functions))
+def test_clean_file_only_skipped_by_brickwall_engines(preset, algorithm):
+    decision = soundfix.analyze_fast_path(_tone(), SR, preset, algorithm)['decision']
+    assert decision == ('gain' if algorithm in soundfix.FAST_PATH_ENGINES else 'process')
+    assert soundfix.analyze_fast_path(_tone(), SR, dict(preset, volume=0), algorithm)['decision'] == (
+        'copy' if algorithm in soundfix.FAST_PATH_ENGINES else 'process')
+
+
+@pytest.mark.parametrize('algorithm', soundfix.FAST_PATH_ENGINES)
+def test_out_of_band_content_is_processed(preset, algorithm):
+    for freq in (60.0, 12000.0):
+        assert soundfix.analyze_fast_path(_tone() + 0.01 * _tone(freq), SR, preset, algorithm)['decision'] == 'process'
+
+
+@pytest.mark.parametrize('algorithm', soundfix.FAST_PATH_ENGINES)
+def test_gain_output_matches_engine_magnitude(tmp_path, preset, algorithm):
+    path = tmp_path / "board_clean.wav"
+    sf.write(path, _tone().T, SR, subtype='FLOAT')
+    result = soundfix.process_file(str(path), str(tmp_path), algorithm, preset, fast_path=True)
+    assert result['fast_path'] == 'gain'
+    fast, _ = sf.read(tmp_path / result['output'], dtype='float32')
+    engine = soundfix.engine_functions[algorithm](_tone(), sr=SR, **preset).T * 10 ** (preset['volume'] / 20.0)
+    steady = slice(SR // 4, 3 * SR // 4)
+    np.testing.assert_allclose(np.sqrt(np.mean(np.square(fast[steady]))), np.sqrt(np.mean(np.square(engine[steady]))), rtol=1e-3)
+
+
+def test_copy_entry_not_reused_by_other_engines(tmp_path, preset):
+    path = tmp_path / "board_clean.wav"
+    sf.write(path, _tone().T, SR, subtype='FLOAT')
+    output_name = soundfix.output_name_for(str(path))
+    Path(tmp_path / output_name).write_bytes(path.read_bytes())
+    entry = soundfix.manifest_entry(str(path), soundfix.file_sha256(str(path)), preset, "Multiband Limiting", output_name,
+                                    fast_path='copy')
+    assert soundfix.reusable_manifest_entry(entry, str(path), tmp_path, preset, "Multiband Limiting", 'float32', None, True) is None
+    entry = dict(entry, algorithm="Hybrid Brickwall")
+    assert soundfix.reusable_manifest_entry(entry, str(path), tmp_path, preset, "Hybrid Brickwall", 'float32', None, True) is not None
+    assert soundfix.reusable_manifest_entry(entry, str(path), tmp_path, preset, "Hybrid Brickwall", 'float32', None, False) is None
@@ -0,0 +1,78 @@
+"""Cache thiết kế bộ lọc: khóa (order, lowcut, highcut, sr, btype), đếm hit / miss và warm_filter_cache."""
+import numpy as np
+import pytest
+from scipy.signal import butter, sosfreqz
+
+import soundfix
+
+DESIGNS = (soundfix.design_sos, soundfix.design_brickwall_kernel, soundfix.design_crossover)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    # Không dùng thiết kế của preset bank mà test khác đã nạp vào process
+    monkeypatch.setattr(soundfix, '_BANK_SOS', {})
+    monkeypatch.setattr(soundfix, '_BANK_CROSSOVERS', {})
+    for design in DESIGNS:
+        design.cache_clear()
+    yield
+    for design in DESIGNS:
+        design.cache_clear()
+
+
+def test_repeated_calls_are_hits():
+    first = soundfix.design_sos(24, 150, 6000, 48000, 'band')
+    assert soundfix.filter_cache_info()['misses'] == 1
+    for _ in range(3):
+        assert soundfix.design_sos(24, 150, 6000, 48000, 'band') is first
+    info = soundfix.filter_cache_info()
+    assert (info['hits'], info['misses'], info['size']) == (3, 1, 1)
+
+
+@pytest.mark.parametrize('changed', [dict(order=20), dict(lowcut=600), dict(highcut=8000), dict(sr=96000), dict(btype='bandstop')])
+def test_each_key_part_gets_its_own_design(changed):
+    base = dict(order=24, lowcut=500, highcut=6000, sr=48000, btype='band')
+    first = soundfix.design_sos(**base)
+    params = dict(base, **changed)
+    other = soundfix.design_sos(**params)
+    assert soundfix.filter_cache_info()['misses'] == 2
+    assert first.shape != other.shape or not np.array_equal(first, other)
+    # Tần số cắt chuẩn hóa được giới hạn trong [0.01, 0.99] như design_sos
+    nyq = 0.5 * params['sr']
+    wn = [max(0.01, params['lowcut'] / nyq), min(0.99, params['highcut'] / nyq)]
+    np.testing.assert_array_equal(other, butter(params['order'], wn, btype=params['btype'], output='sos'))
+
+
+@pytest.mark.parametrize('sr', [44100, 48000, 96000])
+def test_design_is_for_its_sample_rate(sr):
+    # Thiết kế của sample rate khác sẽ đặt điểm -3 dB sai chỗ
+    soundfix.design_sos(24, 1000, 6000, 22050)
+    _, h = sosfreqz(soundfix.design_sos(24, 1000, 6000, sr), worN=[1000, 6000], fs=sr)
+    np.testing.assert_allclose(20 * np.log10(np.abs(h)), -3.01, atol=0.05)
+
+
+def test_warm_filter_cache(presets):
+    soundfix.warm_filter_cache(presets, 'Hybrid Brickwall')
+    warmed = soundfix.filter_cache_info()
+    assert warmed['hits'] == 0 and warmed['misses'] == warmed['size'] > 0
+    preset = presets[0]
+    for sr in soundfix.COMMON_SAMPLE_RATES:
+        soundfix.design_sos(24, preset['lowcut'], preset['highcut'], sr, 'band')
+    assert soundfix.filter_cache_info()['hits'] == len(soundfix.COMMON_SAMPLE_RATES)
+    # Sample rate ngoài danh sách chưa được thiết kế sẵn
+    soundfix.design_sos(24, preset['lowcut'], preset['highcut'], 32000, 'band')
+    assert soundfix.filter_cache_info()['misses'] == warmed['misses'] + 1
+
+
+@pytest.mark.parametrize('algorithm', ['Linear-Phase Brickwall', 'Multiband Limiting'])
+def test_warm_other_designs(preset, algorithm):
+    soundfix.warm_filter_cache([preset], algorithm, sample_rates=(48000,))
+    misses = soundfix.filter_cache_info()['misses']
+    if algorithm == 'Linear-Phase Brickwall':
+        soundfix.design_brickwall_kernel(preset['lowcut'], preset['highcut'], 48000, preset['attenuation_db'])
+    else:
+        for freq in soundfix.crossover_layout(preset, 48000)[0]:
+            soundfix.design_crossover(freq, 48000)
+        soundfix.design_sos(24, preset['lowcut'], preset['highcut'], 48000, 'band')
+    info = soundfix.filter_cache_info()
+    assert info['misses'] == misses and info['hits'] > 0
@@ -0,0 +1,57 @@
+"""Chế độ incremental: manifest theo đường dẫn tương đối và output giữ thư mục con."""
+import time
+from pathlib import Path
+
+import soundfile as sf
+
+import soundfix
+
+
+def _run(source, dest, csv_path, **kwargs):
+    summary = soundfix.batch_process(str(source), str(dest), csv_path, None, "Hybrid Brickwall",
+                                     workers=1, incremental=True, **kwargs)
+    assert summary['error'] is None
+    # Thư mục output có dấu thời gian theo giây: chờ để lần chạy sau có thư mục riêng
+    time.sleep(1.1)
+    return summary
+
+
+def test_output_names_mirror_subfolders():
+    assert soundfix.output_name_for("/lib/a/x.wav", ["/lib"]) == "a/processed_x.wav"
+    assert soundfix.output_name_for("/lib/x.flac", ["/lib"]) == "processed_x.flac"
+    assert soundfix.output_name_for("/lib/a/x.wav") == "processed_x.wav"
+    assert soundfix.source_key("/in1/a/x.wav", ["/in1", "/in2"]) == "in1/a/x.wav"
+    assert soundfix.source_key("/elsewhere/x.wav", ["/in1"]) == "x.wav"
+
+
+def test_same_name_in_two_subfolders(make_wav, tmp_path, csv_path):
+    make_wav("lib/a/board_piece.wav", seed=1)
+    make_wav("lib/b/board_piece.wav", seed=2)
+    first = _run(tmp_path / "lib", tmp_path / "out", csv_path)
+    assert first['counts']['success'] == 2
+    output_dir = Path(first['output_dir'])
+    outputs = {f['output'] for f in first['files']}
+    assert outputs == {"a/processed_board_piece.wav", "b/processed_board_piece.wav"}
+    a, _ = sf.read(output_dir / "a/processed_board_piece.wav")
+    b, _ = sf.read(output_dir / "b/processed_board_piece.wav")
+    assert not (a == b).all()
+    manifest = soundfix.load_manifest(output_dir)
+    assert {key: entry['output'] for key, entry in manifest.items()} == {
+        "a/board_piece.wav": "a/processed_board_piece.wav", "b/board_piece.wav": "b/processed_board_piece.wav"}
+
+    # Chạy lại: cả hai được dùng lại, mỗi output vẫn là của đúng file nguồn
+    second = _run(tmp_path / "lib", tmp_path / "out", csv_path)
+    assert second['counts']['reused'] == 2
+    for name, data in (("a", a), ("b", b)):
+        reused, _ = sf.read(Path(second['output_dir']) / name / "processed_board_piece.wav")
+        assert (reused == data).all()
+
+
+def test_only_changed_file_is_reprocessed(make_wav, tmp_path, csv_path):
+    make_wav("lib/a/board_piece.wav", seed=1)
+    make_wav("lib/b/board_piece.wav", seed=2)
+    _run(tmp_path / "lib", tmp_path / "out", csv_path)
+    make_wav("lib/b/board_piece.wav", seed=3)
+    summary = _run(tmp_path / "lib", tmp_path / "out", csv_path)
+    status = {Path(f['file']).parent.name: f['status'] for f in summary['files']}
+    assert status == {"a": "reused", "b": "success"}
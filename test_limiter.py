@@ -0,0 +1,72 @@
+"""Limiter vector hóa (apply_limiter_mono) so với vòng lặp Python của bản cũ."""
+import numpy as np
+import pytest
+
+import soundfix
+from conftest import synthetic_signal
+
+SR = 48000
+PARAMS = dict(threshold=10 ** (-24 / 20), ratio=4.0, attack_samples=int(0.005 * SR), release_samples=int(0.05 * SR))
+
+
+def _legacy_gain(data, threshold, ratio, attack_samples, release_samples):
+    """Gain theo frame của apply_limiter_mono cũ: librosa RMS, gain computer và smoother bằng vòng lặp."""
+    import librosa
+    rms = librosa.feature.rms(y=data, frame_length=512, hop_length=256)[0]
+    gain_reduction = np.ones_like(rms)
+    for i, rms_val in enumerate(rms):
+        if rms_val > threshold:
+            excess = rms_val - threshold
+            reduction = excess * (1 - 1 / ratio)
+            gain_reduction[i] = (rms_val - reduction) / rms_val
+    smoothed_gain = np.ones_like(gain_reduction)
+    for i in range(1, len(gain_reduction)):
+        alpha = 1.0 / attack_samples if gain_reduction[i] < smoothed_gain[i - 1] else 1.0 / release_samples
+        smoothed_gain[i] = smoothed_gain[i - 1] + alpha * (gain_reduction[i] - smoothed_gain[i - 1])
+    return smoothed_gain
+
+
+def _legacy_limiter(data, **params):
+    gain_signal = np.repeat(_legacy_gain(data, **params), 256)
+    proc_len = min(len(data), len(gain_signal))
+    result = np.zeros_like(data)
+    result[:proc_len] = data[:proc_len] * gain_signal[:proc_len]
+    return result
+
+
+@pytest.fixture(params=['numba', 'python'])
+def smoother(request, monkeypatch):
+    if request.param == 'numba':
+        pytest.importorskip('numba')
+        monkeypatch.setattr(soundfix, '_gain_smoother', None)
+        assert soundfix._get_gain_smoother() is not soundfix._smooth_gain_loop
+    else:
+        monkeypatch.setattr(soundfix, '_gain_smoother', soundfix._smooth_gain_loop)
+    return request.param
+
+
+@pytest.fixture
+def signal():
+    # Nửa sau lớn hơn 20 dB: limiter vừa attack vừa release
+    return synthetic_signal(2.0, SR, 1)[:, 0].astype(np.float32)
+
+
+def test_step_gain_matches_legacy(smoother, signal):
+    expected = _legacy_limiter(signal, **PARAMS)
+    assert not np.allclose(expected, signal)
+    np.testing.assert_allclose(soundfix.apply_limiter_mono(signal, **PARAMS, interpolate=False), expected, atol=1e-6)
+
+
+def test_interpolated_gain_bounded_by_largest_step(smoother, signal):
+    expected = _legacy_limiter(signal, **PARAMS)
+    gain = _legacy_gain(signal, **PARAMS)
+    step = float(np.max(np.abs(np.diff(gain))))
+    diff = np.abs(soundfix.apply_limiter_mono(signal, **PARAMS) - expected)
+    assert np.all(diff <= step * np.abs(signal) + 1e-6)
+
+
+def test_channels_match_mono(smoother):
+    data = synthetic_signal(1.0, SR, 3).T.astype(np.float32)
+    together = soundfix.apply_limiter_mono(data, **PARAMS)
+    for ch in range(3):
+        np.testing.assert_array_equal(together[ch], soundfix.apply_limiter_mono(data[ch], **PARAMS))
@@ -0,0 +1,64 @@
+"""Linear-Phase Brickwall: không trễ, suy hao stop-band theo attenuation_db, pass band không đổi."""
+import numpy as np
+import pytest
+from scipy.signal import firwin, kaiserord
+
+import soundfix
+
+SR = 48000
+PRESET = dict(lowcut=150, highcut=6000, attenuation_db=-80.0)
+
+
+def _gain_db(freq, preset=PRESET, seconds=1.0):
+    t = np.arange(int(seconds * SR)) / SR
+    x = np.sin(2 * np.pi * freq * t)
+    y = soundfix.linear_phase_brickwall_filter(x, SR, **preset)
+    # Bỏ hai đầu (nửa độ dài kernel) nơi tín hiệu bị cắt
+    steady = slice(SR // 4, 3 * SR // 4)
+    return 10 * np.log10(np.mean(np.square(y[steady])) / np.mean(np.square(x[steady])))
+
+
+@pytest.mark.parametrize('position', [0, 1000, 12345])
+def test_zero_delay(position):
+    x = np.zeros(30000, dtype=np.float32)
+    x[position] = 1.0
+    y = soundfix.linear_phase_brickwall_filter(x, SR, **PRESET)
+    assert y.shape == x.shape and y.dtype == x.dtype
+    assert int(np.argmax(np.abs(y))) == position
+    # Pha tuyến tính: đáp ứng đối xứng quanh mẫu của xung
+    if position >= 1000:
+        np.testing.assert_allclose(y[position - 999:position], y[position + 999:position:-1], atol=1e-7)
+
+
+@pytest.mark.parametrize('freq', [50, 12000, 20000])
+def test_stop_band_attenuation(freq):
+    assert -86 < _gain_db(freq) < -74
+
+
+@pytest.mark.parametrize('attenuation_db', [-40.0, -60.0])
+def test_stop_band_follows_attenuation_db(attenuation_db):
+    assert abs(_gain_db(12000, dict(PRESET, attenuation_db=attenuation_db)) - attenuation_db) < 1.0
+
+
+@pytest.mark.parametrize('freq', [500, 1000, 3000, 5000])
+def test_pass_band_is_unity(freq):
+    assert abs(_gain_db(freq)) < 0.01
+
+
+def test_highcut_near_nyquist_falls_back_to_highpass():
+    preset = dict(PRESET, highcut=23990)
+    kernel = soundfix.design_brickwall_kernel(preset['lowcut'], preset['highcut'], SR, preset['attenuation_db'])
+    numtaps, beta = kaiserord(soundfix.FIR_ATTENUATION_DB, soundfix.FIR_TRANSITION_HZ / (0.5 * SR))
+    expected = (1 - 1e-4) * firwin(numtaps | 1, preset['lowcut'], window=('kaiser', beta), pass_zero='highpass', fs=SR)
+    expected[expected.shape[0] // 2] += 1e-4
+    np.testing.assert_allclose(kernel, expected, atol=1e-12)
+    assert abs(_gain_db(22000, preset)) < 0.01
+    assert _gain_db(50, preset) < -74
+
+
+def test_channels_processed_independently():
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((3, 8000)).astype(np.float32)
+    y = soundfix.linear_phase_brickwall_filter(x, SR, **PRESET)
+    for ch in range(3):
+        np.testing.assert_allclose(y[ch], soundfix.linear_phase_brickwall_filter(x[ch], SR, **PRESET), atol=1e-6)
@@ -0,0 +1,115 @@
+"""Loudness BS.1770: mức của sine chuẩn, gate, true peak, chuẩn hóa theo target_lufs và meter streaming."""
+import numpy as np
+import pytest
+import soundfile as sf
+
+import soundfix
+from conftest import synthetic_signal
+
+SR = 48000
+
+
+def _tone(seconds, db=0.0, sr=SR, freq=997.0, phase=0.0):
+    t = np.arange(int(seconds * sr)) / sr
+    return 10 ** (db / 20) * np.sin(2 * np.pi * freq * t + phase)
+
+
+@pytest.mark.parametrize('sr', [44100, 48000, 96000])
+def test_full_scale_sine(sr):
+    x = _tone(5.0, sr=sr)
+    assert soundfix.measure_loudness(x, sr)['lufs'] == pytest.approx(-3.01, abs=0.05)
+    assert soundfix.measure_loudness(np.stack([x, x]), sr)['lufs'] == pytest.approx(0.0, abs=0.05)
+
+
+def test_channel_weights():
+    # 5.1: surround được tính với trọng số 1.41, LFE không được tính
+    x = _tone(3.0)
+    surround, lfe = np.zeros((6, x.size)), np.zeros((6, x.size))
+    surround[4], lfe[3] = x, x
+    assert soundfix.measure_loudness(surround, SR)['lufs'] == pytest.approx(-3.01 + 10 * np.log10(1.41), abs=0.05)
+    assert soundfix.measure_loudness(lfe, SR)['lufs'] is None
+
+
+def test_absolute_gate_drops_silence():
+    loud = _tone(10.0, -20)
+    expected = soundfix.measure_loudness(loud, SR)['lufs']
+    gated = soundfix.measure_loudness(np.concatenate([loud, np.zeros(10 * SR)]), SR)['lufs']
+    # Không gate thì nửa im lặng kéo loudness xuống 3 dB; chỉ các block ở ranh giới còn lệch chút ít
+    assert gated == pytest.approx(expected, abs=0.1)
+    assert soundfix.measure_loudness(np.zeros(SR), SR) == {'lufs': None, 'true_peak_db': None}
+    assert soundfix.measure_loudness(_tone(2.0, -75), SR)['lufs'] is None
+
+
+def test_relative_gate():
+    loud = _tone(10.0, -20)
+    expected = soundfix.measure_loudness(loud, SR)['lufs']
+    # -40 dB qua gate tuyệt đối nhưng thấp hơn gate tương đối (-10 LU): bị bỏ
+    quiet = soundfix.measure_loudness(np.concatenate([loud, _tone(10.0, -40)]), SR)['lufs']
+    assert quiet == pytest.approx(expected, abs=0.1)
+    # -25 dB trên gate tương đối: được tính, loudness là trung bình năng lượng của hai nửa
+    both = soundfix.measure_loudness(np.concatenate([loud, _tone(10.0, -25)]), SR)['lufs']
+    assert both == pytest.approx(expected + 10 * np.log10((1 + 10 ** (-5 / 10)) / 2), abs=0.1)
+
+
+@pytest.mark.parametrize('sr', [44100, 48000])
+def test_true_peak_between_samples(sr):
+    # Sine sr/4 lệch pha 45°: mọi mẫu ở ±0.707, đỉnh 1.0 nằm giữa hai mẫu
+    x = _tone(1.0, sr=sr, freq=sr / 4, phase=np.pi / 4)
+    assert 20 * np.log10(np.abs(x).max()) == pytest.approx(-3.01, abs=0.01)
+    assert soundfix.measure_loudness(x, sr)['true_peak_db'] == pytest.approx(0.0, abs=0.1)
+    assert soundfix.measure_loudness(x, sr, true_peak=False)['true_peak_db'] is None
+
+
+def test_loudness_normalization_gain():
+    measured = {'lufs': -30.0, 'true_peak_db': -10.0}
+    gain, after = soundfix.loudness_normalization({'volume': -2.0, 'target_lufs': -23.0}, measured)
+    assert gain == 7.0 and after == {'lufs': -23.0, 'true_peak_db': -3.0, 'gain_db': 7.0}
+    # Trần true peak thắng target
+    gain, after = soundfix.loudness_normalization({'volume': -2.0, 'target_lufs': -23.0, 'true_peak_db': -5.0}, measured)
+    assert gain == 5.0 and after['true_peak_db'] == -5.0 and after['lufs'] == -25.0
+    # Chỉ có trần: giữ volume nếu không vượt trần
+    assert soundfix.loudness_normalization({'volume': -2.0, 'true_peak_db': -1.0}, measured)[0] == -2.0
+    # Tín hiệu câm: giữ volume
+    assert soundfix.loudness_normalization({'volume': -2.0, 'target_lufs': -23.0}, {'lufs': None, 'true_peak_db': None})[0] == -2.0
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_process_file_hits_target(make_wav, tmp_path, preset, streaming):
+    path = make_wav(seconds=3.0)
+    result = soundfix.process_file(path, str(tmp_path), "Hybrid Brickwall", dict(preset, target_lufs=-23.0), streaming=streaming)
+    assert result['status'] == 'success'
+    y, sr = sf.read(tmp_path / result['output'], dtype='float32')
+    assert soundfix.measure_loudness(y.T, sr)['lufs'] == pytest.approx(-23.0, abs=0.01)
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_process_file_respects_true_peak_ceiling(make_wav, tmp_path, preset, streaming):
+    path = make_wav(seconds=3.0)
+    result = soundfix.process_file(path, str(tmp_path), "Hybrid Brickwall", dict(preset, target_lufs=-6.0, true_peak_db=-3.0),
+                                   streaming=streaming)
+    assert result['status'] == 'success'
+    y, sr = sf.read(tmp_path / result['output'], dtype='float32')
+    measured = soundfix.measure_loudness(y.T, sr)
+    assert measured['true_peak_db'] == pytest.approx(-3.0, abs=0.01)
+    assert measured['lufs'] < -6.0
+
+
+@pytest.mark.parametrize('block', [1000, 4097, 48000])
+def test_streaming_meter_matches_in_memory(block):
+    x = synthetic_signal(3.3, SR, 2).T
+    meter = soundfix.LoudnessMeter(2, SR)
+    for start in range(0, x.shape[-1], block):
+        meter.update(x[:, start:start + block])
+    streamed, whole = meter.measurement(), soundfix.measure_loudness(x, SR)
+    assert streamed['lufs'] == pytest.approx(whole['lufs'], abs=1e-9)
+    assert streamed['true_peak_db'] == pytest.approx(whole['true_peak_db'], abs=1e-9)
+
+
+def test_stacked_meters_match_in_memory():
+    x = synthetic_signal(2.0, SR, 3).T
+    meters = [soundfix.LoudnessMeter(1, SR) for _ in range(3)]
+    for meter, channel in zip(meters, x):
+        meter.update(channel)
+    stacked, whole = soundfix.LoudnessMeter.stack(meters).measurement(), soundfix.measure_loudness(x, SR)
+    assert stacked['lufs'] == pytest.approx(whole['lufs'], abs=1e-9)
+    assert stacked['true_peak_db'] == pytest.approx(whole['true_peak_db'], abs=1e-9)
@@ -0,0 +1,59 @@
+"""Đọc WAV / RF64 / W64 qua memory map (MappedWav) so với soundfile."""
+import numpy as np
+import pytest
+import soundfile as sf
+
+import soundfix
+
+SUBTYPES = ['PCM_U8', 'PCM_16', 'PCM_24', 'PCM_32', 'FLOAT', 'DOUBLE']
+FORMATS = ['WAV', 'WAVEX', 'RF64', 'W64']
+
+
+def _write(tmp_path, subtype, fmt, frames=5000, channels=3):
+    rng = np.random.default_rng(0)
+    data = rng.uniform(-1.0, 1.0, (frames, channels))
+    # Cả hai biên của dải mẫu
+    data[:2] = [[-1.0] * channels, [1.0 - 2.0 ** -31] * channels]
+    path = tmp_path / f"board.{'w64' if fmt == 'W64' else 'wav'}"
+    sf.write(path, data, 48000, subtype=subtype, format=fmt)
+    return str(path)
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'float64'])
+@pytest.mark.parametrize('fmt', FORMATS)
+@pytest.mark.parametrize('subtype', SUBTYPES)
+def test_matches_soundfile(tmp_path, subtype, fmt, dtype):
+    path = _write(tmp_path, subtype, fmt)
+    expected, sr = sf.read(path, dtype=dtype, always_2d=True)
+    with soundfix.open_mapped_wav(path) as f:
+        assert (f.samplerate, f.channels, f.frames, f.subtype) == (sr, 3, 5000, subtype)
+        np.testing.assert_array_equal(f.read(dtype=dtype, always_2d=True), expected)
+        np.testing.assert_array_equal(np.concatenate(list(f.blocks(777, dtype, always_2d=True))), expected)
+        np.testing.assert_array_equal(f.read_channel(1, dtype, block_size=1000), expected[:, 1])
+        assert f.read(dtype=dtype).dtype == np.dtype(dtype)
+    y, _, read_subtype = soundfix.read_audio(path, dtype)
+    assert read_subtype == subtype
+    np.testing.assert_array_equal(y, expected.T)
+
+
+def test_mono_shape(tmp_path):
+    path = _write(tmp_path, 'PCM_16', 'WAV', channels=1)
+    with soundfix.open_mapped_wav(path) as f:
+        assert f.read().shape == (5000,)
+        assert f.read(always_2d=True).shape == (5000, 1)
+
+
+def test_truncated_file(tmp_path):
+    path = _write(tmp_path, 'PCM_24', 'WAV')
+    with open(path, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 3 * 3 * 10 - 1)
+    layout = soundfix._wav_layout(path)
+    assert not layout['complete']
+    assert layout['frames'] == 4989
+
+
+@pytest.mark.parametrize('subtype,fmt', [('PCM_16', 'FLAC'), ('MS_ADPCM', 'WAV'), ('ULAW', 'WAV')])
+def test_unmapped_formats(tmp_path, subtype, fmt):
+    path = tmp_path / f"board.{fmt.lower()}"
+    sf.write(path, np.zeros((100, 2)), 48000, subtype=subtype, format=fmt)
+    assert soundfix.open_mapped_wav(str(path)) is None
@@ -0,0 +1,42 @@
+"""Regex trie của build_preset_matcher so với get_preset_for_file (duyệt tuần tự)."""
+import random
+
+import pytest
+
+import soundfix
+
+
+def _random_presets(rng, count, alphabet="abc_"):
+    presets = []
+    for i in range(count):
+        keywords = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 3))]
+        presets.append({'priority': rng.randint(0, 5), 'keywords': keywords, 'category_name': f"p{i}"})
+    presets.sort(key=lambda p: p['priority'])
+    return presets
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_matches_linear_scan(seed):
+    rng = random.Random(seed)
+    presets = _random_presets(rng, rng.randint(1, 12))
+    matcher = soundfix.build_preset_matcher(presets)
+    for _ in range(200):
+        name = "".join(rng.choice("abcABC_x") for _ in range(rng.randint(0, 12))) + ".wav"
+        assert matcher(name) is soundfix.get_preset_for_file(name, presets), name
+
+
+def test_bundled_csv(presets):
+    matcher = soundfix.build_preset_matcher(presets)
+    names = ["UI_Click_01.wav", "dice_roll.wav", "board_piece.wav", "ambience_forest.flac", "nothing.wav", ""]
+    names += [keyword + suffix for preset in presets for keyword in preset['keywords'] for suffix in ("", "_ui.wav")]
+    for name in names:
+        assert matcher(name) is soundfix.get_preset_for_file(name, presets), name
+
+
+def test_catch_all_keyword():
+    presets = [{'priority': 1, 'keywords': ['ui'], 'category_name': 'UI'},
+               {'priority': 2, 'keywords': [''], 'category_name': 'Mọi file'},
+               {'priority': 3, 'keywords': ['dice'], 'category_name': 'Dice'}]
+    matcher = soundfix.build_preset_matcher(presets)
+    assert matcher("ui_dice.wav")['category_name'] == 'UI'
+    assert matcher("dice.wav")['category_name'] == 'Mọi file'
@@ -0,0 +1,68 @@
+"""Multiband Limiting: bộ chia Linkwitz-Riley, EQ lowcut / highcut và kiểm tra cột mb_*."""
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import soundfix
+
+SR = 48000
+
+
+def _gain_db(preset, freq, level=0.01, engine=soundfix.multiband_limiting_filter):
+    t = np.arange(2 * SR) / SR
+    x = (level * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    y = engine(x, SR, **preset)
+    steady = slice(SR, 2 * SR)
+    return 20 * np.log10(np.sqrt(np.mean(np.square(y[steady], dtype=np.float64)) / np.mean(np.square(x[steady], dtype=np.float64))))
+
+
+def test_crossover_bands_sum_to_allpass(preset):
+    impulse = np.zeros((1, 1 << 16))
+    impulse[0, 0] = 1.0
+    bank = soundfix._CrossoverBank(1, SR, preset)
+    bands = list(bank.bands(impulse))
+    assert [name for name, _ in bands] == ['Low', 'Mid', 'High']
+    total = sum(band for _, band in bands)
+    np.testing.assert_allclose(np.abs(np.fft.rfft(total[0])), 1.0, atol=1e-6)
+
+
+@pytest.mark.parametrize('freq', [100, 141, 12000])
+def test_attenuation_outside_band(preset, freq):
+    # lowcut 200 Hz / highcut 6000 Hz, attenuation -80 dB: nửa octave ngoài dải đã giảm hơn 60 dB
+    assert _gain_db(dict(preset, lowcut=200), freq) < -60
+
+
+def test_passband_is_unity(preset):
+    for freq in (500, 1000, 3000):
+        assert abs(_gain_db(preset, freq)) < 0.1
+
+
+def test_matches_hybrid_brickwall_magnitude(preset):
+    # Dưới ngưỡng limiter, Multiband chỉ còn all-pass của bộ chia và EQ như Hybrid Brickwall
+    for freq in (100, 141, 170, 8000):
+        assert abs(_gain_db(preset, freq) - _gain_db(preset, freq, engine=soundfix.hybrid_brickwall_filter)) < 0.5
+
+
+def _csv(**columns):
+    header = list(soundfix.PRESET_REQUIRED_COLUMNS) + list(columns)
+    row = ['1', 'board', 'Board', '150', '6000', '0', '-80', '-50', '0.1'] + [str(v) for v in columns.values()]
+    return io.StringIO(','.join(header) + '\n' + ','.join(row) + '\n')
+
+
+@pytest.mark.parametrize('column', ['mb_low_attack_ms', 'mb_mid_release_ms', 'mb_high_ratio'])
+@pytest.mark.parametrize('value', [0, -1])
+def test_non_positive_limiter_columns_rejected(column, value):
+    with pytest.raises(soundfix.PresetError) as error:
+        soundfix.parse_presets_csv(_csv(**{column: value}))
+    assert (error.value.line, error.value.column) == (2, column)
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_sub_sample_attack(make_wav, tmp_path, streaming):
+    preset = soundfix.parse_presets_csv(_csv(mb_low_attack_ms=0.01, mb_mid_release_ms=0.001))[0]
+    path = make_wav()
+    result = soundfix.process_file(path, str(tmp_path), 'Multiband Limiting', preset, streaming=streaming)
+    assert result['status'] == 'success', result['message']
+    assert np.isfinite(sf.read(tmp_path / result['output'])[0]).all()
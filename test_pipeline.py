@@ -0,0 +1,58 @@
+"""Pipeline đọc / xử lý / ghi chồng lên nhau so với process_file lần lượt từng file."""
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import soundfix
+
+
+@pytest.fixture
+def library(make_wav, tmp_path):
+    files = [make_wav(f"lib/board_{i}.wav", seconds=0.5 + 0.25 * i, channels=1 + i % 2, seed=i) for i in range(5)]
+    files.insert(2, make_wav("lib/unmatched.wav", seconds=0.2))
+    broken = tmp_path / "lib" / "board_broken.wav"
+    broken.write_bytes(b"RIFF\x00\x00\x00\x00WAVEnot audio")
+    files.append(str(broken))
+    return files
+
+
+def _outputs(output_dir, results):
+    return {r['file']: sf.read(Path(output_dir) / r['output'], dtype='float32')[0] for r in results if r['status'] == 'success'}
+
+
+@pytest.mark.parametrize('memory_mb', [soundfix.PIPELINE_MEMORY_MB, 0.05])
+def test_pipelined_matches_sequential(library, tmp_path, presets, memory_mb):
+    algorithm = "Dynamic Hybrid Brickwall"
+    matcher = soundfix.build_preset_matcher(presets)
+    (tmp_path / "seq").mkdir()
+    sequential = [soundfix.process_file(f, str(tmp_path / "seq"), algorithm, matcher(Path(f).name)) for f in library]
+    (tmp_path / "pipe").mkdir()
+    # 0.05 MB nhỏ hơn mọi file: mỗi file được xử lý một mình mà pipeline không bị kẹt
+    pipelined = list(soundfix.process_files_pipelined(iter(library), str(tmp_path / "pipe"), algorithm, matcher,
+                                                      memory_mb=memory_mb))
+    assert [r['file'] for r in pipelined] == library
+    assert [(r['status'], r['output']) for r in pipelined] == [(r['status'], r['output']) for r in sequential]
+    assert [r['status'] for r in pipelined].count('success') == 5
+    expected = _outputs(tmp_path / "seq", sequential)
+    for file, data in _outputs(tmp_path / "pipe", pipelined).items():
+        np.testing.assert_array_equal(data, expected[file])
+
+
+def test_pipeline_budget():
+    budget = soundfix._PipelineBudget(100, max_files=4)
+    assert budget.acquire(60)
+    waiter = threading.Thread(target=budget.acquire, args=(60,))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+    budget.release(60)
+    waiter.join(1.0)
+    assert not waiter.is_alive()
+    budget.release(60)
+    # Lớn hơn cả ngân sách: được nhận khi pipeline trống
+    assert budget.acquire(500)
+    budget.close()
+    assert not budget.acquire(10)
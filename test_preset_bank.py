@@ -0,0 +1,40 @@
+"""Đọc preset CSV: load_presets_from_csv không đụng cache, compile_preset_bank dùng lại bank đã lưu cho batch và dry-run."""
+import pytest
+
+import soundfix
+
+
+def test_load_presets_has_no_side_effects(csv_path, presets, preset_cache):
+    assert soundfix.load_presets_from_csv(csv_path) == presets
+    assert list(preset_cache.iterdir()) == []
+
+
+def test_compiled_bank_is_cached(csv_path, presets, preset_cache):
+    bank = soundfix.compile_preset_bank(csv_path)
+    assert bank.presets == presets
+    saved = sorted(path.name for path in preset_cache.iterdir())
+    assert saved
+    again = soundfix.compile_preset_bank(csv_path)
+    assert again.path == bank.path and again.presets == presets
+    assert sorted(path.name for path in preset_cache.iterdir()) == saved
+
+
+@pytest.mark.parametrize('load', [soundfix.load_presets_from_csv, soundfix.compile_preset_bank])
+def test_missing_csv(tmp_path, load):
+    with pytest.raises(FileNotFoundError):
+        load(str(tmp_path / "missing.csv"))
+
+
+def test_dry_run_uses_compiled_bank(tmp_path, csv_path, make_wav, monkeypatch):
+    names = ["board_a.wav", "ui_click.wav", "nothing.wav"]
+    for name in names:
+        make_wav(f"lib/{name}", seconds=0.1)
+    # Dry-run phân loại bằng matcher của bank, không đọc lại CSV bằng load_presets_from_csv
+    monkeypatch.setattr(soundfix, 'load_presets_from_csv', None)
+    report = soundfix.dry_run_report(str(tmp_path / "lib"), str(tmp_path / "out"), csv_path, lambda msg: None)
+    matcher = soundfix.compile_preset_bank(csv_path).matcher
+    with open(report, encoding='utf-8') as f:
+        rows = [line.split(',') for line in f.read().splitlines()[1:]]
+    expected = [(name, (matcher(name) or {}).get('category_name', '')) for name in sorted(names)]
+    assert [(row[0].rsplit('/', 1)[-1], row[1]) for row in rows] == expected
+    assert expected[1][1] == '' and expected[0][1] and expected[2][1]
@@ -0,0 +1,103 @@
+"""Chế độ dịch vụ (IngestService): hàng đợi theo priority, chờ file ghi xong, khóa manifest và chạy lại."""
+import heapq
+import threading
+from pathlib import Path
+
+import pytest
+import soundfile as sf
+
+import soundfix
+
+
+@pytest.fixture
+def service_csv(tmp_path):
+    path = tmp_path / "service.csv"
+    rows = [','.join(soundfix.PRESET_REQUIRED_COLUMNS)]
+    for priority, keyword in ((3, 'board'), (1, 'dice'), (2, 'chip')):
+        rows.append(f"{priority},{keyword},{keyword.title()},150,6000,-2,-80,-50,0.1")
+    path.write_text('\n'.join(rows) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def _service(inputs, output_dir, csv_path, **kwargs):
+    kwargs.setdefault('settle_seconds', 0.0)
+    return soundfix.IngestService([str(folder) for folder in inputs], str(output_dir), csv_path,
+                                  algorithm="Hybrid Brickwall", workers=1, **kwargs)
+
+
+def _queued(service):
+    return [Path(heapq.heappop(service.queue)[2]).name for _ in range(len(service.queue))]
+
+
+def test_queue_follows_preset_priority(make_wav, tmp_path, service_csv):
+    for name in ("board_1.wav", "chip_1.wav", "dice_1.wav", "board_0.wav", "nothing.wav", ".dice_tmp.wav"):
+        make_wav(f"in/{name}", seconds=0.1)
+    service = _service([tmp_path / "in"], tmp_path / "out", service_csv)
+    service.poll()
+    # Cùng priority: theo thứ tự phát hiện (thứ tự quét)
+    assert _queued(service) == ["dice_1.wav", "chip_1.wav", "board_0.wav", "board_1.wav"]
+    assert service.counts['skipped'] == 1
+    # Lần quét sau: file đã biết không vào hàng đợi lần nữa
+    service.poll()
+    assert service.queue == [] and service.counts['skipped'] == 1
+
+
+def test_waits_until_file_is_written(make_wav, tmp_path, service_csv):
+    make_wav("in/board_new.wav", seconds=0.1)
+    service = _service([tmp_path / "in"], tmp_path / "out", service_csv, settle_seconds=60.0)
+    service.poll()
+    assert service.queue == [] and len(service.pending) == 1
+
+    # Chunk data dài hơn phần đã có trên đĩa: vẫn đang được chép dù mtime đã cũ
+    path = Path(make_wav("in2/board_copying.wav", seconds=0.1))
+    with open(path, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 1000)
+    service = _service([tmp_path / "in2"], tmp_path / "out", service_csv)
+    service.poll()
+    assert service.queue == [] and list(service.pending) == [str(path)]
+
+
+def test_manifest_keys_keep_input_folder_and_subfolder(make_wav, tmp_path, service_csv):
+    make_wav("in1/a/board.wav", seconds=0.1, seed=1)
+    make_wav("in2/a/board.wav", seconds=0.1, seed=2)
+    service = _service([tmp_path / "in1", tmp_path / "in2"], tmp_path / "out", service_csv)
+    service.poll()
+    assert sorted(item[3] for item in service.queue) == ["in1/a/board.wav", "in2/a/board.wav"]
+
+
+def _run_until(service, done):
+    """Chạy service.run() trong thread, hủy khi done(service) đúng (tối đa 60 s)."""
+    thread = threading.Thread(target=service.run)
+    thread.start()
+    try:
+        for _ in range(600):
+            if done(service) or not thread.is_alive():
+                break
+            thread.join(0.1)
+    finally:
+        service.control.cancel()
+        thread.join()
+    return service.snapshot
+
+
+def test_run_and_reuse_after_restart(make_wav, tmp_path, service_csv):
+    make_wav("in1/a/board.wav", seconds=0.2, seed=1)
+    make_wav("in2/a/board.wav", seconds=0.2, seed=2)
+    make_wav("in1/dice.wav", seconds=0.2, seed=3)
+    inputs, output_dir = [tmp_path / "in1", tmp_path / "in2"], tmp_path / "out"
+
+    status = _run_until(_service(inputs, output_dir, service_csv, poll_seconds=0.1), lambda s: s.counts['success'] == 3)
+    assert status['state'] == 'stopped' and status['counts']['success'] == 3
+    outputs = {"in1/a/processed_board.wav", "in2/a/processed_board.wav", "in1/processed_dice.wav"}
+    assert {str(path.relative_to(output_dir).as_posix()) for path in output_dir.rglob("processed_*")} == outputs
+    first, _ = sf.read(output_dir / "in1/a/processed_board.wav")
+    second, _ = sf.read(output_dir / "in2/a/processed_board.wav")
+    assert not (first == second).all()
+    manifest = soundfix.load_manifest(output_dir)
+    assert {key: entry['output'] for key, entry in manifest.items()} == {
+        "in1/a/board.wav": "in1/a/processed_board.wav", "in2/a/board.wav": "in2/a/processed_board.wav",
+        "in1/dice.wav": "in1/processed_dice.wav"}
+
+    # Chạy lại: file không đổi được nhận ra từ manifest, không xử lý lại
+    status = _run_until(_service(inputs, output_dir, service_csv, poll_seconds=0.1), lambda s: s.counts['reused'] == 3)
+    assert status['counts'] == {'success': 0, 'skipped': 0, 'error': 0, 'reused': 3}
@@ -0,0 +1,62 @@
+"""Chia kênh của file lớn cho nhiều worker (shared memory) so với xử lý cả file một lần."""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import soundfix
+
+# WAV map được (mỗi job tự đọc kênh qua memory map) và FLAC (giải mã vào shared memory trước)
+SOURCES = [("board_piece.wav", "FLOAT"), ("board_piece.wav", "PCM_24"), ("board_piece.flac", "PCM_16")]
+
+
+def _whole_file(path, output_dir, algorithm, preset):
+    result = soundfix.process_file(path, str(output_dir), algorithm, preset, streaming=False)
+    assert result['status'] == 'success', result['message']
+    return sf.read(Path(output_dir) / result['output'], dtype='float32')[0]
+
+
+@pytest.mark.parametrize('name,subtype', SOURCES)
+@pytest.mark.parametrize('algorithm', list(soundfix.engine_functions))
+def test_split_matches_whole_file(make_wav, tmp_path, preset, algorithm, name, subtype):
+    path = make_wav(name, seconds=1.0, channels=3, subtype=subtype)
+    (tmp_path / "split").mkdir()
+    # Job kênh chạy trong thread: shared memory dùng được trong cùng process, không cần spawn
+    with ThreadPoolExecutor(3) as executor:
+        results = soundfix.process_split_files(executor, {path: 3}, 3, str(tmp_path / "split"), algorithm,
+                                               lambda file_name: preset)
+    result = results[path]
+    assert result['status'] == 'success', result['message']
+    assert "3 kênh song song" in result['message']
+    split, _ = sf.read(tmp_path / "split" / result['output'], dtype='float32')
+    (tmp_path / "whole").mkdir()
+    np.testing.assert_array_equal(split, _whole_file(path, tmp_path / "whole", algorithm, preset))
+
+
+def test_split_loudness_matches_whole_file(make_wav, tmp_path, preset):
+    loud = dict(preset, target_lufs=-20.0)
+    path = make_wav(seconds=1.0, channels=2)
+    (tmp_path / "split").mkdir()
+    with ThreadPoolExecutor(2) as executor:
+        result = soundfix.process_split_files(executor, {path: 2}, 2, str(tmp_path / "split"), "Hybrid Brickwall",
+                                              lambda file_name: loud)[path]
+    assert result['status'] == 'success', result['message']
+    split, _ = sf.read(tmp_path / "split" / result['output'], dtype='float32')
+    (tmp_path / "whole").mkdir()
+    np.testing.assert_array_equal(split, _whole_file(path, tmp_path / "whole", "Hybrid Brickwall", loud))
+
+
+def test_batch_split_channels(make_wav, tmp_path, csv_path, preset):
+    # Đủ SPLIT_MIN_SECONDS để batch_process chia kênh qua worker spawn (sr thấp cho nhanh)
+    path = make_wav("lib/board_piece.wav", seconds=soundfix.SPLIT_MIN_SECONDS + 0.5, sr=16000, channels=3)
+    summary = soundfix.batch_process(str(tmp_path / "lib"), str(tmp_path / "out"), csv_path, None, "Hybrid Brickwall",
+                                     workers=2, streaming=False, split_channels=True)
+    assert summary['error'] is None
+    [result] = summary['files']
+    assert result['status'] == 'success', result['message']
+    assert "3 kênh song song" in result['message']
+    split, _ = sf.read(Path(summary['output_dir']) / result['output'], dtype='float32')
+    (tmp_path / "whole").mkdir()
+    np.testing.assert_array_equal(split, _whole_file(path, tmp_path / "whole", "Hybrid Brickwall", preset))
@@ -0,0 +1,71 @@
+"""Engine streaming (theo block) so với xử lý cả file trong bộ nhớ."""
+import numpy as np
+import pytest
+import soundfile as sf
+
+import soundfix
+
+# Linear-Phase dùng FFT theo block có kích thước khác nên chỉ khớp ở mức làm tròn float32
+EXACT_ENGINES = [name for name in soundfix.engine_functions if name != 'Linear-Phase Brickwall']
+
+
+def _in_memory(path, algorithm, preset, dtype='float32'):
+    y, sr, _ = soundfix.read_audio(path, dtype)
+    y_eq = soundfix.engine_functions[algorithm](y, sr=sr, **preset)
+    return soundfix.to_output_layout(y_eq, 10 ** (preset['volume'] / 20.0))
+
+
+@pytest.mark.parametrize('algorithm', EXACT_ENGINES)
+@pytest.mark.parametrize('block_size', [1000, 4096, soundfix.STREAM_BLOCK_SIZE])
+def test_stream_matches_in_memory(make_wav, tmp_path, preset, algorithm, block_size):
+    path = make_wav(seconds=1.5)
+    output = tmp_path / 'streamed.wav'
+    frames, sr = soundfix.process_audio_stream(path, output, algorithm, preset, block_size=block_size)
+    streamed, _ = sf.read(output, dtype='float32')
+    assert (frames, sr) == (streamed.shape[0], 48000)
+    np.testing.assert_array_equal(streamed, _in_memory(path, algorithm, preset))
+
+
+def test_linear_phase_stream_matches_to_rounding(make_wav, tmp_path, preset):
+    path = make_wav(seconds=1.5)
+    output = tmp_path / 'streamed.wav'
+    soundfix.process_audio_stream(path, output, 'Linear-Phase Brickwall', preset, block_size=4096)
+    streamed, _ = sf.read(output, dtype='float32')
+    np.testing.assert_allclose(streamed, _in_memory(path, 'Linear-Phase Brickwall', preset), atol=1e-5)
+
+
+def test_frame_rms_blocks_match_whole_signal():
+    x = np.random.default_rng(1).standard_normal((2, 10007)).astype(np.float32)
+    meter = soundfix._FrameRms(2)
+    blocks = [meter.feed(x[:, i:i + 777]) for i in range(0, x.shape[-1], 777)] + [meter.finish()]
+    np.testing.assert_array_equal(np.concatenate(blocks, axis=-1), soundfix.frame_rms(x))
+
+
+@pytest.mark.parametrize('algorithm', list(soundfix.engine_functions))
+@pytest.mark.parametrize('streaming', [True, False])
+def test_empty_file(tmp_path, preset, algorithm, streaming):
+    path = tmp_path / 'board_empty.wav'
+    sf.write(path, np.zeros((0, 2)), 48000, subtype='PCM_24')
+    result = soundfix.process_file(str(path), str(tmp_path), algorithm, preset, streaming=streaming)
+    assert result['status'] == 'success', result['message']
+    assert sf.info(tmp_path / result['output']).frames == 0
+
+
+@pytest.mark.parametrize('algorithm', list(soundfix.stream_engine_classes))
+@pytest.mark.parametrize('dtype', list(soundfix.PROCESSING_DTYPES))
+def test_flush_keeps_processing_dtype(preset, algorithm, dtype):
+    # flush() không nhận block nào (file rỗng) vẫn trả về đúng dtype xử lý
+    assert soundfix.stream_engine_classes[algorithm](2, 48000, preset, dtype).flush().dtype == np.dtype(dtype)
+    engine = soundfix.stream_engine_classes[algorithm](2, 48000, preset, dtype)
+    block = np.random.default_rng(0).standard_normal((2, 3000)).astype(dtype)
+    assert engine.process(block).dtype == np.dtype(dtype)
+    assert engine.flush().dtype == np.dtype(dtype)
+
+
+@pytest.mark.parametrize('algorithm', EXACT_ENGINES)
+def test_float64_stream_matches_in_memory(make_wav, tmp_path, preset, algorithm):
+    path = make_wav(seconds=1.5, subtype='DOUBLE')
+    output = tmp_path / 'streamed.wav'
+    soundfix.process_audio_stream(path, output, algorithm, preset, block_size=4096, dtype='float64', subtype='DOUBLE')
+    streamed, _ = sf.read(output, dtype='float64')
+    np.testing.assert_array_equal(streamed, _in_memory(path, algorithm, preset, 'float64'))
@@ -0,0 +1,91 @@
+"""So sánh A/B (render_variants): output giống lần chạy một thuật toán, báo cáo delta và biến thể lỗi."""
+import csv
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+import soundfix
+
+ALGORITHMS = ["Hybrid Brickwall", "Dynamic Hybrid Brickwall", "Multiband Limiting"]
+
+
+@pytest.fixture
+def library(make_wav):
+    return [make_wav("lib/board_a.wav", seconds=0.5, seed=1), make_wav("lib/sub/board_b.wav", seconds=0.7, channels=1, seed=2),
+            make_wav("lib/nothing.wav", seconds=0.2)]
+
+
+def _read_report(summary):
+    with open(summary['report'], encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_variants_match_single_algorithm_runs(tmp_path, csv_path, library, streaming):
+    summary = soundfix.render_variants(str(tmp_path / "lib"), str(tmp_path / "variants"), ALGORITHMS, [csv_path], None,
+                                       workers=1, streaming=streaming)
+    assert summary['error'] is None
+    assert summary['counts'] == {'success': 2, 'skipped': 1, 'error': 0}
+    for algorithm in ALGORITHMS:
+        batch = soundfix.batch_process(str(tmp_path / "lib"), str(tmp_path / algorithm), csv_path, None, algorithm,
+                                       workers=1, streaming=streaming)
+        outputs = [f['output'] for f in batch['files'] if f['status'] == 'success']
+        assert sorted(outputs) == ["processed_board_a.wav", "sub/processed_board_b.wav"]
+        for output in outputs:
+            expected, sr = sf.read(Path(batch['output_dir']) / output, dtype='float32')
+            rendered, rendered_sr = sf.read(Path(summary['output_dir']) / algorithm.replace(' ', '_') / output, dtype='float32')
+            assert rendered_sr == sr
+            np.testing.assert_array_equal(rendered, expected)
+
+
+def test_report_deltas(tmp_path, csv_path, library):
+    summary = soundfix.render_variants(str(tmp_path / "lib"), str(tmp_path / "variants"), ALGORITHMS, [csv_path], None, workers=1)
+    rows = _read_report(summary)
+    assert len(rows) == len(library) * len(ALGORITHMS)
+    assert {row['status'] for row in rows if row['file'] == library[2]} == {'skipped'}
+    for path in library[:2]:
+        source, _ = sf.read(path, dtype='float32')
+        source_levels = soundfix._measure_levels(source)
+        by_variant = {row['variant']: row for row in rows if row['file'] == path}
+        base = by_variant[ALGORITHMS[0].replace(' ', '_')]
+        for row in by_variant.values():
+            assert row['status'] == 'success'
+            output, _ = sf.read(Path(summary['output_dir']) / row['output'], dtype='float32')
+            levels = soundfix._measure_levels(output)
+            assert float(row['rms_db']) == pytest.approx(levels['rms_db'], abs=0.01)
+            assert float(row['peak_db']) == pytest.approx(levels['peak_db'], abs=0.01)
+            assert float(row['rms_delta_db']) == pytest.approx(levels['rms_db'] - source_levels['rms_db'], abs=0.02)
+            assert float(row['peak_delta_db']) == pytest.approx(levels['peak_db'] - source_levels['peak_db'], abs=0.02)
+            assert float(row['rms_vs_base_db']) == pytest.approx(float(row['rms_db']) - float(base['rms_db']), abs=0.02)
+        assert float(base['rms_vs_base_db']) == 0.0
+    # Hybrid Brickwall với volume -2 dB: RMS giảm theo volume cộng phần ngoài dải bị cắt
+    averages = summary['variants'][ALGORITHMS[0].replace(' ', '_')]
+    assert averages['success'] == 2 and averages['skipped'] == 1 and averages['rms_delta_db'] < -2.0
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_failing_variant_does_not_stop_others(tmp_path, csv_path, make_wav, streaming):
+    # lowcut 3000 Hz vượt Nyquist của file 4 kHz: chỉ biến thể dùng bad.csv lỗi
+    bad_csv = tmp_path / "bad.csv"
+    bad_csv.write_text(','.join(soundfix.PRESET_REQUIRED_COLUMNS) + "\n1,board,Board,3000,3500,0,-80,-50,0.1\n", encoding='utf-8')
+    path = make_wav("lib/board_low.wav", seconds=0.5, sr=4000)
+    summary = soundfix.render_variants(str(tmp_path / "lib"), str(tmp_path / "variants"), ["Hybrid Brickwall"], [csv_path, str(bad_csv)],
+                                       None, workers=1, streaming=streaming)
+    assert summary['error'] is None
+    [result] = summary['files']
+    assert result['status'] == 'error' and "1/2 biến thể" in result['message']
+    good, bad = result['variants']
+    # Một thuật toán, hai CSV: tên biến thể là tên file CSV
+    assert (good['variant'], good['status'], bad['variant'], bad['status']) == ("info", 'success', "bad", 'error')
+    assert "3000" in bad['message']
+    output_dir = Path(summary['output_dir'])
+    assert (output_dir / good['output']).is_file()
+    assert not (output_dir / "bad" / "processed_board_low.wav").exists()
+    preset = soundfix.build_preset_matcher(soundfix.load_presets_from_csv(csv_path))("board_low.wav")
+    expected = soundfix.process_file(path, str(tmp_path), "Hybrid Brickwall", preset, streaming=streaming)
+    np.testing.assert_array_equal(sf.read(output_dir / good['output'])[0], sf.read(tmp_path / expected['output'])[0])
+    assert summary['variants']["bad"]['error'] == 1
+    rows = _read_report(summary)
+    assert [row['status'] for row in rows] == ['success', 'error']